@@ -5,4 +5,4 @@ class ColorDiaryConfig(AppConfig):
     name = 'color_diary'
 
     def ready(self):
-        from . import signals
+        from . import checks, signals
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+
+# プロセス毎にしか持てないキャッシュ
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+CACHE_SESSION_ENGINES = (
+    'django.contrib.sessions.backends.cache',
+    'django.contrib.sessions.backends.cached_db',
+)
+
+
+@register(Tags.caches)
+def check_session_cache(app_configs, **kwargs):
+    # セッションをプロセス毎のキャッシュに置くと、ログアウトしても他のプロセスには古いセッションが残ってしまう
+    if settings.SESSION_ENGINE not in CACHE_SESSION_ENGINES:
+        return []
+    backend = settings.CACHES.get(settings.SESSION_CACHE_ALIAS, {}).get('BACKEND')
+    if backend in LOCAL_CACHE_BACKENDS:
+        return [Error(
+            f'{settings.SESSION_ENGINE} needs a cache shared between processes, but the '
+            f'{settings.SESSION_CACHE_ALIAS!r} cache is {backend}.',
+            hint="Use SESSION_PROFILE=db, or configure a shared cache such as memcached or redis.",
+            id='color_diary.E001',
+        )]
+    return []
@@ -0,0 +1,133 @@
+import numpy as np
+
+
+# 複数の色をまとめて変換する。
+# 色はHexColor.rgbaと同じ形式の整数(上位から赤・緑・青・alpha(百分率)の各8bit)の配列で受け取る。
+
+# sRGB(D65)からXYZへの変換行列と、D65の白色点
+SRGB_TO_XYZ = np.array([
+    [0.4124564, 0.3575761, 0.1804375],
+    [0.2126729, 0.7151522, 0.0721750],
+    [0.0193339, 0.1191920, 0.9503041],
+])
+WHITE_POINT = np.array([0.95047, 1.0, 1.08883])
+LAB_EPSILON = (6 / 29) ** 3
+LAB_KAPPA = 3 * (6 / 29) ** 2
+
+
+def pack(hex_colors):
+    return np.fromiter((hex_color.rgba for hex_color in hex_colors), dtype=np.uint32)
+
+
+def _as_rgba(rgba):
+    return np.asarray(rgba, dtype=np.uint32)
+
+
+def unpack(rgba):
+    # 赤・緑・青(0~255の整数)とalpha(0~1の小数)に分ける
+    rgba = _as_rgba(rgba)
+    red = (rgba >> 24).astype(np.int64)
+    green = ((rgba >> 16) & 0xFF).astype(np.int64)
+    blue = ((rgba >> 8) & 0xFF).astype(np.int64)
+    alpha = (rgba & 0xFF) / 100
+    return red, green, blue, alpha
+
+
+def to_rgb(rgba):
+    red, green, blue, alpha = unpack(rgba)
+    return np.stack([red / 255, green / 255, blue / 255], axis=-1)
+
+
+def to_hsv(rgba):
+    # HexColor.hue, saturation, valueと同じ計算をする。無彩色の色相は-1
+    rgb = to_rgb(rgba)
+    calc_red, calc_green, calc_blue = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    cmax = rgb.max(axis=-1)
+    cmin = rgb.min(axis=-1)
+    delta = cmax - cmin
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        hue = np.select(
+            [cmax == cmin, calc_red == cmax, calc_green == cmax],
+            [
+                -1.0,
+                np.mod(60 * (calc_green - calc_blue) / delta, 360),
+                np.mod(60 * (calc_blue - calc_red) / delta + 120, 360),
+            ],
+            np.mod(60 * (calc_red - calc_green) / delta + 240, 360),
+        )
+        saturation = np.where(cmax == 0, 0.0, delta / cmax)
+
+    return np.stack([hue, saturation, cmax], axis=-1)
+
+
+def sort_order(rgba):
+    # HexColorの大小関係(色相の昇順、彩度の昇順、明度の降順、alphaの昇順)で並べるためのindex
+    hsv = to_hsv(rgba)
+    alpha = unpack(rgba)[3]
+    return np.lexsort((alpha, -hsv[..., 2], hsv[..., 1], hsv[..., 0]))
+
+
+def over_white(rgba, opacity=1):
+    # alphaとopacityを掛けた不透明度で白の上に重ねた色(0~1)
+    rgb = to_rgb(rgba)
+    ratio = (unpack(rgba)[3] * np.asarray(opacity, dtype=float))[..., np.newaxis]
+    return 1 + (rgb - 1) * ratio
+
+
+def blend(front, back, alpha):
+    # base.htmlのcalcColorと同じ計算。0~255の整数の色をalphaで重ねて、小数は切り捨てる
+    return np.floor(back + (front - back) * alpha).astype(np.int64)
+
+
+def pack_rgb(rgb):
+    # 0~255の整数の(赤, 緑, 青)を0xRRGGBBにする
+    return rgb[..., 0] << 16 | rgb[..., 1] << 8 | rgb[..., 2]
+
+
+def diary_colors(rgba, color_levels):
+    # 日記の一覧のカードの背景・枠線・文字の色(0xRRGGBB)。Vueで計算していたのと同じ結果になるようにしている。
+    # 背景は色を白の上に重ねてから、もう一度color_level / 10で白の上に重ねる。
+    # 一覧ではalphaをintにして渡していたので、不透明な色以外は白になる
+    red, green, blue, alpha = unpack(rgba)
+    rgb = np.stack([red, green, blue], axis=-1)
+    alpha = np.floor(alpha)[..., np.newaxis]
+    level = (np.asarray(color_levels, dtype=np.int64) / 10)[..., np.newaxis]
+    background = blend(blend(rgb, 255, alpha), 255, level)
+    # 枠線は背景に黒を0.1重ねる
+    border = blend(0, background, 0.1)
+    # 文字は白と黒のうち、背景との明るさの差が大きい方(同じなら黒)
+    brightness = (background[..., 0] * 299 + background[..., 1] * 587 + background[..., 2] * 114) / 1000
+    font = np.where(np.abs(brightness - 0) >= np.abs(brightness - 255), 0x000000, 0xFFFFFF)
+    return pack_rgb(background), pack_rgb(border), font
+
+
+def linearize(rgb):
+    return np.where(rgb <= 0.04045, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+
+
+def to_linear_rgb(rgba):
+    return linearize(to_rgb(rgba))
+
+
+def luminance(rgba):
+    # WCAGの相対輝度。alphaは考慮しない
+    return to_linear_rgb(rgba) @ SRGB_TO_XYZ[1]
+
+
+def contrast_ratio(rgba, other_rgba):
+    first = luminance(rgba)
+    second = luminance(other_rgba)
+    return (np.maximum(first, second) + 0.05) / (np.minimum(first, second) + 0.05)
+
+
+def to_lab(rgba):
+    # CIE L*a*b*(D65)。alphaは考慮しない
+    return rgb_to_lab(to_rgb(rgba))
+
+
+def rgb_to_lab(rgb):
+    xyz = linearize(np.asarray(rgb, dtype=float)) @ SRGB_TO_XYZ.T / WHITE_POINT
+    f = np.where(xyz > LAB_EPSILON, np.cbrt(xyz), xyz / LAB_KAPPA + 4 / 29)
+    fx, fy, fz = f[..., 0], f[..., 1], f[..., 2]
+    return np.stack([116 * fy - 16, 500 * (fx - fy), 200 * (fy - fz)], axis=-1)
@@ -1,17 +1,43 @@
 from django.db import models
+from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 
 import re
 import math
+import zlib
+import functools
+
+from django.db.models.query_utils import DeferredAttribute
+
+
+# 同時に保持しておくHexColorの数。保存されている色の種類は少ないので大きくなくてよい
+HEX_COLOR_CACHE_SIZE = getattr(settings, 'HEX_COLOR_CACHE_SIZE', 1024)
+
+# これより長い(UTF-8でのバイト数)文字列だけを圧縮して保存する
+COMPRESSED_TEXT_THRESHOLD = getattr(settings, 'COMPRESSED_TEXT_THRESHOLD', 256)
+
+HEX_PATTERN = re.compile(r'[0-9a-fA-F]+')
+SYMBOL_PATTERN = re.compile(r'[^a-zA-Z0-9.]')
+HEX_COLOR_CODE_PATTERN = re.compile(r'(\w{2})(\w{2})(\w{2})([01]\.?[0-9]*)?')
 
 
 def is_hex(string: str):
-    return bool(re.fullmatch(r'[0-9a-fA-F]+', string))
+    return bool(HEX_PATTERN.fullmatch(string))
+
+
+def floor_alpha_percent(alpha: float):
+    # alphaは百分率の整数に切り捨てて持つ。HexColorとparse_hex_colorで同じ丸め方にする。
+    # 0.29 * 100 = 28.999...のような浮動小数点の誤差で、一つ小さくならないようにしてから切り捨てる
+    return math.floor(round(alpha * 100, 6))
 
 
 class HexColor:
     """Hex Color Code"""
 
+    # RGBAは一つの整数にまとめて持つ。上位から順に赤・緑・青・alpha(百分率)の各8bit。
+    # HSVによる並び替え用のキーは生成時に一度だけ計算しておく。
+    __slots__ = ('_rgba', '_sort_key')
+
     def __init__(self, red: str, green: str, blue: str, alpha=1.0):
         # RGB入力値は16進数で00~FF
         # alphaは0以上1以下のfloat型
@@ -26,19 +52,43 @@ class HexColor:
         ):
             raise ValueError(_('each of RGB must be 2 length.'))
 
-        if alpha:
-            alpha = float(alpha) # ここで文字列を通さないはず
+        alpha = float(alpha) # ここで文字列を通さないはず
         if alpha < 0 or alpha > 1:
             raise ValueError(_('0 <= alpha <= 1.'))
 
-        self.red = red.upper()
-        self.green = green.upper()
-        self.blue = blue.upper()
-        self.alpha = alpha
+        self._set_rgba(int(red, 16), int(green, 16), int(blue, 16), floor_alpha_percent(alpha))
+
+    @classmethod
+    def from_rgba(cls, rgba: int):
+        # 検証済みの整数から直接作る。データベースやキャッシュからの復元用
+        if not 0 <= rgba <= 0xFFFFFFFF or (rgba & 0xFF) > 100:
+            raise ValueError(_('rgba is out of range.'))
+        hex_color = cls.__new__(cls)
+        hex_color._set_rgba(rgba >> 24, (rgba >> 16) & 0xFF, (rgba >> 8) & 0xFF, rgba & 0xFF)
+        return hex_color
+
+    def _set_rgba(self, red: int, green: int, blue: int, alpha_percent: int):
+        object.__setattr__(self, '_rgba', (red << 24) | (green << 16) | (blue << 8) | alpha_percent)
+        object.__setattr__(self, '_sort_key', self._calc_sort_key(red, green, blue, alpha_percent / 100))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(_('HexColor is immutable.'))
+
+    def __delattr__(self, name):
+        raise AttributeError(_('HexColor is immutable.'))
+
+    def __reduce__(self):
+        return self.__class__.from_rgba, (self._rgba,)
+
+    def __repr__(self):
+        return f'<HexColor: {self}>'
 
     def __str__(self):
         return f'#{self.red}{self.green}{self.blue}-{self.alpha}'
 
+    def __hash__(self):
+        return hash(self._rgba)
+
     def __eq__(self, other):
         if not isinstance(other, HexColor):
             try:
@@ -46,45 +96,41 @@ class HexColor:
             except:
                 return False
 
-        return self.red == other.red \
-               and self.green == other.green \
-               and self.blue == other.blue\
-               and self.alpha == other.alpha
+        return self._rgba == other._rgba
 
     def __gt__(self, other):
-        if self.hue != other.hue:
-            return self.hue > other.hue
-        if self.saturation != other.saturation:
-            return self.saturation > other.saturation
-        if self.value != other.value:
-            return self.value < other.value
-        return self.alpha > other.alpha
+        if not isinstance(other, HexColor):
+            return NotImplemented
+        return self._sort_key > other._sort_key
+
+    def __ge__(self, other):
+        if not isinstance(other, HexColor):
+            return NotImplemented
+        return self._sort_key >= other._sort_key
 
     def __lt__(self, other):
-        if self.hue != other.hue:
-            return self.hue < other.hue
-        if self.saturation != other.saturation:
-            return self.saturation < other.saturation
-        if self.value != other.value:
-            return self.value > other.value
-        return self.alpha < other.alpha
-
-    def _calc_color(self):
-        calc_red = int(self.red, 16) / 255
-        calc_green = int(self.green, 16) / 255
-        calc_blue = int(self.blue, 16) / 255
+        if not isinstance(other, HexColor):
+            return NotImplemented
+        return self._sort_key < other._sort_key
+
+    def __le__(self, other):
+        if not isinstance(other, HexColor):
+            return NotImplemented
+        return self._sort_key <= other._sort_key
+
+    @staticmethod
+    def _calc_sort_key(red: int, green: int, blue: int, alpha: float):
+        # 色相の昇順、彩度の昇順、明度の降順、alphaの昇順で並ぶようにする
+        calc_red = red / 255
+        calc_green = green / 255
+        calc_blue = blue / 255
 
         cmax = max(calc_red, calc_green, calc_blue)
         cmin = min(calc_red, calc_green, calc_blue)
-        return calc_red, calc_green, calc_blue, cmax, cmin
-
-    @property
-    def hue(self):
-        calc_red, calc_green, calc_blue, cmax, cmin = self._calc_color()
 
         hue = -1
         if cmax == cmin:
-            return hue
+            pass
         elif calc_red == cmax:
             hue = (60 * (calc_green - calc_blue) / (cmax - cmin)) % 360
         elif calc_green == cmax:
@@ -92,19 +138,44 @@ class HexColor:
         elif calc_blue == cmax:
             hue = (60 * (calc_red - calc_green) / (cmax - cmin) + 240) % 360
 
-        return hue
+        saturation = 0 if cmax == 0 else (cmax - cmin) / cmax
+        return hue, saturation, -cmax, alpha
+
+    @property
+    def rgba(self):
+        return self._rgba
+
+    @property
+    def sort_key(self):
+        return self._sort_key
+
+    @property
+    def red(self):
+        return f'{self._rgba >> 24:02X}'
+
+    @property
+    def green(self):
+        return f'{(self._rgba >> 16) & 0xFF:02X}'
+
+    @property
+    def blue(self):
+        return f'{(self._rgba >> 8) & 0xFF:02X}'
+
+    @property
+    def alpha(self):
+        return (self._rgba & 0xFF) / 100
+
+    @property
+    def hue(self):
+        return self._sort_key[0]
 
     @property
     def saturation(self):
-        calc_red, calc_green, calc_blue, cmax, cmin = self._calc_color()
-        if cmax == 0:
-            return 0
-        return (cmax - cmin) / cmax
+        return self._sort_key[1]
 
     @property
     def value(self):
-        calc_red, calc_green, calc_blue, cmax, cmin = self._calc_color()
-        return cmax
+        return -self._sort_key[2]
 
 # note: カラーコードからHexColorへ変換する動作はHexColorField内にしかないからHexColorField内へ移動した。いや、将来文字列から変換するなんて色々使えるだろう。だから外にするべきだ
 def parse_hex_color(hex_color_code: str):
@@ -112,10 +183,10 @@ def parse_hex_color(hex_color_code: str):
     # カラーコードをHexColorに変換する
 
     # 記号を取り除いておく
-    hex_color_code = re.sub(r'[^a-zA-Z0-9.]', '', hex_color_code)
+    hex_color_code = SYMBOL_PATTERN.sub('', hex_color_code)
 
     # fixme: もっといいリストを作る実装あるよね、多分
-    match = re.fullmatch(r'(\w{2})(\w{2})(\w{2})([01]\.?[0-9]*)?', hex_color_code)
+    match = HEX_COLOR_CODE_PATTERN.fullmatch(hex_color_code)
     if match is None:
         raise ValueError(_('hex_color_code is wrong.'))
     rgb_list = [match.group(1), match.group(2), match.group(3)]
@@ -133,30 +204,65 @@ def parse_hex_color(hex_color_code: str):
         if alpha < 0 or alpha > 1:
             raise ValueError(_('0 <= alpha <= 1.'))
 
-    floored_alpha = math.floor(alpha * 100) / 100
+    floored_alpha = floor_alpha_percent(alpha)
+
+    # ここまでで検証は済んでいるので、HexColorの生成時に再び検証しない
+    red, green, blue = (int(color, 16) for color in rgb_list)
+    return HexColor.from_rgba((red << 24) | (green << 16) | (blue << 8) | floored_alpha)
+
 
-    return HexColor(*rgb_list, floored_alpha)
+@functools.lru_cache(maxsize=HEX_COLOR_CACHE_SIZE)
+def intern_hex_color(hex_color_code):
+    # データベースに保存されている値は種類が少ないので、同じ値からは同じHexColorを返す。
+    # HexColorは変更できないので共有しても問題ない。
+    # 文字列はカラーコード、整数はHexColor.rgbaとして扱う。
+    # ヒット数・ミス数は intern_hex_color.cache_info() で確認できる
+    if isinstance(hex_color_code, int):
+        return HexColor.from_rgba(hex_color_code)
+    return parse_hex_color(hex_color_code)
 
 
 class HexColorField(models.Field):
-    def __init__(self, *args, **kwargs):
-        kwargs['max_length'] = 10
+    # packed=Trueのときは、RGBAを32bitの整数一つとして保存する。
+    # 符号付き整数の列に収まるように、HexColor.rgbaから2**31を引いた値を保存する。大小関係は変わらない
+    PACKED_OFFSET = 1 << 31
+
+    def __init__(self, *args, packed=False, **kwargs):
+        self.packed = packed
+        if not packed:
+            kwargs['max_length'] = 10
         super().__init__(*args, **kwargs)
 
     def deconstruct(self):
         name, path, args, kwargs = super().deconstruct()
-        del kwargs['max_length'] # 既に最大長は指定したため、ここでは読みやすさのために最大長は省く
+        kwargs.pop('max_length', None) # 既に最大長は指定したため、ここでは読みやすさのために最大長は省く
+        if self.packed:
+            kwargs['packed'] = True
         return name, path, args, kwargs
 
+    def get_internal_type(self):
+        if self.packed:
+            return 'IntegerField'
+        return super().get_internal_type()
+
     def db_type(self, connection):
+        if self.packed:
+            return super().db_type(connection)
         return 'CHAR(10)'
 
     def from_db_value(self, value, expression, connection):
         if value is None:
             return value
-        return parse_hex_color(value)
+        if self.packed:
+            return intern_hex_color(value + self.PACKED_OFFSET)
+        return intern_hex_color(value)
 
     def get_prep_value(self, value):
+        value = self.to_python(value)
+        if value is None:
+            return value
+        if self.packed:
+            return value.rgba - self.PACKED_OFFSET
         return f'{value.red}{value.green}{value.blue}{value.alpha}' # データベースの為めに文字列に変換する処理はHexColorクラスではなくこのクラスに入れるのか！
 
     def to_python(self, value):
@@ -166,4 +272,105 @@ class HexColorField(models.Field):
         if isinstance(value, HexColor):
             return value
 
+        if isinstance(value, (str, int)):
+            return intern_hex_color(value)
         return parse_hex_color(value)
+
+
+class CompressedText:
+    # データベースから読んだままのCompressedTextFieldの値。
+    # 属性として参照された時に初めて展開する。values()などでは、この型のまま返るのでstr()で文字列にする
+    __slots__ = ('data',)
+
+    # UTF-8には0xFFのバイトは現れないので、先頭が0xFFならzlibで圧縮したもの、それ以外はUTF-8の文字列
+    COMPRESSED_MARKER = b'\xff'
+
+    def __init__(self, data):
+        self.data = bytes(data)
+
+    @classmethod
+    def compress(cls, text, threshold=COMPRESSED_TEXT_THRESHOLD):
+        data = text.encode('utf-8')
+        if len(data) > threshold:
+            compressed = cls.COMPRESSED_MARKER + zlib.compress(data)
+            if len(compressed) < len(data):
+                return cls(compressed)
+        return cls(data)
+
+    @property
+    def is_compressed(self):
+        return self.data[:1] == self.COMPRESSED_MARKER
+
+    def __str__(self):
+        if self.is_compressed:
+            return zlib.decompress(self.data[1:]).decode('utf-8')
+        return self.data.decode('utf-8')
+
+    def __repr__(self):
+        return f'<CompressedText: {len(self.data)} bytes>'
+
+    def __eq__(self, other):
+        if isinstance(other, CompressedText):
+            return str(self) == str(other)
+        return NotImplemented
+
+
+class CompressedTextDescriptor(DeferredAttribute):
+    # 読み込んだ値は参照された時に展開して、文字列に置き換える
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        value = super().__get__(instance, cls)
+        if isinstance(value, CompressedText):
+            value = instance.__dict__[self.field.attname] = str(value)
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+
+class CompressedTextField(models.TextField):
+    # 長い文字列をzlibで圧縮して、バイナリの列に保存するTextField
+    descriptor_class = CompressedTextDescriptor
+
+    def __init__(self, *args, threshold=COMPRESSED_TEXT_THRESHOLD, **kwargs):
+        self.threshold = threshold
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.threshold != COMPRESSED_TEXT_THRESHOLD:
+            kwargs['threshold'] = self.threshold
+        return name, path, args, kwargs
+
+    def get_internal_type(self):
+        return 'BinaryField'
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        if isinstance(value, str): # SQLiteで、圧縮する前の列の型がTEXTのままの値
+            return value
+        return CompressedText(value)
+
+    def pre_save(self, model_instance, add):
+        # 展開していない値は変わっていないので、圧縮し直さずにそのまま保存する
+        value = model_instance.__dict__.get(self.attname)
+        if isinstance(value, CompressedText):
+            return value
+        return super().pre_save(model_instance, add)
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if value is None:
+            return value
+        if not isinstance(value, CompressedText):
+            value = CompressedText.compress(self.get_prep_value(value), self.threshold)
+        return connection.Database.Binary(value.data)
+
+    def to_python(self, value):
+        if isinstance(value, CompressedText):
+            return str(value)
+        return super().to_python(value)
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
@@ -3,18 +3,18 @@ from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db.models import IntegerField, Case, When, Value
 from django.contrib.auth import authenticate
 
 from .models import Diary, Color, User
 from .fields import parse_hex_color
+from .recolor import remap_colors
 
 
 DEFAULT_COLOR_LEVEL = 10
 
 
 class ChooseColorForm(forms.Form):
-    color = forms.ModelChoiceField(widget=forms.RadioSelect, initial=Color.get_default_color, queryset=None)
+    color = forms.ModelChoiceField(widget=forms.RadioSelect, initial=Color.get_default_color_id, queryset=None)
     color_level = forms.IntegerField(
         initial=DEFAULT_COLOR_LEVEL,
         validators=[MinValueValidator(1), MaxValueValidator(10)],
@@ -34,21 +34,8 @@ class ChooseColorForm(forms.Form):
 
         super().__init__(*args, **kwargs)
 
-        # querysetをHexColorオブジェクトでソートする
-        queryset = Color.objects.filter(users__id=self.login_user.pk)
-        sorted_list = sorted(queryset, key=lambda color: color.hex_color)
-
-        cases = []
-        for hex_color_order, color in enumerate(sorted_list):
-            cases.append(When(id=color.pk, then=Value(hex_color_order)))
-
-        self.fields["color"].queryset =  queryset.annotate(
-            hex_color_order=Case(
-                *cases,
-                output_field=IntegerField()
-            )
-        ).order_by('hex_color_order')
-
+        # 保存してあるHSVの列で、HexColorの大小関係と同じ順に並べる
+        self.fields["color"].queryset = Color.objects.filter(users__id=self.login_user.pk).order_by(*Color.HSV_ORDERING)
 
 
 class ColorModelForm(forms.ModelForm):
@@ -88,22 +75,27 @@ class ColorModelForm(forms.ModelForm):
 
         return super().clean()
 
+    def validate_unique(self):
+        # 同じhex_colorのColorがあればsaveでそれを使うので、重複はエラーにしない
+        pass
+
     def save(self, commit=True):
         # Colorは変更する事ができない。Colorのhex_colorを変更した時は新たにオブジェクトを作るか
         # 既存のオブジェクトをとってきて、現在ログインしているユーザーと関連付ける。
         # また、変更以前の色を使っていた日記は、新しい色に新たに関連付けられる。
 
+        if self.instance.pk and self.instance.pk == Color.get_default_color_id():
+            # デフォルトの色は変更できない(フィールドもdisabledにしている)
+            return self.instance
+
         hex_color = parse_hex_color(self.cleaned_data['hex_color'])
         new_color = Color.objects.create(hex_color=hex_color)
-        new_color.users.add(self.user)
 
         if self.instance.pk:
-            previous_color = Color.objects.get(id=self.instance.pk)
-            Diary.objects.filter(user=self.user, color=previous_color).update(color=new_color)
-            previous_color.users.remove(self.user)
-
-            if previous_color.users.all().count() == 0:
-                previous_color.delete()
+            remap_colors(self.user, {self.instance.pk: new_color})
+        else:
+            new_color.users.add(self.user)
+        return new_color
 
 
 class DiaryModelForm(forms.ModelForm):
@@ -151,6 +143,38 @@ class DiaryModelForm(forms.ModelForm):
         return self.instance
 
 
+class ComposeDiaryForm(forms.ModelForm):
+    # 色・レベル・本文を一度にPOSTする。ChooseColorFormとDiaryModelFormの間でセッションに値を渡さない
+    color = forms.ModelChoiceField(widget=forms.RadioSelect, queryset=None)
+
+    class Meta:
+        model = Diary
+        fields = ['color', 'color_level', 'context', 'created_at']
+        widgets = {
+            'color_level': forms.NumberInput(attrs={'type': 'range', 'step': '1', 'min': '1', 'max': '10'}),
+            'created_at': forms.HiddenInput(),
+        }
+
+    def __init__(self, user=None, *args, **kwargs):
+        if user is None:
+            raise ValueError(_('the user argument is not given.'))
+        self.user = user
+
+        super().__init__(*args, **kwargs)
+
+        self.instance.user = user
+        self.fields['color'].queryset = Color.objects.filter(users__id=user.pk).order_by(*Color.HSV_ORDERING)
+        self.fields['color'].empty_label = None
+        if self.instance.pk is None:
+            self.initial.setdefault('color', Color.get_default_color_id())
+            self.initial.setdefault('color_level', DEFAULT_COLOR_LEVEL)
+
+    def save(self, commit=True):
+        if self.cleaned_data['created_at'] is None:
+            self.instance.created_at = timezone.now()
+        return super().save(commit)
+
+
 class UserLoginForm(forms.ModelForm):
     password = forms.CharField(label='Password', widget=forms.PasswordInput(attrs={'class': 'form-control', 'placeholder': 'Password:'}))
 
@@ -0,0 +1,32 @@
+import random
+import timeit
+
+from django.core.management.base import BaseCommand
+
+from ... import colorspace
+from ...fields import HexColor
+
+
+class Command(BaseCommand):
+    help = 'Compare HexColor objects with the vectorized colorspace module.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[10, 1000, 100000])
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"colors":>8} {"per-object sort":>15} {"vectorized sort":>15} {"per-object hsv":>15} {"vectorized hsv":>15}')
+        for size in options['sizes']:
+            rgba_list = [random.getrandbits(24) << 8 | random.randint(0, 100) for _ in range(size)]
+            rgba_array = colorspace._as_rgba(rgba_list)
+            hex_colors = [HexColor.from_rgba(rgba) for rgba in rgba_list]
+
+            timings = [
+                # 一つずつHexColorを作ってから並べる
+                lambda: sorted(HexColor.from_rgba(rgba) for rgba in rgba_list),
+                lambda: colorspace.sort_order(rgba_array),
+                lambda: [(color.hue, color.saturation, color.value) for color in hex_colors],
+                lambda: colorspace.to_hsv(rgba_array),
+            ]
+            seconds = [min(timeit.repeat(timing, number=1, repeat=options['repeat'])) for timing in timings]
+            self.stdout.write(f'{size:>8} ' + ' '.join(f'{second * 1000:>13.3f}ms' for second in seconds))
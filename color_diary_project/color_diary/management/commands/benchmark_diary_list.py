@@ -0,0 +1,53 @@
+import timeit
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ...fields import parse_hex_color
+from ...models import Color, Diary, User
+from ...serializers import DiaryPreviewSerializer, serialize_diary_previews
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compare rows/sec of the diary list API between DiaryPreviewSerializer and serialize_diary_previews.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[20, 100, 1000])
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        # 計測用のユーザーと日記は、最後にロールバックして残さない
+        try:
+            with transaction.atomic():
+                self.benchmark(options['sizes'], options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def benchmark(self, sizes, repeat):
+        user = User.objects.create_user(email='benchmark-diary-list@example.com', password=None)
+        colors = list(Color.objects.create_many(parse_hex_color(f'{i * 16:02x}80{255 - i * 16:02x}') for i in range(16)).values())
+        created = 0
+
+        self.stdout.write(f'{"diaries":>8} {"serializer":>16} {"values_list":>16} {"speedup":>8}')
+        for size in sizes:
+            Diary.objects.bulk_create([
+                Diary(user=user, color=colors[i % len(colors)], color_level=i % 10 + 1, context='', preview=f'diary {i}')
+                for i in range(created, size)
+            ])
+            created = max(created, size)
+            queryset = Diary.objects.all(user).select_related('user', 'color').defer('context').order_by('pk')[:size]
+
+            def serializer():
+                DiaryPreviewSerializer(queryset.all(), many=True).data
+
+            def values_list():
+                serialize_diary_previews(queryset.all(), user)
+
+            seconds = [min(timeit.repeat(timing, number=1, repeat=repeat)) for timing in (serializer, values_list)]
+            rates = [size / second for second in seconds]
+            self.stdout.write(f'{size:>8} ' + ' '.join(f'{rate:>10.0f} rows/s' for rate in rates) + f' {seconds[0] / seconds[1]:>7.1f}x')
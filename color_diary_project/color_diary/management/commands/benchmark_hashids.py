@@ -0,0 +1,47 @@
+import random
+import timeit
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from hashids import Hashids
+
+from ...utils import MIN_LENGTH, SALT, HashidsCodec
+
+
+class Command(BaseCommand):
+    help = 'Compare the hash id overhead of one diary index page with and without the shared codec.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[20, 100, 1000])
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"diaries":>8} {"per-call Hashids":>16} {"codec (cold)":>16} {"codec (warm)":>16}')
+        for size in options['sizes']:
+            diaries = [SimpleNamespace(pk=random.randint(1, 10 ** 7)) for _ in range(size)]
+            hash_id = Hashids(salt=SALT, min_length=MIN_LENGTH).encode(diaries[0].pk)
+
+            def per_call():
+                # 以前のget_hashids()。URLのdecodeが一回と、日記のカード毎に二回のencode
+                Hashids(salt=SALT, min_length=MIN_LENGTH).decode(hash_id)
+                for diary in diaries:
+                    Hashids(salt=SALT, min_length=MIN_LENGTH).encode(diary.pk)
+                    Hashids(salt=SALT, min_length=MIN_LENGTH).encode(diary.pk)
+
+            def codec_cold():
+                codec = HashidsCodec()
+                codec.decode(hash_id)
+                codec.attach(diaries)
+
+            codec = HashidsCodec()
+            codec.attach(diaries)  # 2回目以降のリクエストのように、キャッシュを温めておく
+
+            def codec_warm():
+                codec.decode(hash_id)
+                codec.attach(diaries)
+
+            seconds = [
+                min(timeit.repeat(timing, number=1, repeat=options['repeat']))
+                for timing in (per_call, codec_cold, codec_warm)
+            ]
+            self.stdout.write(f'{size:>8} ' + ' '.join(f'{second * 1000:>14.3f}ms' for second in seconds))
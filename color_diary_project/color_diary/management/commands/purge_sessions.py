@@ -0,0 +1,35 @@
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = 'Delete expired rows of the session table a chunk at a time.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--sleep', type=float, default=0.1, help='seconds to wait between chunks.')
+
+    def handle(self, *args, **options):
+        # clearsessionsは期限切れの行を一度のDELETEで消すので、行が多いと長くロックしてしまう。
+        # 主キーで少しずつ消し、間を空けて他の書き込みを待たせないようにする
+        engine = import_module(settings.SESSION_ENGINE)
+        if not hasattr(engine.SessionStore, 'get_model_class'):
+            self.stdout.write(f'{settings.SESSION_ENGINE} does not store sessions in the database.')
+            return
+
+        Session = engine.SessionStore.get_model_class()
+        now = timezone.now()
+        deleted = 0
+        while True:
+            keys = list(Session.objects.filter(expire_date__lt=now).values_list('pk', flat=True)[:options['chunk_size']])
+            if not keys:
+                break
+            deleted += Session.objects.filter(pk__in=keys).delete()[0]
+            if len(keys) < options['chunk_size']:
+                break
+            time.sleep(options['sleep'])
+        self.stdout.write(f'deleted {deleted} expired sessions.')
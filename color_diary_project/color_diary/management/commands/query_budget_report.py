@@ -0,0 +1,47 @@
+import json
+import os
+from collections import Counter, defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ... import middleware
+
+
+class Command(BaseCommand):
+    help = 'Summarize the queries per view recorded by QueryBudgetMiddleware.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default=middleware.QUERY_BUDGET_REPORT, help='report written by QueryBudgetMiddleware.')
+        parser.add_argument('--clear', action='store_true', help='remove the report after summarizing.')
+
+    def handle(self, *args, **options):
+        path = options['file']
+        if not path or not os.path.exists(path):
+            raise CommandError(f'no report: {path}')
+
+        views = defaultdict(list)
+        duplicates = defaultdict(Counter)
+        n_plus_ones = defaultdict(Counter)
+        with open(path, encoding='utf-8') as report:
+            for line in report:
+                record = json.loads(line)
+                view = record['view']
+                views[view].append(record['queries'])
+                duplicates[view].update(record['duplicates'])
+                n_plus_ones[view].update(record['n_plus_one'])
+
+        for view, counts in sorted(views.items(), key=lambda item: -max(item[1])):
+            budget = middleware.QUERY_BUDGETS.get(view)
+            over = budget is not None and max(counts) > budget
+            self.stdout.write(
+                f'{view}: {len(counts)} requests, mean {sum(counts) / len(counts):.1f}, max {max(counts)} queries'
+                + (f' (budget {budget})' if budget is not None else ''),
+                self.style.WARNING if over else None,
+            )
+            for sql, count in duplicates[view].most_common(3):
+                self.stdout.write(f'    duplicated {count} times: {sql}')
+            for sql, count in n_plus_ones[view].most_common(3):
+                self.stdout.write(f'    N+1 {count} times: {sql}', self.style.WARNING)
+
+        if options['clear']:
+            os.remove(path)
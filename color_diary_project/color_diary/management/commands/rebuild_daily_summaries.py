@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from ...models import User
+from ...summary import build_daily_summaries
+
+
+class Command(BaseCommand):
+    help = 'Rebuild DiaryDailySummary from diaries, one user at a time.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', nargs='+', type=int, help='ids of users to rebuild. all users by default.')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        user_ids = options['users'] or User.objects.order_by('id').values_list('id', flat=True).iterator()
+        users = 0
+        summaries = 0
+        for user_id in user_ids:
+            summaries += build_daily_summaries(user_id, chunk_size=options['chunk_size'])
+            users += 1
+        self.stdout.write(f'rebuilt {summaries} daily summaries of {users} users.')
@@ -0,0 +1,55 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from ...models import Color
+
+
+class Command(BaseCommand):
+    help = 'Delete colors that no palette or diary has referenced for a while, a batch at a time.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--grace', type=int, default=60 * 60, help='seconds a color must stay unreferenced.')
+        parser.add_argument('--sleep', type=float, default=0.1, help='seconds to wait between batches.')
+        parser.add_argument('--recount', action='store_true', help='recount ref_count from palettes and diaries first.')
+
+    def handle(self, *args, **options):
+        # リクエストの中では色を消さず、ref_countが0のまま猶予を過ぎた色をここで消す。
+        # 作ったばかりでまだパレットに入れていない色を消さないように、猶予を置いている
+        if options['recount']:
+            Color.objects.recount_references()
+
+        cutoff = timezone.now() - datetime.timedelta(seconds=options['grace'])
+        deleted = 0
+        last_id = 0
+        while True:
+            # ref_countがずれていても使われている色を消さないように、パレットと日記が無い事も確かめる。
+            # デフォルトの色は、プロセス毎に覚えているidではなくhex_colorで除く。他のプロセスが覚えているidが消えないように、
+            # 誰も使っていなくても消さない(_raw_deleteではpost_deleteが送られず、idを忘れさせられない)
+            color_ids = list(
+                Color.objects.filter(ref_count__lte=0, unreferenced_since__lt=cutoff, pk__gt=last_id)
+                .exclude(hex_color=Color.TRANSPARENT).filter(users__isnull=True, diary__isnull=True)
+                .order_by('pk').values_list('pk', flat=True)[:options['batch_size']]
+            )
+            if not color_ids:
+                break
+            with transaction.atomic():
+                # ロックしてから、その間にパレットや日記で使われ始めた色と、ColorManager.createが使い回した色を除く
+                locked = list(
+                    Color.objects.select_for_update()
+                    .filter(pk__in=color_ids, ref_count__lte=0, unreferenced_since__lt=cutoff)
+                    .values_list('pk', flat=True)
+                )
+                # パレットも日記も無い色なので、付け替えや一覧ページの無効化は要らない。
+                # QuerySet.deleteはシグナルを一件ずつ送るので、一回のDELETEで消す
+                orphans = Color.objects.filter(pk__in=locked, users__isnull=True, diary__isnull=True)
+                deleted += orphans._raw_delete(orphans.db)
+            last_id = color_ids[-1]
+            if len(color_ids) < options['batch_size']:
+                break
+            time.sleep(options['sleep'])
+        self.stdout.write(f'deleted {deleted} unreferenced colors.')
@@ -0,0 +1,93 @@
+import json
+import logging
+import os
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+
+logger = logging.getLogger(__name__)
+
+# {ビューの名前: そのビューで許すクエリの数}。名前はnamespace付き(color_diary:diary-index)
+QUERY_BUDGETS = getattr(settings, 'QUERY_BUDGETS', {})
+# Trueなら予算を超えた時やN+1を見つけた時に例外にする。Falseならログに出すだけ
+QUERY_BUDGET_RAISE = getattr(settings, 'QUERY_BUDGET_RAISE', False)
+# リクエスト毎の結果をJSON linesで追記するファイル。Noneなら書き出さない
+QUERY_BUDGET_REPORT = getattr(settings, 'QUERY_BUDGET_REPORT', None)
+# 引数だけが違う同じSQLがこの回数以上実行されたら、N+1とみなす
+N_PLUS_ONE_THRESHOLD = getattr(settings, 'N_PLUS_ONE_THRESHOLD', 5)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryRecorder:
+    # connection.execute_wrapperに渡して、実行されたSQLと引数を記録する
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append((sql, repr(params)))
+        return execute(sql, params, many, context)
+
+    def summarize(self):
+        templates = Counter(sql for sql, params in self.queries)
+        duplicates = Counter(self.queries)
+        return {
+            'queries': len(self.queries),
+            # {引数まで同じSQLが2回以上実行されたSQL: 回数}
+            'duplicates': {sql: count for (sql, params), count in duplicates.items() if count >= 2},
+            'n_plus_one': {sql: count for sql, count in templates.items() if count >= N_PLUS_ONE_THRESHOLD},
+        }
+
+
+_report_lock = threading.Lock()
+
+
+def write_report(record, path=None):
+    path = path or QUERY_BUDGET_REPORT
+    if path is None:
+        return
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with _report_lock, open(path, 'a', encoding='utf-8') as report:
+        report.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+class QueryBudgetMiddleware:
+    # ビュー毎にクエリの数・重複したSQL・N+1を数える。DEBUGか、例外にするか書き出す設定がある時だけ有効
+    def __init__(self, get_response):
+        if not (settings.DEBUG or QUERY_BUDGET_RAISE or QUERY_BUDGET_REPORT):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+
+        resolver_match = getattr(request, 'resolver_match', None)
+        if resolver_match is None:
+            return response
+
+        view_name = resolver_match.view_name
+        record = {'view': view_name, 'method': request.method, 'path': request.path, **recorder.summarize()}
+        write_report(record)
+
+        problems = []
+        budget = QUERY_BUDGETS.get(view_name)
+        if budget is not None and record['queries'] > budget:
+            problems.append(f'{record["queries"]} queries (budget {budget})')
+        for sql, count in record['n_plus_one'].items():
+            problems.append(f'N+1: {count} times: {sql}')
+
+        if problems:
+            message = f'{request.method} {request.path} ({view_name}): ' + '; '.join(problems)
+            if QUERY_BUDGET_RAISE:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
@@ -0,0 +1,56 @@
+# Generated by Django 3.1.8 on 2026-10-18 08:46
+
+from django.db import migrations, models
+
+
+BATCH_SIZE = 500
+
+
+def set_hsv(apps, schema_editor):
+    Color = apps.get_model('color_diary', 'Color')
+    colors = []
+    for color in Color.objects.all().iterator(chunk_size=BATCH_SIZE):
+        color.hue = color.hex_color.hue
+        color.saturation = color.hex_color.saturation
+        color.value = color.hex_color.value
+        color.alpha = color.hex_color.alpha
+        colors.append(color)
+        if len(colors) >= BATCH_SIZE:
+            Color.objects.bulk_update(colors, ['hue', 'saturation', 'value', 'alpha'])
+            colors = []
+    Color.objects.bulk_update(colors, ['hue', 'saturation', 'value', 'alpha'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('color_diary', '0004_auto_20210429_2110'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='color',
+            name='alpha',
+            field=models.FloatField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='color',
+            name='hue',
+            field=models.FloatField(default=-1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='color',
+            name='saturation',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='color',
+            name='value',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.RunPython(set_hsv, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='color',
+            index=models.Index(fields=['hue', 'saturation', '-value', 'alpha'], name='color_hsv_idx'),
+        ),
+    ]
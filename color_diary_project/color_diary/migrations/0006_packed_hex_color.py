@@ -0,0 +1,59 @@
+# Generated by Django 3.1.8 on 2026-10-18 09:02
+
+import color_diary.fields
+from django.db import migrations
+
+
+BATCH_SIZE = 500
+
+
+def copy_hex_color(from_field, to_field):
+    def copy(apps, schema_editor):
+        Color = apps.get_model('color_diary', 'Color')
+        colors = []
+        for color in Color.objects.all().iterator(chunk_size=BATCH_SIZE):
+            setattr(color, to_field, getattr(color, from_field))
+            colors.append(color)
+            if len(colors) >= BATCH_SIZE:
+                Color.objects.bulk_update(colors, [to_field])
+                colors = []
+        Color.objects.bulk_update(colors, [to_field])
+    return copy
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('color_diary', '0005_color_hsv'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='color',
+            name='packed_hex_color',
+            field=color_diary.fields.HexColorField(null=True, packed=True),
+        ),
+        migrations.AlterField(
+            model_name='color',
+            name='hex_color',
+            field=color_diary.fields.HexColorField(null=True, verbose_name='hex color code'),
+        ),
+        migrations.RunPython(
+            copy_hex_color('hex_color', 'packed_hex_color'),
+            copy_hex_color('packed_hex_color', 'hex_color'),
+        ),
+        migrations.RemoveField(
+            model_name='color',
+            name='hex_color',
+        ),
+        migrations.RenameField(
+            model_name='color',
+            old_name='packed_hex_color',
+            new_name='hex_color',
+        ),
+        migrations.AlterField(
+            model_name='color',
+            name='hex_color',
+            field=color_diary.fields.HexColorField(db_index=True, packed=True, verbose_name='hex color code'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 3.1.8 on 2026-10-18 08:54
+
+import color_diary.fields
+from django.db import migrations
+
+
+def merge_duplicate_colors(apps, schema_editor):
+    # 同じhex_colorのColorが複数あれば、一番小さいidのものにまとめる
+    Color = apps.get_model('color_diary', 'Color')
+    Diary = apps.get_model('color_diary', 'Diary')
+    Through = Color.users.through
+
+    keep_ids = {}
+    duplicate_ids = {}
+    for color_id, hex_color in Color.objects.order_by('id').values_list('id', 'hex_color').iterator():
+        if hex_color in keep_ids:
+            duplicate_ids[color_id] = keep_ids[hex_color]
+        else:
+            keep_ids[hex_color] = color_id
+
+    for duplicate_id, keep_id in duplicate_ids.items():
+        Diary.objects.filter(color_id=duplicate_id).update(color_id=keep_id)
+        user_ids = set(Through.objects.filter(color_id=keep_id).values_list('user_id', flat=True))
+        Through.objects.bulk_create([
+            Through(color_id=keep_id, user_id=user_id)
+            for user_id in Through.objects.filter(color_id=duplicate_id).values_list('user_id', flat=True)
+            if user_id not in user_ids
+        ])
+    Through.objects.filter(color_id__in=duplicate_ids).delete()
+    Color.objects.filter(id__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('color_diary', '0006_packed_hex_color'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_colors, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='color',
+            name='hex_color',
+            field=color_diary.fields.HexColorField(packed=True, unique=True, verbose_name='hex color code'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.8 on 2026-10-18 09:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('color_diary', '0007_unique_hex_color'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='diary',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='diary_user_created_idx'),
+        ),
+    ]
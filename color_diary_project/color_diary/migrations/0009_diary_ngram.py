@@ -0,0 +1,61 @@
+# Generated by Django 3.1.8 on 2026-10-18 09:06
+
+import unicodedata
+from collections import Counter
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+BATCH_SIZE = 500
+
+
+# search.pyが後で変わってもこのマイグレーションの結果が変わらないように、この時点の索引の作り方を写しておく
+def ngram_counts(text):
+    counts = Counter()
+    normalized = ''.join(unicodedata.normalize('NFKC', char).lower() for char in text)
+    for word in normalized.split():
+        for index in range(len(word)):
+            counts[word[index:index + 2]] += 1
+    return counts
+
+
+def build_diary_ngrams(apps, schema_editor):
+    Diary = apps.get_model('color_diary', 'Diary')
+    DiaryNgram = apps.get_model('color_diary', 'DiaryNgram')
+    ngrams = []
+    for diary_id, user_id, context in Diary._base_manager.values_list('id', 'user_id', 'context').iterator(chunk_size=BATCH_SIZE):
+        ngrams.extend(
+            DiaryNgram(diary_id=diary_id, user_id=user_id, gram=gram, count=count)
+            for gram, count in ngram_counts(context).items()
+        )
+        if len(ngrams) >= BATCH_SIZE:
+            DiaryNgram.objects.bulk_create(ngrams, batch_size=BATCH_SIZE)
+            ngrams = []
+    DiaryNgram.objects.bulk_create(ngrams, batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('color_diary', '0008_diary_user_created_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiaryNgram',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gram', models.CharField(max_length=2)),
+                ('count', models.PositiveIntegerField(default=1)),
+                ('diary', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ngrams', related_query_name='ngram', to='color_diary.diary')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='diaryngram',
+            index=models.Index(fields=['user', 'gram'], name='diary_ngram_user_gram_idx'),
+        ),
+        migrations.RunPython(build_diary_ngrams, migrations.RunPython.noop),
+    ]
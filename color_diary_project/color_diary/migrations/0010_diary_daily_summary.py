@@ -0,0 +1,60 @@
+# Generated by Django 3.1.8 on 2026-10-18 09:09
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+
+BATCH_SIZE = 2000
+
+
+def build_daily_summaries(apps, schema_editor):
+    # 既存の日記から集計する。manage.py rebuild_daily_summariesと同じ
+    Diary = apps.get_model('color_diary', 'Diary')
+    DiaryDailySummary = apps.get_model('color_diary', 'DiaryDailySummary')
+    summaries = {}
+    diaries = Diary._base_manager.order_by('user_id', 'created_at').values_list(
+        'user_id', 'created_at', 'color_id', 'color_level', 'context'
+    )
+    for user_id, created_at, color_id, color_level, context in diaries.iterator(chunk_size=BATCH_SIZE):
+        key = (user_id, timezone.localdate(created_at))
+        summary = summaries.get(key)
+        if summary is None:
+            # (user_id, 日付)の順に読んでいるので、新しい日になったらそれまでの日の集計は終わっている
+            if len(summaries) >= BATCH_SIZE:
+                DiaryDailySummary.objects.bulk_create(summaries.values(), batch_size=BATCH_SIZE)
+                summaries = {}
+            summary = summaries[key] = DiaryDailySummary(user_id=user_id, date=key[1], color_counts={})
+        summary.count += 1
+        summary.color_counts[str(color_id)] = summary.color_counts.get(str(color_id), 0) + 1
+        summary.color_level_sum += color_level
+        summary.context_length += len(context)
+    DiaryDailySummary.objects.bulk_create(summaries.values(), batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('color_diary', '0009_diary_ngram'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiaryDailySummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('color_counts', models.JSONField(default=dict)),
+                ('color_level_sum', models.PositiveIntegerField(default=0)),
+                ('context_length', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_summaries', related_query_name='daily_summary', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='diarydailysummary',
+            constraint=models.UniqueConstraint(fields=('user', 'date'), name='diary_daily_summary_unique'),
+        ),
+        migrations.RunPython(build_daily_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 3.1.8 on 2026-10-18 09:14
+
+import color_diary.fields
+from django.db import migrations, models
+
+
+BATCH_SIZE = 500
+
+
+def compress_contexts(apps, schema_editor):
+    # 長い日記を圧縮し直して、文字数を保存する
+    Diary = apps.get_model('color_diary', 'Diary')
+    diaries = []
+    for diary in Diary._base_manager.only('id', 'context').order_by('id').iterator(chunk_size=BATCH_SIZE):
+        diary.context = str(diary.context)
+        diary.context_length = len(diary.context)
+        diaries.append(diary)
+        if len(diaries) >= BATCH_SIZE:
+            Diary._base_manager.bulk_update(diaries, ['context', 'context_length'])
+            diaries = []
+    Diary._base_manager.bulk_update(diaries, ['context', 'context_length'])
+
+
+def decompress_contexts(apps, schema_editor):
+    # TextFieldに戻せるように、全て文字列として保存し直す
+    Diary = apps.get_model('color_diary', 'Diary')
+    for diary in Diary._base_manager.only('id', 'context').order_by('id').iterator(chunk_size=BATCH_SIZE):
+        Diary._base_manager.filter(pk=diary.pk).update(context=models.Value(diary.context, output_field=models.TextField()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('color_diary', '0010_diary_daily_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='diary',
+            name='context_length',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='diary',
+            name='context',
+            field=color_diary.fields.CompressedTextField(blank=True, verbose_name="diary's context"),
+        ),
+        migrations.RunPython(compress_contexts, decompress_contexts),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.1.8 on 2026-10-18 09:16
+
+from django.db import migrations, models
+from django.utils.text import Truncator
+
+
+BATCH_SIZE = 500
+PREVIEW_LENGTH = 100
+
+
+def fill_previews(apps, schema_editor):
+    Diary = apps.get_model('color_diary', 'Diary')
+    diaries = []
+    for diary in Diary._base_manager.only('id', 'context').order_by('id').iterator(chunk_size=BATCH_SIZE):
+        diary.preview = Truncator(diary.context).chars(PREVIEW_LENGTH)
+        diaries.append(diary)
+        if len(diaries) >= BATCH_SIZE:
+            Diary._base_manager.bulk_update(diaries, ['preview'])
+            diaries = []
+    Diary._base_manager.bulk_update(diaries, ['preview'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('color_diary', '0011_compressed_context'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='diary',
+            name='preview',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.RunPython(fill_previews, migrations.RunPython.noop),
+    ]
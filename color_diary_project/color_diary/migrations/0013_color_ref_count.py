@@ -0,0 +1,52 @@
+# Generated by Django 3.1.8 on 2026-10-18 09:52
+
+from collections import Counter
+
+from django.db import migrations, models
+from django.db.models import Count
+import django.utils.timezone
+
+
+BATCH_SIZE = 500
+
+
+def count_references(apps, schema_editor):
+    Color = apps.get_model('color_diary', 'Color')
+    Diary = apps.get_model('color_diary', 'Diary')
+    counts = Counter()
+    for color_id, count in Color.users.through.objects.values_list('color_id').annotate(count=Count('*')).order_by():
+        counts[color_id] += count
+    for color_id, count in Diary._base_manager.values_list('color_id').annotate(count=Count('*')).order_by():
+        counts[color_id] += count
+
+    colors = []
+    for color in Color.objects.only('id').order_by('id').iterator(chunk_size=BATCH_SIZE):
+        color.ref_count = counts[color.pk]
+        color.unreferenced_since = None if color.ref_count else django.utils.timezone.now()
+        colors.append(color)
+    Color.objects.bulk_update(colors, ['ref_count', 'unreferenced_since'], batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('color_diary', '0012_diary_preview'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='color',
+            name='ref_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='color',
+            name='unreferenced_since',
+            field=models.DateTimeField(blank=True, default=django.utils.timezone.now, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='color',
+            index=models.Index(fields=['ref_count', 'unreferenced_since'], name='color_unreferenced_idx'),
+        ),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.1.8 on 2026-10-18 10:33
+
+import color_diary.models.user
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('color_diary', '0013_color_ref_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='page_version',
+            field=models.CharField(default=color_diary.models.user.new_page_version, editable=False, max_length=16),
+        ),
+    ]
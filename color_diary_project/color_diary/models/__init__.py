@@ -1,3 +1,5 @@
 from .user import *
 from .color import *
-from .diary import *
\ No newline at end of file
+from .diary import *
+from .search import *
+from .summary import *
\ No newline at end of file
@@ -1,4 +1,9 @@
-from django.db import models
+from collections import defaultdict
+
+from django.db import models, router, transaction
+from django.db.models import Case, Count, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 
 from ..fields import HexColor, HexColorField
@@ -7,28 +12,144 @@ from ..fields import HexColor, HexColorField
 class ColorManager(models.Manager):
     def create(self, hex_color):
         # Eliminate duplicates.
-        try:
-            Color.objects.get(hex_color=hex_color)
-        except Color.DoesNotExist:
-            color = super().create(hex_color=hex_color)
-            return color
-        else:
-            color = Color.objects.get(hex_color=hex_color)
-            return color
+        # hex_colorはuniqueなので、同時に作ろうとしても重複しない
+        hex_color = self.model._meta.get_field('hex_color').to_python(hex_color)
+        color, created = self.get_or_create(hex_color=hex_color)
+        if not created and self._keep_unreferenced([color]):
+            color, created = self.get_or_create(hex_color=hex_color)
+        return color
+
+    def create_many(self, hex_colors):
+        # 複数の色を一回のSELECTで探して、無いものだけまとめて作る。{HexColor: Color}を返す。
+        # MySQLのbulk_createはidを返さないので、作った色はもう一度SELECTする。
+        # 同時に同じ色が作られていても、ignore_conflictsでそちらの行を使う
+        field = self.model._meta.get_field('hex_color')
+        hex_colors = [field.to_python(hex_color) for hex_color in hex_colors]
+        colors = {color.hex_color: color for color in self.filter(hex_color__in=hex_colors)}
+        for hex_color in self._keep_unreferenced(colors.values()):
+            del colors[hex_color]
+        missing = [hex_color for hex_color in dict.fromkeys(hex_colors) if hex_color not in colors]
+        if missing:
+            new_colors = [self.model(hex_color=hex_color) for hex_color in missing]
+            for color in new_colors:
+                color.set_hsv()
+            self.bulk_create(new_colors, ignore_conflicts=True)
+            colors.update((color.hex_color, color) for color in self.filter(hex_color__in=missing))
+        return colors
+
+    def _keep_unreferenced(self, colors):
+        # 参照の無い色を使い回す時は、呼んだ側がパレットに入れるまでsweep_colorsに消されないように猶予をやり直す。
+        # sweep_colorsがロックして消している途中なら、UPDATEはその後になる。もう消えていた色のhex_colorを返す
+        orphans = {color.pk: color for color in colors if color.ref_count <= 0}
+        if not orphans:
+            return []
+        if self.filter(pk__in=orphans, ref_count__lte=0).update(unreferenced_since=timezone.now()) == len(orphans):
+            return []
+        kept = set(self.filter(pk__in=orphans).values_list('pk', flat=True))
+        return [color.hex_color for pk, color in orphans.items() if pk not in kept]
+
+    def add_references(self, deltas):
+        # ref_countを{色のid: 増減}の通りに増減する。色がいくつあっても一回のUPDATEで、同じ増減の色はまとめて一つのWHENにする。
+        # 参照が無くなった色にはその時刻を入れておき、sweep_colorsがしばらく経ってから消す
+        color_ids = defaultdict(list)
+        for color_id, delta in deltas.items():
+            if delta:
+                color_ids[delta].append(color_id)
+        if not color_ids:
+            return
+        now = timezone.now()
+        # MySQLは前の列に代入した値を次の列で使うので、ref_countより先に書く
+        self.filter(pk__in=[color_id for ids in color_ids.values() for color_id in ids]).update(
+            unreferenced_since=Case(
+                *[When(pk__in=ids, ref_count__gt=-delta, then=Value(None)) for delta, ids in color_ids.items()],
+                default=Value(now),
+                output_field=models.DateTimeField(),
+            ),
+            ref_count=F('ref_count') + Case(
+                *[When(pk__in=ids, then=Value(delta)) for delta, ids in color_ids.items()],
+                default=Value(0),
+                output_field=models.IntegerField(),
+            ),
+        )
+
+    def recount_references(self, color_ids=None):
+        # パレットと日記から数え直す。ref_countがずれた時のためで、リクエストの中では使わない
+        from .diary import Diary
+
+        Through = self.model.users.through
+        palette_counts = Through.objects.filter(color_id=OuterRef('pk')).values('color_id').annotate(count=Count('*')).values('count')
+        diary_counts = Diary._base_manager.filter(color_id=OuterRef('pk')).values('color_id').annotate(count=Count('*')).values('count')
+        queryset = self.all() if color_ids is None else self.filter(pk__in=color_ids)
+        queryset.update(ref_count=(
+            Coalesce(Subquery(palette_counts, output_field=models.IntegerField()), 0)
+            + Coalesce(Subquery(diary_counts, output_field=models.IntegerField()), 0)
+        ))
+        queryset.filter(ref_count__gt=0).update(unreferenced_since=None)
+        queryset.filter(ref_count__lte=0, unreferenced_since__isnull=True).update(unreferenced_since=timezone.now())
 
 
 class Color(models.Model):
     # todo: 設定としてデフォルト色ファイルとかも作ってみたい
     User = get_user_model()
     users = models.ManyToManyField(User, related_name='colors', related_query_name='color')
-    hex_color = HexColorField(verbose_name='hex color code')
+    hex_color = HexColorField(verbose_name='hex color code', packed=True, unique=True)
+    # 並び替えをデータベースで行うために、hex_colorから計算したHSVとalphaを保存しておく
+    hue = models.FloatField(default=-1, editable=False)
+    saturation = models.FloatField(default=0, editable=False)
+    value = models.FloatField(default=0, editable=False)
+    alpha = models.FloatField(default=1, editable=False)
+    # パレットに入れているユーザーと、この色の日記の数。0になった色はsweep_colorsが消す。
+    # 作ってからパレットに入れるまでの間に消されないように、作った時刻も参照が無くなった時刻とみなす
+    ref_count = models.IntegerField(default=0, editable=False)
+    unreferenced_since = models.DateTimeField(null=True, blank=True, default=timezone.now, editable=False)
     objects = ColorManager()
 
+    # デフォルトの色(透明)
+    TRANSPARENT = HexColor('FF', 'FF', 'FF', 0.0)
+    _default_color_id = None
+
+    # HexColorの大小関係と同じ並び順
+    HSV_ORDERING = ('hue', 'saturation', '-value', 'alpha')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['hue', 'saturation', '-value', 'alpha'], name='color_hsv_idx'),
+            models.Index(fields=['ref_count', 'unreferenced_since'], name='color_unreferenced_idx'),
+        ]
+
     @classmethod
     def get_default_color(cls):
-        transparent = HexColor('FF', 'FF', 'FF', 0.0)
-        default_color = cls.objects.create(hex_color=transparent)
+        default_color = cls.objects.create(hex_color=cls.TRANSPARENT)
         return default_color
 
+    @classmethod
+    def get_default_color_id(cls):
+        # 透明な色のidは一度調べたらプロセス内で使い回し、クエリを発行しない。
+        # ロールバックで消えるかもしれないので、トランザクションの中で調べたidは覚えない。
+        # sweep_colorsは透明な色を消さない。管理画面などで消した時は、そのプロセスではpost_deleteで忘れて
+        # 次に呼ばれた時に作り直すが、他のプロセスは古いidを覚えたままなので再起動が要る
+        if cls._default_color_id is not None:
+            return cls._default_color_id
+
+        color_id = cls.get_default_color().pk
+        if not transaction.get_connection(router.db_for_write(cls)).in_atomic_block:
+            cls._default_color_id = color_id
+        return color_id
+
+    @classmethod
+    def forget_default_color_id(cls):
+        cls._default_color_id = None
+
+    def set_hsv(self):
+        hex_color = self._meta.get_field('hex_color').to_python(self.hex_color)
+        self.hue = hex_color.hue
+        self.saturation = hex_color.saturation
+        self.value = hex_color.value
+        self.alpha = hex_color.alpha
+
+    def save(self, *args, **kwargs):
+        self.set_hsv()
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return str(self.hex_color)
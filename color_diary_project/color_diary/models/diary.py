@@ -1,8 +1,18 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.utils import timezone
+from django.utils.text import Truncator
 
 from . import User, Color
+from ..fields import CompressedTextField
+
+
+PREVIEW_LENGTH = 100
+
+
+def make_preview(context):
+    # テンプレートのtruncatechars:100と同じ
+    return Truncator(context).chars(PREVIEW_LENGTH)
 
 
 class DiaryManager(models.Manager):
@@ -37,4 +47,40 @@ class Diary(models.Model):
     color_level = models.PositiveSmallIntegerField(choices=COLOR_LEVELS, validators=[MinValueValidator(1), MaxValueValidator(10)])
     created_at = models.DateTimeField(default=timezone.now, blank=True)
     updated_at = models.DateTimeField(auto_now=True)
-    context = models.TextField("diary's context", blank=True)
+    context = CompressedTextField("diary's context", blank=True)
+    # contextを展開せずに集計できるように、文字数を保存しておく
+    context_length = models.PositiveIntegerField(default=0, editable=False)
+    # 日記一覧ではcontextを読まずに、これを表示する
+    preview = models.CharField(max_length=PREVIEW_LENGTH, blank=True, editable=False)
+
+    class Meta:
+        # 日記一覧のkeyset paginationで使う
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='diary_user_created_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 作成日時を変えた時に前の日の集計も直せるように、読み込んだ時の値を取っておく
+        instance._loaded_created_at = instance.__dict__.get('created_at')
+        # 色を変えた時に、前の色のref_countを減らせるようにする
+        instance._loaded_color_id = instance.__dict__.get('color_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        # contextが展開されていなければ変わっていないので、文字数もそのまま
+        context = self.__dict__.get('context')
+        if isinstance(context, str):
+            self.context_length = len(context)
+            self.preview = make_preview(context)
+
+        # 日毎の集計(DiaryDailySummary)は、post_saveで同じトランザクションの中で更新する
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+        self._loaded_created_at = self.created_at
+        self._loaded_color_id = self.color_id
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
@@ -0,0 +1,17 @@
+from django.db import models
+
+from . import User, Diary
+
+
+class DiaryNgram(models.Model):
+    # 日記の全文検索のための転置索引。日記の本文を正規化した文字列に含まれるbigramと、その出現回数。
+    # 照合順序によっては違う文字が同じとみなされるので、検索結果は本文で確かめ直す
+    user = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE)
+    diary = models.ForeignKey(Diary, related_name='ngrams', related_query_name='ngram', on_delete=models.CASCADE)
+    gram = models.CharField(max_length=2)
+    count = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'gram'], name='diary_ngram_user_gram_idx'),
+        ]
@@ -0,0 +1,24 @@
+from django.db import models
+
+from . import User
+
+
+class DiaryDailySummary(models.Model):
+    # ユーザーの一日(TIME_ZONEでの日付)毎の日記の集計。日記が変わる度に、その日の分だけ集計し直す
+    user = models.ForeignKey(User, related_name='daily_summaries', related_query_name='daily_summary', on_delete=models.CASCADE)
+    date = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+    color_counts = models.JSONField(default=dict)  # {Colorのid(文字列): 日記の数}
+    color_level_sum = models.PositiveIntegerField(default=0)
+    context_length = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date'], name='diary_daily_summary_unique'),
+        ]
+
+    @property
+    def mean_color_level(self):
+        if self.count == 0:
+            return None
+        return self.color_level_sum / self.count
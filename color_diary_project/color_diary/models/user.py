@@ -1,11 +1,51 @@
+from collections import Counter
+
 from django.contrib.auth.models import BaseUserManager, AbstractBaseUser, PermissionsMixin
 from django.utils.translation import gettext_lazy as _
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count
 from django.core.mail import send_mail
 from django.conf import settings
+from django.utils.crypto import get_random_string
+
+
+def new_page_version():
+    return get_random_string(16)
+
+
+def delete_diaries_of_users(user_ids):
+    # ユーザーを消す時は、日記毎のpost_delete(ref_count、ヒストグラム、一覧ページのversion)を送らずにまとめて消す。
+    # ヒストグラムとversionはユーザーと一緒に消えるので、日記とパレットのref_countだけ色毎に数えて一度に減らす
+    from .color import Color
+    from .diary import Diary
+    from .search import DiaryNgram
+
+    # ロックしている間は、消すユーザーの日記やパレットが増えない
+    user_ids = list(User.objects.select_for_update().filter(pk__in=user_ids).values_list('pk', flat=True))
+    if not user_ids:
+        return
+    diaries = Diary._base_manager.filter(user_id__in=user_ids)
+    deltas = Counter()
+    for color_id, count in diaries.order_by().values_list('color_id').annotate(count=Count('*')):
+        deltas[color_id] -= count
+    palette = Color.users.through.objects.filter(user_id__in=user_ids)
+    for color_id, count in palette.order_by().values_list('color_id').annotate(count=Count('*')):
+        deltas[color_id] -= count
+    Color.objects.add_references(deltas)
 
+    DiaryNgram.objects.filter(user_id__in=user_ids).delete()
+    # QuerySet.deleteはシグナルのあるモデルを一件ずつ消すので、日記は一回のDELETEで消す
+    diaries._raw_delete(diaries.db)
 
-class UserManager(BaseUserManager):
+
+class UserQuerySet(models.QuerySet):
+    def delete(self):
+        with transaction.atomic(using=self.db):
+            delete_diaries_of_users(self.values_list('pk', flat=True))
+            return super().delete()
+
+
+class UserManager(BaseUserManager.from_queryset(UserQuerySet)):
     def create_user(self, email, password=None):
         if not email:
             raise ValueError(_('Users must have an email address.'))
@@ -36,6 +76,9 @@ class User(AbstractBaseUser, PermissionsMixin):
     )
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    # 一覧ページのキャッシュとETagのversion。日記や色が変わった時にpage_cache.invalidate_pagesが変える。
+    # ユーザーの行はリクエスト毎に読まれるので、どのプロセスでも追加のクエリ無しで最新のversionがわかる
+    page_version = models.CharField(max_length=16, default=new_page_version, editable=False)
 
     objects = UserManager()
 
@@ -44,5 +87,19 @@ class User(AbstractBaseUser, PermissionsMixin):
     def __str__(self):
         return self.email
 
+    def save(self, *args, **kwargs):
+        # page_versionは読み込んだ後にinvalidate_pagesで変わっているかもしれないので、古い値を書き戻さない
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'page_version'
+            ]
+        super().save(*args, **kwargs)
+
+    def delete(self, using=None, keep_parents=False):
+        with transaction.atomic(using=using):
+            delete_diaries_of_users([self.pk])
+            return super().delete(using=using, keep_parents=keep_parents)
+
     def email_user(self, subject, message):
         send_mail(subject, message, from_email=getattr(settings, 'EMAIL_HOST_USER'), recipient_list=[self.email])
@@ -0,0 +1,62 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .models import User, new_page_version
+
+
+PAGE_CACHE_ALIAS = getattr(settings, 'PAGE_CACHE_ALIAS', 'default')
+PAGE_CACHE_TIMEOUT = getattr(settings, 'PAGE_CACHE_TIMEOUT', 60 * 60)
+
+
+# ユーザー毎の一覧ページのキャッシュ。
+# キャッシュのキーとETagにはユーザーの行に保存したpage_versionを含めておき、日記や色が変わった時は
+# page_versionを変えて、それまでのページをまとめて使われなくする(古いページはタイムアウトかcullで消える)。
+# versionはデータベースにあるので、キャッシュがプロセス毎(LocMemCache)でも古いページを返す事はない
+
+
+def get_cache():
+    return caches[PAGE_CACHE_ALIAS]
+
+
+def get_page_version(user):
+    return user.page_version
+
+
+def page_cache_key(request):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'color_diary:page:{request.user.pk}:{get_page_version(request.user)}:{path}'
+
+
+def invalidate_pages(user_ids):
+    # コミットされる前に古いversionで作られたページは、コミットの後には使われない
+    user_ids = set(user_ids)
+    if user_ids:
+        User.objects.filter(pk__in=user_ids).update(page_version=new_page_version())
+
+
+def page_etag(request, *args, **kwargs):
+    # 同じversionでも、URLやAcceptが違えば(DRFのbrowsable APIなど)内容が違う
+    value = ':'.join([
+        str(request.user.pk), get_page_version(request.user),
+        request.get_full_path(), request.META.get('HTTP_ACCEPT', ''),
+    ])
+    return hashlib.md5(value.encode()).hexdigest()
+
+
+def conditional_page(view):
+    # If-None-Matchが今のversionと同じなら、ページを作らずに304を返す。
+    # ブラウザが古いページをそのまま使わないように、毎回確かめさせる。
+    # Last-Modifiedは秒までしか表せず、同じ秒の中の変更で古いページの304を返してしまうので付けない
+    conditional_view = condition(etag_func=page_etag)(view)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = conditional_view(request, *args, **kwargs)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+    return wrapper
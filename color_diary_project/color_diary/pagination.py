@@ -0,0 +1,135 @@
+import datetime
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.db.models import Q
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+DIARY_PAGE_SIZE = getattr(settings, 'DIARY_PAGE_SIZE', 20)
+# APIの一覧の1ページの件数。?page_size=で変えられるが、API_MAX_PAGE_SIZEより多くはしない
+API_PAGE_SIZE = getattr(settings, 'API_PAGE_SIZE', 50)
+API_MAX_PAGE_SIZE = getattr(settings, 'API_MAX_PAGE_SIZE', 200)
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+# keyset pagination。OFFSETを使わずに、前のページの最後の行の値より後ろの行を取ってくる。
+# fieldsの組が一意になるように、最後はidなどの一意なフィールドにする。並び順は全て降順
+
+
+def _encode_value(value):
+    if isinstance(value, datetime.datetime):
+        # 精度が落ちないように、マイクロ秒の整数にする
+        delta = value - EPOCH
+        return str((delta.days * 86400 + delta.seconds) * 10 ** 6 + delta.microseconds)
+    return str(value)
+
+
+def _decode_value(field, value):
+    if isinstance(field, models.DateTimeField):
+        return EPOCH + datetime.timedelta(microseconds=int(value))
+    return field.to_python(value)
+
+
+def encode_cursor(values):
+    return '.'.join(_encode_value(value) for value in values)
+
+
+def decode_cursor(model, fields, cursor):
+    values = cursor.split('.')
+    if len(values) != len(fields):
+        raise ValueError('invalid cursor.')
+    try:
+        return [_decode_value(model._meta.get_field(field), value) for field, value in zip(fields, values)]
+    except (ValidationError, OverflowError):
+        raise ValueError('invalid cursor.')
+
+
+def keyset_filter(fields, values):
+    # (a, b) < (x, y) を a < x OR (a = x AND b < y) に展開する
+    conditions = []
+    for index, field in enumerate(fields):
+        lookups = dict(zip(fields[:index], values[:index]))
+        lookups[f'{field}__lt'] = values[index]
+        conditions.append(Q(**lookups))
+    return reduce(or_, conditions)
+
+
+def keyset_paginate(queryset, fields, cursor=None, size=DIARY_PAGE_SIZE):
+    # (そのページの行のリスト, 次のページのcursor)を返す。次のページが無ければcursorはNone。
+    # 次のページがあるかは1件多く取って調べる。行はモデルでもvalues_list(named=True)でもよい。
+    # cursorが不正な時はValueError
+    if cursor:
+        queryset = queryset.filter(keyset_filter(fields, decode_cursor(queryset.model, fields, cursor)))
+    items = list(queryset.order_by(*[f'-{field}' for field in fields])[:size + 1])
+
+    next_cursor = None
+    if len(items) > size:
+        items = items[:size]
+        next_cursor = encode_cursor([getattr(items[-1], field) for field in fields])
+    return items, next_cursor
+
+
+class KeysetPagination(BasePagination):
+    # APIの一覧のkeyset pagination。
+    # {"next": 次のページのURL, "results": [...]}を返し、次のページのURLはLinkヘッダーにも入れて先に読み込めるようにする。
+    # cursorはクライアントが中身に頼らないように、base64にしておく
+    fields = ('created_at', 'id')
+    page_size = API_PAGE_SIZE
+    max_page_size = API_MAX_PAGE_SIZE
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            cursor = urlsafe_base64_decode(cursor).decode('ascii')
+        except ValueError:
+            cursor = ''
+        if not cursor:
+            raise NotFound('invalid cursor.')
+        return cursor
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        try:
+            items, self.next_cursor = keyset_paginate(
+                queryset, self.fields, cursor=self.decode_cursor(request), size=self.get_page_size(request)
+            )
+        except ValueError:
+            raise NotFound('invalid cursor.')
+        return items
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        cursor = urlsafe_base64_encode(self.next_cursor.encode('ascii'))
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        next_link = self.get_next_link()
+        response = Response({'next': next_link, 'results': data})
+        if next_link is not None:
+            response['Link'] = f'<{next_link}>; rel="next"'
+        return response
+
+
+class ColorKeysetPagination(KeysetPagination):
+    # パレットの色には作成日時が無いので、idの順
+    fields = ('id',)
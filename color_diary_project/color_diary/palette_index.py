@@ -0,0 +1,242 @@
+import heapq
+import threading
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db.models import Case, When, Value, FloatField, Q, Count, Max, Sum
+
+from . import colorspace
+from .models import Color, Diary
+
+
+COLOR_LEVELS = [level for level, label in Diary.COLOR_LEVELS]
+MAX_COLOR_LEVEL = max(COLOR_LEVELS)
+# APIで指定できるkとlimitの上限
+NEAREST_MAX_K = getattr(settings, 'NEAREST_MAX_K', 50)
+NEAREST_MAX_LIMIT = getattr(settings, 'NEAREST_MAX_LIMIT', 100)
+
+
+class _Node:
+    __slots__ = ('key', 'point', 'axis', 'left', 'right', 'removed')
+
+    def __init__(self, key, point, axis):
+        self.key = key
+        self.point = point
+        self.axis = axis
+        self.left = None
+        self.right = None
+        self.removed = False
+
+
+class KDTree:
+    # 3次元のk-d木。点は一つずつ追加・削除できる。
+    # 削除した点は印をつけておくだけにして、印のついた点が半分を超えたら作り直す
+    dimension = 3
+
+    def __init__(self, items=()):
+        self._nodes = {}
+        self._root = None
+        self._removed_count = 0
+        self._build([(key, tuple(point)) for key, point in items])
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def _build(self, items):
+        self._nodes = {}
+        self._removed_count = 0
+        self._root = self._build_node(items, 0)
+
+    def _build_node(self, items, depth):
+        if not items:
+            return None
+        axis = depth % self.dimension
+        items = sorted(items, key=lambda item: item[1][axis])
+        median = len(items) // 2
+        key, point = items[median]
+        node = _Node(key, point, axis)
+        self._nodes[key] = node
+        node.left = self._build_node(items[:median], depth + 1)
+        node.right = self._build_node(items[median + 1:], depth + 1)
+        return node
+
+    def insert(self, key, point):
+        if key in self._nodes:
+            self.remove(key)
+        point = tuple(point)
+        if self._root is None:
+            self._root = _Node(key, point, 0)
+            self._nodes[key] = self._root
+            return
+
+        node = self._root
+        while True:
+            side = 'left' if point[node.axis] < node.point[node.axis] else 'right'
+            child = getattr(node, side)
+            if child is None:
+                child = _Node(key, point, (node.axis + 1) % self.dimension)
+                setattr(node, side, child)
+                self._nodes[key] = child
+                return
+            node = child
+
+    def remove(self, key):
+        node = self._nodes.pop(key, None)
+        if node is None:
+            return
+        node.removed = True
+        self._removed_count += 1
+        if self._removed_count > len(self._nodes):
+            self._build([(node.key, node.point) for node in self._nodes.values()])
+
+    def nearest(self, point, k=1):
+        # 近い順に(距離, key)のリストを返す
+        if k < 1:
+            return []
+        point = tuple(point)
+        heap = []  # (-距離の2乗, key)
+
+        def search(node):
+            if node is None:
+                return
+            if not node.removed:
+                distance = sum((a - b) ** 2 for a, b in zip(point, node.point))
+                if len(heap) < k:
+                    heapq.heappush(heap, (-distance, node.key))
+                elif distance < -heap[0][0]:
+                    heapq.heapreplace(heap, (-distance, node.key))
+
+            difference = point[node.axis] - node.point[node.axis]
+            near, far = (node.left, node.right) if difference < 0 else (node.right, node.left)
+            search(near)
+            if len(heap) < k or difference ** 2 < -heap[0][0]:
+                search(far)
+
+        search(self._root)
+        return sorted(((-distance) ** 0.5, key) for distance, key in heap)
+
+
+def palette_signature(user_id):
+    # パレットが変わったかどうかを調べるための値。中間テーブルのindexだけで計算できる
+    signature = Color.users.through.objects.filter(user_id=user_id).aggregate(
+        count=Count('id'), max_id=Max('id'), color_sum=Sum('color_id')
+    )
+    return signature['count'], signature['max_id'], signature['color_sum']
+
+
+class PaletteIndex:
+    # ユーザーのパレットの色をCIE Labの空間に置いたもの。
+    # 色だけの木と、色とcolor_levelの組の木を持つ。色の見え方は日記一覧と同じく白の上に重ねたもの
+    def __init__(self, colors, signature=None):
+        self.signature = signature
+        self.colors = {}
+        self.tree = KDTree()
+        self.weighted_tree = KDTree()
+        self.lock = threading.Lock()
+        self.add(colors)
+
+    def add(self, colors):
+        # colors: {color_id: HexColor.rgba}
+        if not colors:
+            return
+        color_ids = list(colors)
+        rgba = colorspace._as_rgba([colors[color_id] for color_id in color_ids])
+        lab = colorspace.rgb_to_lab(colorspace.over_white(rgba))
+        weighted_lab = {
+            level: colorspace.rgb_to_lab(colorspace.over_white(rgba, level / MAX_COLOR_LEVEL))
+            for level in COLOR_LEVELS
+        }
+        with self.lock:
+            for index, color_id in enumerate(color_ids):
+                self.colors[color_id] = colors[color_id]
+                self.tree.insert(color_id, lab[index])
+                for level in COLOR_LEVELS:
+                    self.weighted_tree.insert((color_id, level), weighted_lab[level][index])
+
+    def remove(self, color_ids):
+        with self.lock:
+            for color_id in color_ids:
+                if self.colors.pop(color_id, None) is None:
+                    continue
+                self.tree.remove(color_id)
+                for level in COLOR_LEVELS:
+                    self.weighted_tree.remove((color_id, level))
+
+    def nearest(self, hex_color, k=5, weighted=False):
+        point = colorspace.rgb_to_lab(colorspace.over_white([hex_color.rgba]))[0]
+        with self.lock:
+            if weighted:
+                return self.weighted_tree.nearest(point, k)
+            return self.tree.nearest(point, k)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def _load_palette(user_id):
+    return {
+        color_id: hex_color.rgba
+        for color_id, hex_color in Color.objects.filter(users__id=user_id).values_list('id', 'hex_color')
+    }
+
+
+def get_palette_index(user_id):
+    # 同じプロセス内ではユーザー毎の索引を使い回す。
+    # 他のプロセスでパレットが変わっていたら、signatureが変わるので作り直す
+    signature = palette_signature(user_id)
+    with _indexes_lock:
+        index = _indexes.get(user_id)
+    if index is not None and index.signature == signature:
+        return index
+
+    index = PaletteIndex(_load_palette(user_id), signature=signature)
+    with _indexes_lock:
+        _indexes[user_id] = index
+    return index
+
+
+def forget_palette_index(user_id):
+    with _indexes_lock:
+        _indexes.pop(user_id, None)
+
+
+def palette_changed(user_id, action, color_ids):
+    # m2m_changedから呼ばれる。このプロセスに索引があれば、作り直さずに差分だけ反映する
+    with _indexes_lock:
+        index = _indexes.get(user_id)
+    if index is None:
+        return
+
+    if action == 'post_add':
+        colors = {
+            color_id: hex_color.rgba
+            for color_id, hex_color in Color.objects.filter(id__in=color_ids).values_list('id', 'hex_color')
+        }
+        index.add(colors)
+    elif action == 'post_remove':
+        index.remove(color_ids)
+    else:
+        forget_palette_index(user_id)
+        return
+    index.signature = palette_signature(user_id)
+
+
+def nearest_diaries(user, hex_color, k=5, weighted=False, limit=20):
+    # hex_colorに近い色の日記を、色の近い順・新しい順に返す。
+    # weightedのときはcolor_levelで薄めた見た目の色で比べる。distanceにΔE(CIE76)が入る
+    nearest = get_palette_index(user.pk).nearest(hex_color, k=k, weighted=weighted)
+    if not nearest or limit < 1:
+        return Diary.objects.filter(user, pk__in=[])
+
+    if weighted:
+        conditions = [Q(color_id=color_id, color_level=level) for distance, (color_id, level) in nearest]
+    else:
+        conditions = [Q(color_id=color_id) for distance, color_id in nearest]
+    # KDTreeの距離はnumpy.float64で、MySQLのドライバは文字列として渡してしまうのでfloatにする
+    distances = [When(condition, then=Value(float(distance), output_field=FloatField())) for condition, (distance, key) in zip(conditions, nearest)]
+
+    return Diary.objects.filter(user).filter(reduce(or_, conditions)).select_related('user', 'color').annotate(
+        distance=Case(*distances, output_field=FloatField())
+    ).order_by('distance', '-created_at')[:limit]
@@ -0,0 +1,95 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Color, Diary, User
+from .page_cache import invalidate_pages
+from .summary import remap_daily_summaries
+
+
+RECOLOR_CHUNK_SIZE = getattr(settings, 'RECOLOR_CHUNK_SIZE', 1000)
+
+
+# パレットの色の付け替え。ユーザーの日記の色を{前の色: 新しい色}の通りに付け替え、パレットも入れ替える。
+# 日記が多いとUPDATEが長くロックするので、日記はidの順に少しずつ、別々のトランザクションで付け替える。
+# パレットとヒストグラムの入れ替えは、ユーザーの行をロックしてからまとめて一つのトランザクションで行う。
+# 途中で失敗しても新しい色はパレットに入っているので、日記が前の色と新しい色に分かれるだけで、
+# もう一度呼べば残りが付け替えられる。誰も使わなくなった色は、ここでは消さずにsweep_colorsが消す
+
+
+def _lock_user(user):
+    # 同じユーザーの付け替えや色の削除を、順番に行わせる
+    User.objects.select_for_update().filter(pk=user.pk).exists()
+
+
+def _normalize_color_map(color_map):
+    color_map = {
+        getattr(from_color, 'pk', from_color): getattr(to_color, 'pk', to_color)
+        for from_color, to_color in color_map.items()
+    }
+    color_map = {from_color_id: to_color_id for from_color_id, to_color_id in color_map.items() if from_color_id != to_color_id}
+    if color_map.keys() & set(color_map.values()):
+        # A->B, B->Cのような付け替えは、日記を付け替える順番で結果が変わってしまう
+        raise ValueError('a color cannot be both replaced and a replacement.')
+    if Color.get_default_color_id() in color_map:
+        raise ValueError('the default color cannot be replaced.')
+    return color_map
+
+
+def _recolor(diaries, color_map):
+    # QuerySet.updateではpost_saveが送られないので、ref_countはここで増減する
+    recolored = 0
+    deltas = Counter()
+    for from_color_id, to_color_id in color_map.items():
+        count = diaries.filter(color_id=from_color_id).update(color_id=to_color_id)
+        deltas[from_color_id] -= count
+        deltas[to_color_id] += count
+        recolored += count
+    Color.objects.add_references(deltas)
+    return recolored
+
+
+def _recolor_chunk(user, color_map, diaries):
+    # 読んだ後に色が変えられた日記は付け替えない
+    return _recolor(Diary._base_manager.filter(user=user, pk__in=[diary_id for diary_id, color_id in diaries]), color_map)
+
+
+def remap_colors(user, color_map, chunk_size=None):
+    '''
+    Replace the colors of the user's diaries and palette.
+    color_map is {previous Color or id: new Color or id}. Returns the number of recolored diaries.
+    '''
+    chunk_size = chunk_size or RECOLOR_CHUNK_SIZE
+    color_map = _normalize_color_map(color_map)
+    if not color_map:
+        return 0
+
+    with transaction.atomic():
+        _lock_user(user)
+        user.colors.add(*set(color_map.values()))
+
+    recolored = 0
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            diaries = list(
+                Diary._base_manager.filter(user=user, color_id__in=color_map, pk__gt=last_id)
+                .order_by('pk').values_list('pk', 'color_id')[:chunk_size]
+            )
+            if not diaries:
+                break
+            recolored += _recolor_chunk(user, color_map, diaries)
+        last_id = diaries[-1][0]
+        if len(diaries) < chunk_size:
+            break
+
+    with transaction.atomic():
+        _lock_user(user)
+        # 付け替えている間に前の色で書かれた日記も、ここで付け替える
+        recolored += _recolor(Diary._base_manager.filter(user=user), color_map)
+        remap_daily_summaries([user.pk], color_map)
+        user.colors.remove(*color_map.keys())
+
+    invalidate_pages([user.pk])
+    return recolored
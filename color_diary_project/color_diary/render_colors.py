@@ -0,0 +1,35 @@
+import numpy as np
+
+from . import colorspace
+
+
+HOVERED_FONT_ALPHA = 0.6  # メニューにホバーしている時の文字の不透明度
+
+
+def css_color(rgb):
+    return f'#{int(rgb):06x}'
+
+
+def diary_card_colors(hex_colors, color_levels):
+    # 日記の色と濃さの列から、カードのbackground, border, fontの色(0xRRGGBB)の列をまとめて計算する
+    rgba = colorspace.pack(hex_colors)
+    color_levels = np.fromiter(color_levels, dtype=np.int64, count=len(rgba))
+    return colorspace.diary_colors(rgba, color_levels)
+
+
+def attach_diary_colors(diaries):
+    # 日記にbackground_color, border_color, font_color, hovered_font_colorをCSSの値で付ける。
+    # ページの日記をまとめてcolorspace.diary_colorsで計算する。日記のcolorは読み込んでおく
+    diaries = list(diaries)
+    if not diaries:
+        return diaries
+    backgrounds, borders, fonts = diary_card_colors(
+        [diary.color.hex_color for diary in diaries], [diary.color_level for diary in diaries],
+    )
+
+    for diary, background, border, font in zip(diaries, backgrounds, borders, fonts):
+        diary.background_color = css_color(background)
+        diary.border_color = css_color(border)
+        diary.font_color = css_color(font)
+        diary.hovered_font_color = f'rgba({font >> 16}, {font >> 8 & 0xFF}, {font & 0xFF}, {HOVERED_FONT_ALPHA})'
+    return diaries
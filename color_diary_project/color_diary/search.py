@@ -0,0 +1,154 @@
+import unicodedata
+from collections import Counter
+
+from django.conf import settings
+from django.db.models import Count, Sum
+
+from .models import Diary, DiaryNgram
+
+
+SEARCH_RESULT_LIMIT = getattr(settings, 'SEARCH_RESULT_LIMIT', 50)  # APIで指定できるlimitの上限も兼ねる
+SNIPPET_MARGIN = 30  # スニペットで、一致した部分の前後に表示する文字数
+
+
+# 日記の本文のbigramの転置索引(DiaryNgram)を使った全文検索。
+# 日本語は分かち書きをしないので、単語ではなく文字のbigramで索引を作る
+
+
+def normalize(text):
+    # 全角の英数字・半角カナなどをNFKCでそろえ、英字を小文字にする。
+    # 元の文字列での位置に戻せるように一文字ずつ正規化して、正規化した各文字の元の位置も返す
+    chars = []
+    positions = []
+    for position, char in enumerate(text):
+        for normalized_char in unicodedata.normalize('NFKC', char).lower():
+            chars.append(normalized_char)
+            positions.append(position)
+    return ''.join(chars), positions
+
+
+def ngram_counts(text):
+    # 空白で区切った語ごとのbigramの出現回数。
+    # 語の最後の文字は一文字のgramにするので、どの文字もその文字から始まるgramが必ずある
+    counts = Counter()
+    for word in normalize(text)[0].split():
+        for index in range(len(word)):
+            counts[word[index:index + 2]] += 1
+    return counts
+
+
+def update_diary_ngrams(diary):
+    # 変わったgramだけを書き換える
+    counts = ngram_counts(diary.context)
+    ngrams = {ngram.gram: ngram for ngram in DiaryNgram.objects.filter(diary=diary)}
+
+    removed_ids = [ngram.pk for gram, ngram in ngrams.items() if gram not in counts]
+    changed_ngrams = []
+    added_ngrams = []
+    for gram, count in counts.items():
+        ngram = ngrams.get(gram)
+        if ngram is None:
+            added_ngrams.append(DiaryNgram(user_id=diary.user_id, diary=diary, gram=gram, count=count))
+        elif ngram.count != count:
+            ngram.count = count
+            changed_ngrams.append(ngram)
+
+    if removed_ids:
+        DiaryNgram.objects.filter(pk__in=removed_ids).delete()
+    if changed_ngrams:
+        DiaryNgram.objects.bulk_update(changed_ngrams, ['count'])
+    if added_ngrams:
+        DiaryNgram.objects.bulk_create(added_ngrams)
+
+
+def _find_spans(normalized, words):
+    spans = []
+    for word in words:
+        start = normalized.find(word)
+        while start != -1:
+            spans.append((start, start + len(word)))
+            start = normalized.find(word, start + 1)
+    return sorted(spans)
+
+
+def make_snippet(context, words):
+    # 最初に一致した部分の前後を切り出す。highlightsはスニペットの中で一致した部分の(開始, 終了)のリスト。
+    # 一致しない語があればNone
+    normalized, positions = normalize(context)
+    if any(word not in normalized for word in words):
+        return None
+
+    spans = [(positions[start], positions[end - 1] + 1) for start, end in _find_spans(normalized, words)]
+    snippet_start = max(spans[0][0] - SNIPPET_MARGIN, 0)
+    snippet_end = min(spans[0][1] + SNIPPET_MARGIN, len(context))
+
+    highlights = []
+    for start, end in spans:
+        start = max(start, snippet_start) - snippet_start
+        end = min(end, snippet_end) - snippet_start
+        if start >= end:
+            continue
+        if highlights and start <= highlights[-1][1]:
+            highlights[-1] = (highlights[-1][0], max(highlights[-1][1], end))
+        else:
+            highlights.append((start, end))
+    return context[snippet_start:snippet_end], highlights
+
+
+def split_snippet(snippet, highlights):
+    # テンプレートで表示するために、(文字列, 一致した部分かどうか)のリストにする
+    pieces = []
+    position = 0
+    for start, end in highlights:
+        if position < start:
+            pieces.append((snippet[position:start], False))
+        pieces.append((snippet[start:end], True))
+        position = end
+    if position < len(snippet):
+        pieces.append((snippet[position:], False))
+    return pieces
+
+
+def search_diaries(user, query, limit=SEARCH_RESULT_LIMIT):
+    # queryの全ての語を含む日記を、一致したgramの出現回数の多い順・新しい順に最大limit件返す。
+    # 日記にはscore, snippet, highlights, snippet_piecesを付ける
+    words = normalize(query)[0].split()
+    if not words:
+        return []
+
+    grams = set()
+    prefixes = set()
+    for word in words:
+        if len(word) == 1:
+            prefixes.add(word)
+        else:
+            grams.update(word[index:index + 2] for index in range(len(word) - 1))
+
+    candidates = DiaryNgram.objects.filter(user=user)
+    for prefix in prefixes:
+        candidates = candidates.filter(
+            diary_id__in=DiaryNgram.objects.filter(user=user, gram__startswith=prefix).values('diary_id')
+        )
+    if grams:
+        candidates = candidates.filter(gram__in=grams)
+    else:
+        candidates = candidates.filter(gram__startswith=min(prefixes))
+    candidates = candidates.values('diary_id').annotate(matched=Count('gram', distinct=True), score=Sum('count'))
+    if grams:
+        candidates = candidates.filter(matched=len(grams))
+    candidates = candidates.order_by('-score', '-diary__created_at', '-diary_id')[:limit]
+
+    scores = {candidate['diary_id']: candidate['score'] for candidate in candidates}
+    diaries = Diary.objects.filter(user, pk__in=scores).select_related('user', 'color').in_bulk()
+
+    results = []
+    for diary_id, score in scores.items():
+        diary = diaries.get(diary_id)
+        snippet = diary and make_snippet(diary.context, words)
+        if snippet is None:
+            continue
+        diary.score = score
+        diary.snippet, diary.highlights = snippet
+        diary.snippet_pieces = split_snippet(diary.snippet, diary.highlights)
+        results.append(diary)
+    return results
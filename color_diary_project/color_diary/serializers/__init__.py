@@ -1,3 +1,4 @@
 from .color import *
 from .diary import *
-from .user import *
\ No newline at end of file
+from .user import *
+from .summary import *
\ No newline at end of file
@@ -7,6 +7,8 @@ class ColorSerializer(serializers.ModelSerializer):
     class Meta:
         model = Color
         fields = ['id', 'hex_color']
+        # 同じhex_colorのColorがあればColor.objects.createがそれを返すので、重複はエラーにしない
+        extra_kwargs = {'hex_color': {'validators': []}}
 
     def to_representation(self, instance):
         '''
@@ -1,15 +1,126 @@
-from rest_framework import serializers
+from django.conf import settings
+from django.db.models import QuerySet
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
 
 from ..models import Diary
+from ..render_colors import attach_diary_colors, css_color, diary_card_colors
 from .color import ColorSerializer
 from .user import UserSerializer
 
 
+PREVIEW_VALUES = ('id', 'color_id', 'color__hex_color', 'color_level', 'created_at', 'updated_at', 'preview')
+
+
+class DiaryListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        # ページの日記のカードの色は、まとめて計算しておく
+        return super().to_representation(attach_diary_colors(data.all() if hasattr(data, 'all') else data))
+
+
 class DiarySerializer(serializers.ModelSerializer):
     color = ColorSerializer()
     user = UserSerializer()
+    # 一覧のカードの色(CSSの値)
+    background_color = serializers.SerializerMethodField()
+    border_color = serializers.SerializerMethodField()
+    font_color = serializers.SerializerMethodField()
 
     class Meta:
         model = Diary
-        fields = ['id', 'color_level', 'created_at', 'updated_at', 'context']
-        read_only_fields = ['user', 'color']
\ No newline at end of file
+        fields = [
+            'id', 'user', 'color', 'color_level', 'created_at', 'updated_at', 'context', 'preview',
+            'background_color', 'border_color', 'font_color',
+        ]
+        read_only_fields = ['user', 'color']
+        list_serializer_class = DiaryListSerializer
+
+    def get_diary_color(self, diary, attr):
+        if not hasattr(diary, attr):
+            attach_diary_colors([diary])
+        return getattr(diary, attr)
+
+    def get_background_color(self, diary):
+        return self.get_diary_color(diary, 'background_color')
+
+    def get_border_color(self, diary):
+        return self.get_diary_color(diary, 'border_color')
+
+    def get_font_color(self, diary):
+        return self.get_diary_color(diary, 'font_color')
+
+
+class DiaryPreviewSerializer(DiarySerializer):
+    # 一覧用。contextを読まずにpreviewだけを返す
+    class Meta(DiarySerializer.Meta):
+        fields = [
+            'id', 'user', 'color', 'color_level', 'created_at', 'updated_at', 'preview',
+            'background_color', 'border_color', 'font_color',
+        ]
+
+
+def _datetime_representation():
+    # DRFのDateTimeField.to_representationと同じ結果を返す。行毎にタイムゾーンの設定を読まないようにする
+    if api_settings.DATETIME_FORMAT != ISO_8601:
+        return serializers.DateTimeField().to_representation
+    current_timezone = timezone.get_current_timezone() if settings.USE_TZ else None
+
+    def to_representation(value):
+        if value is None:
+            return None
+        if current_timezone is not None and timezone.is_aware(value):
+            value = value.astimezone(current_timezone)
+        value = value.isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    return to_representation
+
+
+def diary_preview_rows(queryset):
+    # serialize_diary_previewsに渡す行。keyset_paginateで使えるように、名前付きのtupleにする
+    return queryset.values_list(*PREVIEW_VALUES, named=True)
+
+
+def serialize_diary_previews(rows, user):
+    '''
+    Return the same list as DiaryPreviewSerializer(queryset, many=True).data
+    from values_list() rows, without creating Diary, Color or serializer instances per row.
+    rows is a queryset or the rows of diary_preview_rows(), and must only contain the diaries of user.
+    '''
+    if isinstance(rows, QuerySet):
+        rows = diary_preview_rows(rows)
+    rows = list(rows)
+    if not rows:
+        return []
+
+    # ユーザーと色は同じものが何度も出てくるので、一度だけ作って使い回す
+    user_data = UserSerializer(user).data
+    colors = {}
+    for row in rows:
+        if row[1] not in colors:
+            hex_color = row[2]
+            colors[row[1]] = {
+                'id': row[1],
+                'hex_color': {'code': f'#{hex_color.red}{hex_color.green}{hex_color.blue}', 'alpha': hex_color.alpha},
+            }
+    backgrounds, borders, fonts = diary_card_colors([row[2] for row in rows], [row[3] for row in rows])
+
+    datetime_to_representation = _datetime_representation()
+    return [
+        {
+            'id': diary_id,
+            'user': user_data,
+            'color': colors[color_id],
+            'color_level': color_level,
+            'created_at': datetime_to_representation(created_at),
+            'updated_at': datetime_to_representation(updated_at),
+            'preview': preview,
+            'background_color': css_color(background),
+            'border_color': css_color(border),
+            'font_color': css_color(font),
+        }
+        for (diary_id, color_id, hex_color, color_level, created_at, updated_at, preview), background, border, font
+        in zip(rows, backgrounds, borders, fonts)
+    ]
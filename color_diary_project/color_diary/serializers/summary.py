@@ -0,0 +1,11 @@
+from rest_framework import serializers
+
+from ..models import DiaryDailySummary
+
+
+class DiaryDailySummarySerializer(serializers.ModelSerializer):
+    mean_color_level = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = DiaryDailySummary
+        fields = ['date', 'count', 'color_counts', 'mean_color_level', 'context_length']
@@ -1,6 +1,10 @@
-from django.db.models.signals import post_save
-from .models import Color, User
-from .fields import parse_hex_color
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
+from .models import Color, Diary, User
+from .fields import CompressedText, parse_hex_color
+from .page_cache import invalidate_pages
+from .palette_index import palette_changed, forget_palette_index
+from .search import update_diary_ngrams
+from .summary import local_date, refresh_daily_summary, recolor_daily_summaries
 
 
 hex_color_list = [
@@ -15,16 +19,189 @@ hex_color_list = [
 ]
 
 
-def default_color_setting(sender, instance, created, **kwargs):
-    default_color = Color.get_default_color()
-    for hex_color in hex_color_list:
-        color = Color.objects.create(hex_color=parse_hex_color(hex_color))
-        color.users.add(instance)
-        color.save()
+default_hex_colors = [parse_hex_color(hex_color) for hex_color in hex_color_list]
 
-    if created:
-        default_color.users.add(instance)
-        default_color.save()
+
+def default_color_setting(sender, instance, created, raw=False, **kwargs):
+    # ユーザーが作られた時だけ、透明な色とデフォルトの色をまとめて追加する。
+    # bulk_createなのでm2m_changedは送られないが、新しいユーザーのパレットの索引は下で捨てている
+    if not created or raw:
+        return
+
+    colors = Color.objects.create_many([Color.TRANSPARENT] + default_hex_colors)
+    Through = Color.users.through
+    Through.objects.bulk_create([Through(color_id=color.pk, user_id=instance.pk) for color in colors.values()])
+    Color.objects.add_references({color.pk: 1 for color in colors.values()})
 
 
 post_save.connect(receiver=default_color_setting, sender=User, dispatch_uid='default_color_setting', weak=False)
+
+
+def forget_palette_index_of_new_user(sender, instance, created, **kwargs):
+    if created:
+        forget_palette_index(instance.pk)
+
+
+def update_palette_index(sender, instance, action, reverse, pk_set, **kwargs):
+    # パレットの索引に差分を反映する。
+    # clearの時は対象がわからないので、次に使う時にsignatureの違いから作り直される
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if reverse: # user.colors.add(color)
+        palette_changed(instance.pk, action, pk_set)
+    else: # color.users.add(user)
+        for user_id in pk_set or []:
+            palette_changed(user_id, action, [instance.pk])
+
+
+post_save.connect(receiver=forget_palette_index_of_new_user, sender=User, dispatch_uid='forget_palette_index_of_new_user', weak=False)
+m2m_changed.connect(receiver=update_palette_index, sender=Color.users.through, dispatch_uid='update_palette_index', weak=False)
+
+
+def forget_default_color_id(sender, instance, **kwargs):
+    if instance.hex_color == Color.TRANSPARENT:
+        Color.forget_default_color_id()
+
+
+post_delete.connect(receiver=forget_default_color_id, sender=Color, dispatch_uid='forget_default_color_id', weak=False)
+
+
+def update_search_index(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # 日記を消した時は、DiaryNgramもCASCADEで消える
+    if raw or (update_fields is not None and 'context' not in update_fields):
+        return
+    context = instance.__dict__.get('context')
+    if context is None or isinstance(context, CompressedText):
+        # 読み込んでいないか、読み込んでから参照していないので、本文は変わっていない
+        return
+    update_diary_ngrams(instance)
+
+
+post_save.connect(receiver=update_search_index, sender=Diary, dispatch_uid='update_search_index', weak=False)
+
+
+def update_daily_summary(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # 日記の日と、作成日時を変えた時は前の日も集計し直す
+    if raw or (update_fields is not None and not {'created_at', 'color', 'color_level', 'context'} & set(update_fields)):
+        return
+    dates = {local_date(instance.created_at)}
+    loaded_created_at = getattr(instance, '_loaded_created_at', None)
+    if loaded_created_at is not None:
+        dates.add(local_date(loaded_created_at))
+    for date in dates:
+        refresh_daily_summary(instance.user_id, date)
+
+
+def update_daily_summary_after_delete(sender, instance, **kwargs):
+    refresh_daily_summary(instance.user_id, local_date(instance.created_at))
+
+
+def remember_users_of_deleted_color(sender, instance, **kwargs):
+    instance._diary_user_ids = list(Diary._base_manager.filter(color=instance).values_list('user_id', flat=True).distinct())
+
+
+def recolor_daily_summaries_of_deleted_color(sender, instance, **kwargs):
+    # 消した色の日記は、on_deleteでデフォルトの色になっている
+    user_ids = getattr(instance, '_diary_user_ids', None)
+    if user_ids:
+        recolor_daily_summaries(user_ids, instance.pk, Color.get_default_color_id())
+
+
+post_save.connect(receiver=update_daily_summary, sender=Diary, dispatch_uid='update_daily_summary', weak=False)
+post_delete.connect(receiver=update_daily_summary_after_delete, sender=Diary, dispatch_uid='update_daily_summary_after_delete', weak=False)
+pre_delete.connect(receiver=remember_users_of_deleted_color, sender=Color, dispatch_uid='remember_users_of_deleted_color', weak=False)
+post_delete.connect(receiver=recolor_daily_summaries_of_deleted_color, sender=Color, dispatch_uid='recolor_daily_summaries_of_deleted_color', weak=False)
+
+
+def invalidate_pages_of_diary(sender, instance, **kwargs):
+    invalidate_pages([instance.user_id])
+
+
+def invalidate_pages_of_palette(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse: # user.colors.add(color)
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            invalidate_pages([instance.pk])
+    elif action == 'pre_clear': # color.users.clear()はpost_clearでは誰が外されたかわからない
+        invalidate_pages(instance.users.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        invalidate_pages(pk_set or [])
+
+
+def remember_palette_users_of_deleted_color(sender, instance, **kwargs):
+    # 色を消すとパレットの中間テーブルの行はCASCADEで消え、m2m_changedは送られない
+    instance._palette_user_ids = list(instance.users.values_list('pk', flat=True))
+
+
+def invalidate_pages_of_deleted_color(sender, instance, **kwargs):
+    # 消した色の日記もデフォルトの色になっている
+    invalidate_pages(getattr(instance, '_palette_user_ids', []) + getattr(instance, '_diary_user_ids', []))
+
+
+post_save.connect(receiver=invalidate_pages_of_diary, sender=Diary, dispatch_uid='invalidate_pages_of_saved_diary', weak=False)
+post_delete.connect(receiver=invalidate_pages_of_diary, sender=Diary, dispatch_uid='invalidate_pages_of_deleted_diary', weak=False)
+m2m_changed.connect(receiver=invalidate_pages_of_palette, sender=Color.users.through, dispatch_uid='invalidate_pages_of_palette', weak=False)
+pre_delete.connect(receiver=remember_palette_users_of_deleted_color, sender=Color, dispatch_uid='remember_palette_users_of_deleted_color', weak=False)
+post_delete.connect(receiver=invalidate_pages_of_deleted_color, sender=Color, dispatch_uid='invalidate_pages_of_deleted_color', weak=False)
+
+
+# Colorのref_count(パレットに入れているユーザーと、その色の日記の数)を差分で保つ。
+# QuerySet.updateで日記の色を変える時は、呼んだ側でadd_referencesする(recolor.py)。
+# ユーザーを消す時は、日記とパレットの分をmodels.user.delete_diaries_of_usersがまとめて減らす
+
+
+def count_diary_reference(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and not {'color', 'color_id'} & set(update_fields)):
+        return
+    loaded_color_id = getattr(instance, '_loaded_color_id', None)
+    if created:
+        Color.objects.add_references({instance.color_id: 1})
+    elif loaded_color_id is not None and loaded_color_id != instance.color_id:
+        Color.objects.add_references({loaded_color_id: -1, instance.color_id: 1})
+
+
+def release_diary_reference(sender, instance, **kwargs):
+    Color.objects.add_references({instance.color_id: -1})
+
+
+def count_palette_references(sender, instance, action, reverse, pk_set, **kwargs):
+    # post_removeのpk_setは外そうとしたidで、パレットに無かったものも含むので、pre_removeで実際にある行を調べておく
+    if action in ('pre_remove', 'pre_clear'):
+        if reverse: # user.colors.remove(color)
+            rows = sender.objects.filter(user_id=instance.pk).values_list('color_id', flat=True)
+            if action == 'pre_remove':
+                rows = rows.filter(color_id__in=pk_set)
+        else: # color.users.remove(user)
+            rows = sender.objects.filter(color_id=instance.pk).values_list('user_id', flat=True)
+            if action == 'pre_remove':
+                rows = rows.filter(user_id__in=pk_set)
+        instance._removed_palette_ids = list(rows)
+        return
+
+    if action == 'post_add':
+        delta, ids = 1, pk_set or []
+    elif action in ('post_remove', 'post_clear'):
+        delta, ids = -1, instance.__dict__.pop('_removed_palette_ids', [])
+    else:
+        return
+    if reverse:
+        Color.objects.add_references({color_id: delta for color_id in ids})
+    else:
+        Color.objects.add_references({instance.pk: delta * len(ids)})
+
+
+def remember_diary_count_of_deleted_color(sender, instance, **kwargs):
+    instance._diary_count = Diary._base_manager.filter(color=instance).count()
+
+
+def count_diaries_moved_to_default_color(sender, instance, **kwargs):
+    # 消した色の日記は、on_deleteでデフォルトの色になっている
+    if getattr(instance, '_diary_count', 0):
+        Color.objects.add_references({Color.get_default_color_id(): instance._diary_count})
+
+
+post_save.connect(receiver=count_diary_reference, sender=Diary, dispatch_uid='count_diary_reference', weak=False)
+post_delete.connect(receiver=release_diary_reference, sender=Diary, dispatch_uid='release_diary_reference', weak=False)
+m2m_changed.connect(receiver=count_palette_references, sender=Color.users.through, dispatch_uid='count_palette_references', weak=False)
+pre_delete.connect(receiver=remember_diary_count_of_deleted_color, sender=Color, dispatch_uid='remember_diary_count_of_deleted_color', weak=False)
+post_delete.connect(receiver=count_diaries_moved_to_default_color, sender=Color, dispatch_uid='count_diaries_moved_to_default_color', weak=False)
@@ -0,0 +1,89 @@
+import datetime
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .models import Diary, DiaryDailySummary
+
+
+def local_date(created_at):
+    return timezone.localdate(created_at)
+
+
+def local_day_range(date):
+    # TIME_ZONEでのその日の始まりと、次の日の始まり
+    start = timezone.make_aware(datetime.datetime.combine(date, datetime.time()))
+    end = timezone.make_aware(datetime.datetime.combine(date + datetime.timedelta(days=1), datetime.time()))
+    return start, end
+
+
+def refresh_daily_summary(user_id, date):
+    # その日の日記から集計し直す。日記が無くなった日の行は消す。
+    # 同じ日の日記が同時に変わっても取りこぼさないように、集計の前にその日の行をロックする
+    with transaction.atomic():
+        summary, created = DiaryDailySummary.objects.select_for_update().get_or_create(user_id=user_id, date=date)
+
+        start, end = local_day_range(date)
+        diaries = Diary._base_manager.filter(user_id=user_id, created_at__gte=start, created_at__lt=end)
+        totals = diaries.aggregate(
+            count=Count('id'), color_level_sum=Sum('color_level'), context_length=Sum('context_length')
+        )
+        if totals['count'] == 0:
+            summary.delete()
+            return None
+
+        summary.count = totals['count']
+        summary.color_level_sum = totals['color_level_sum']
+        summary.context_length = totals['context_length']
+        summary.color_counts = {
+            str(color_id): count
+            for color_id, count in diaries.order_by().values_list('color_id').annotate(count=Count('id'))
+        }
+        summary.save()
+        return summary
+
+
+def recolor_daily_summaries(user_ids, from_color_id, to_color_id):
+    remap_daily_summaries(user_ids, {from_color_id: to_color_id})
+
+
+def remap_daily_summaries(user_ids, color_map):
+    # 日記の色をまとめて付け替えた時に、ヒストグラムのキーを付け替える。日記は読まない。
+    # color_mapは{前の色のid: 新しい色のid}。
+    # 数字のキーはhas_keyで配列の添字とみなされてしまうので、キーの有無はPythonで調べる
+    color_map = {str(from_color_id): str(to_color_id) for from_color_id, to_color_id in color_map.items()}
+    with transaction.atomic():
+        changed_summaries = []
+        for summary in DiaryDailySummary.objects.filter(user_id__in=user_ids).select_for_update():
+            if not color_map.keys() & summary.color_counts.keys():
+                continue
+            color_counts = Counter()
+            for color_id, count in summary.color_counts.items():
+                color_counts[color_map.get(color_id, color_id)] += count
+            summary.color_counts = dict(color_counts)
+            changed_summaries.append(summary)
+        DiaryDailySummary.objects.bulk_update(changed_summaries, ['color_counts'])
+
+
+def build_daily_summaries(user_id, chunk_size=2000):
+    # ユーザーの集計を全て作り直す。日記は古い順にchunk_size件ずつ読む
+    summaries = {}
+    diaries = Diary._base_manager.filter(user_id=user_id).order_by('created_at').values_list(
+        'created_at', 'color_id', 'color_level', 'context_length'
+    )
+    for created_at, color_id, color_level, context_length in diaries.iterator(chunk_size=chunk_size):
+        date = local_date(created_at)
+        summary = summaries.get(date)
+        if summary is None:
+            summary = summaries[date] = DiaryDailySummary(user_id=user_id, date=date, color_counts={})
+        summary.count += 1
+        summary.color_counts[str(color_id)] = summary.color_counts.get(str(color_id), 0) + 1
+        summary.color_level_sum += color_level
+        summary.context_length += context_length
+
+    with transaction.atomic():
+        DiaryDailySummary.objects.filter(user_id=user_id).delete()
+        DiaryDailySummary.objects.bulk_create(summaries.values(), batch_size=chunk_size)
+    return len(summaries)
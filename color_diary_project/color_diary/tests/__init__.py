@@ -4,4 +4,15 @@ from .fields import *
 from .models import *
 from .signals import *
 from .views import *
-from .forms import *
\ No newline at end of file
+from .forms import *
+from .colorspace import *
+from .palette_index import *
+from .pagination import *
+from .search import *
+from .summary import *
+from .middleware import *
+from .utils import *
+from .page_cache import *
+from .sessions import *
+from .recolor import *
+from .refcount import *
\ No newline at end of file
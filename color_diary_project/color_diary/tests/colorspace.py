@@ -0,0 +1,69 @@
+import math
+import random
+
+from django.test import SimpleTestCase
+
+from .. import colorspace
+from ..fields import HexColor, parse_hex_color
+
+
+class ColorspaceTests(SimpleTestCase):
+    def setUp(self) -> None:
+        random.seed(0)
+        self.hex_colors = [HexColor.from_rgba(random.getrandbits(24) << 8 | random.randint(0, 100)) for _ in range(500)]
+        # 無彩色や同じ色相の色も混ぜておく
+        self.hex_colors += [parse_hex_color(code) for code in ['000000', 'ffffff', 'ffffff0', '808080', 'ff0000', 'e60000', 'ff1919']]
+        self.rgba = colorspace.pack(self.hex_colors)
+
+    def test_unpack(self):
+        red, green, blue, alpha = colorspace.unpack(self.rgba)
+        for index, hex_color in enumerate(self.hex_colors):
+            self.assertEqual(red[index], int(hex_color.red, 16))
+            self.assertEqual(green[index], int(hex_color.green, 16))
+            self.assertEqual(blue[index], int(hex_color.blue, 16))
+            self.assertEqual(alpha[index], hex_color.alpha)
+
+    def test_hsv_matches_hex_color(self):
+        hsv = colorspace.to_hsv(self.rgba)
+        for index, hex_color in enumerate(self.hex_colors):
+            self.assertEqual(tuple(hsv[index]), (hex_color.hue, hex_color.saturation, hex_color.value))
+
+    def test_sort_order_matches_hex_color(self):
+        order = colorspace.sort_order(self.rgba)
+        self.assertEqual([self.hex_colors[index] for index in order], sorted(self.hex_colors))
+
+    def test_luminance_and_contrast(self):
+        black, white = colorspace.pack([parse_hex_color('000000'), parse_hex_color('ffffff')])
+        self.assertAlmostEqual(float(colorspace.luminance(black)), 0.0)
+        self.assertAlmostEqual(float(colorspace.luminance(white)), 1.0, places=4)
+        self.assertAlmostEqual(float(colorspace.contrast_ratio(black, white)), 21.0, places=2)
+
+    def test_lab(self):
+        lab = colorspace.to_lab(colorspace.pack([parse_hex_color('ffffff'), parse_hex_color('000000'), parse_hex_color('ff0000')]))
+        self.assertAlmostEqual(lab[0][0], 100.0, places=2)
+        self.assertAlmostEqual(lab[0][1], 0.0, places=2)
+        self.assertAlmostEqual(lab[1][0], 0.0, places=2)
+        # sRGBの赤はおよそL=53.24, a=80.09, b=67.20
+        self.assertAlmostEqual(lab[2][0], 53.24, places=1)
+        self.assertAlmostEqual(lab[2][1], 80.09, places=1)
+        self.assertAlmostEqual(lab[2][2], 67.20, places=1)
+
+    def test_diary_colors_match_vue(self):
+        # diary_index.htmlのdiaryBackgroundColor, borderColor, fontColorをそのまま移したもの
+        def calc_color(front, back, alpha):
+            return tuple(math.floor(back_value + (front_value - back_value) * alpha) for front_value, back_value in zip(front, back))
+
+        def font_color(background):
+            brightness = (background[0] * 299 + background[1] * 587 + background[2] * 114) / 1000
+            return 0x000000 if abs(brightness - 0) >= abs(brightness - 255) else 0xFFFFFF
+
+        white = (255, 255, 255)
+        color_levels = [random.randint(1, 10) for _ in self.hex_colors]
+        backgrounds, borders, fonts = colorspace.diary_colors(self.rgba, color_levels)
+        for index, (hex_color, color_level) in enumerate(zip(self.hex_colors, color_levels)):
+            rgb = (int(hex_color.red, 16), int(hex_color.green, 16), int(hex_color.blue, 16))
+            background = calc_color(calc_color(rgb, white, int(hex_color.alpha)), white, color_level / 10)
+            border = calc_color((0, 0, 0), background, 0.1)
+            self.assertEqual(backgrounds[index], background[0] << 16 | background[1] << 8 | background[2])
+            self.assertEqual(borders[index], border[0] << 16 | border[1] << 8 | border[2])
+            self.assertEqual(fonts[index], font_color(background))
@@ -1,6 +1,9 @@
+import pickle
+
 from django.test import TestCase
+from django.db import connection
 
-from ..fields import is_hex, parse_hex_color, HexColor, HexColorField
+from ..fields import is_hex, parse_hex_color, intern_hex_color, HexColor, HexColorField, CompressedText, COMPRESSED_TEXT_THRESHOLD
 
 
 class IsHexTests(TestCase):
@@ -69,6 +72,60 @@ class HexColorTests(TestCase):
         hex_color = HexColor('ff', 'ff', 'ff')
         self.assertEqual(str(hex_color), '#FFFFFF-1.0')
 
+    def test_rgba(self):
+        hex_color = HexColor('d7', '56', '74', 0.5)
+        self.assertEqual(hex_color.rgba, 0xD7567432)
+        self.assertEqual(HexColor.from_rgba(hex_color.rgba), hex_color)
+
+    def test_from_rgba_with_alpha_out_of_range(self):
+        with self.assertRaisesMessage(ValueError, expected_message='rgba is out of range.'):
+            HexColor.from_rgba(0xFFFFFF65)
+
+    def test_alpha_is_floored_like_parse_hex_color(self):
+        for alpha in ['0.29', '0.555', '0.999', '0.07', '0.5']:
+            self.assertEqual(HexColor('12', '34', '56', alpha), parse_hex_color(f'123456{alpha}'))
+        self.assertEqual(HexColor('12', '34', '56', 0.29).alpha, 0.29)
+        self.assertEqual(HexColor('12', '34', '56', 0.555).alpha, 0.55)
+        # alphaから作り直しても同じ色になる
+        for percent in range(101):
+            hex_color = HexColor.from_rgba(0x12345600 | percent)
+            self.assertEqual(HexColor('12', '34', '56', hex_color.alpha), hex_color)
+
+    def test_immutable(self):
+        hex_color = HexColor('ff', 'ff', 'ff')
+        with self.assertRaises(AttributeError):
+            hex_color.red = '00'
+        with self.assertRaises(AttributeError):
+            hex_color.something = 'something'
+
+    def test_hash(self):
+        self.assertEqual(hash(HexColor('ff', '00', '00')), hash(parse_hex_color('ff00001.0')))
+        self.assertEqual(len({HexColor('ff', '00', '00'), HexColor('FF', '00', '00'), HexColor('ff', '00', '00', 0)}), 2)
+
+    def test_pickle(self):
+        hex_color = HexColor('12', '34', '56', 0.3)
+        self.assertEqual(pickle.loads(pickle.dumps(hex_color)), hex_color)
+
+    def test_hsv(self):
+        hex_color = HexColor('ff', '00', '00')
+        self.assertEqual(hex_color.hue, 0)
+        self.assertEqual(hex_color.saturation, 1)
+        self.assertEqual(hex_color.value, 1)
+        self.assertEqual(HexColor('80', '80', '80').hue, -1)
+
+    def test_order(self):
+        # 色相の昇順、彩度の昇順、明度の降順、alphaの昇順
+        gray = HexColor('00', '00', '00')
+        light_red = HexColor('ff', '19', '19')
+        red = HexColor('ff', '00', '00')
+        dark_red = HexColor('e6', '00', '00')
+        transparent_orange = HexColor('ff', '2a', '00', 0)
+        orange = HexColor('ff', '2a', '00')
+        ordered = [gray, light_red, red, dark_red, transparent_orange, orange]
+        self.assertEqual(sorted(reversed(ordered)), ordered)
+        self.assertTrue(red < dark_red <= dark_red)
+        self.assertTrue(orange > transparent_orange >= transparent_orange)
+
 
 class ParseHexColorTests(TestCase):
     def test_red_with_string(self):
@@ -100,6 +157,35 @@ class ParseHexColorTests(TestCase):
             parse_hex_color('fff1')
 
 
+class InternHexColorTests(TestCase):
+    def setUp(self) -> None:
+        intern_hex_color.cache_clear()
+
+    def test_same_object_for_same_string(self):
+        hex_color = intern_hex_color('D756741.0')
+        self.assertIs(intern_hex_color('D756741.0'), hex_color)
+        self.assertEqual(hex_color, HexColor('d7', '56', '74'))
+
+    def test_cache_info(self):
+        intern_hex_color('D756741.0')
+        intern_hex_color('D756741.0')
+        intern_hex_color('F7774D1.0')
+        cache_info = intern_hex_color.cache_info()
+        self.assertEqual(cache_info.hits, 1)
+        self.assertEqual(cache_info.misses, 2)
+
+    def test_invalid_string(self):
+        with self.assertRaisesMessage(ValueError, expected_message='hex_color_code is wrong.'):
+            intern_hex_color('fff1')
+
+    def test_from_db_value_shares_object(self):
+        field = HexColorField()
+        self.assertIs(
+            field.from_db_value(value='FFFFFF0.0', expression=None, connection=None),
+            field.from_db_value(value='FFFFFF0.0', expression=None, connection=None),
+        )
+
+
 class HexColorFieldTests(TestCase):
     def test_that_db_type_returns_char(self):
         self.assertEqual(HexColorField().db_type(connection=None), 'CHAR(10)')
@@ -126,3 +212,61 @@ class HexColorFieldTests(TestCase):
     def test_that_to_python_with_string(self):
         white_string = 'ffffff'
         self.assertEqual(HexColorField().to_python(white_string), HexColor('ff', 'ff', 'ff'))
+
+
+class PackedHexColorFieldTests(TestCase):
+    def test_db_type_is_integer(self):
+        self.assertEqual(
+            HexColorField(packed=True).db_type(connection=connection),
+            connection.data_types['IntegerField'],
+        )
+
+    def test_deconstruct(self):
+        name, path, args, kwargs = HexColorField(packed=True).deconstruct()
+        self.assertEqual(kwargs, {'packed': True})
+
+    def test_get_prep_value_fits_signed_32bit(self):
+        field = HexColorField(packed=True)
+        self.assertEqual(field.get_prep_value(HexColor('00', '00', '00', 0)), -2 ** 31)
+        self.assertEqual(field.get_prep_value(HexColor('ff', 'ff', 'ff')), 0xFFFFFF64 - 2 ** 31)
+
+    def test_get_prep_value_with_string(self):
+        self.assertEqual(HexColorField(packed=True).get_prep_value('#ff0000'), 0xFF000064 - 2 ** 31)
+
+    def test_get_prep_value_keeps_order(self):
+        field = HexColorField(packed=True)
+        codes = ['000000', 'ffffff0', 'f9bb2b', 'ffffff']
+        self.assertEqual(
+            sorted(codes, key=lambda code: field.get_prep_value(code)),
+            sorted(codes, key=lambda code: HexColorField().get_prep_value(code)),
+        )
+
+    def test_from_db_value(self):
+        field = HexColorField(packed=True)
+        red = HexColor('ff', '00', '00', 0.5)
+        self.assertEqual(field.from_db_value(field.get_prep_value(red), expression=None, connection=None), red)
+
+
+class CompressedTextTests(TestCase):
+    def test_short_text_is_not_compressed(self):
+        text = 'あ' * (COMPRESSED_TEXT_THRESHOLD // 3)
+        value = CompressedText.compress(text)
+        self.assertFalse(value.is_compressed)
+        self.assertEqual(value.data, text.encode('utf-8'))
+        self.assertEqual(str(value), text)
+
+    def test_long_text_is_compressed(self):
+        text = '今日は晴れ。' * 100
+        value = CompressedText.compress(text)
+        self.assertTrue(value.is_compressed)
+        self.assertLess(len(value.data), len(text.encode('utf-8')))
+        self.assertEqual(str(value), text)
+
+    def test_incompressible_text_is_not_compressed(self):
+        text = ''.join(chr(0x4e00 + (i * 7919) % 20000) for i in range(COMPRESSED_TEXT_THRESHOLD))
+        self.assertEqual(str(CompressedText.compress(text)), text)
+        self.assertFalse(CompressedText.compress(text, threshold=10 ** 6).is_compressed)
+
+    def test_pickle(self):
+        value = CompressedText.compress('abc' * 1000)
+        self.assertEqual(pickle.loads(pickle.dumps(value)), value)
@@ -1,5 +1,7 @@
 import re
+from io import StringIO
 
+from django.core.management import call_command
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from django.utils import timezone
@@ -102,6 +104,9 @@ class ColorModelFormTests(TestCase):
         if form.is_valid():
             form.save()
 
+        # 色はsweep_colorsが猶予の後に消す
+        self.assertEqual(Color.objects.get(hex_color=parse_hex_color('ff0000')).ref_count, 0)
+        call_command('sweep_colors', '--grace', '0', stdout=StringIO())
         self.assertEqual(Color.objects.filter(hex_color=parse_hex_color('ff0000')).count(), 0)
 
     def test_editing_color_has_no_effect_when_it_belongs_to_other_users(self):
@@ -0,0 +1,93 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+from django.urls import resolve
+
+from .. import middleware
+from ..fields import parse_hex_color
+from ..middleware import QueryBudgetExceeded, QueryBudgetMiddleware, QueryRecorder
+from ..models import Color
+
+
+class QueryRecorderTests(TestCase):
+    def test_summarize(self):
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            for index in range(middleware.N_PLUS_ONE_THRESHOLD):
+                list(Color.objects.filter(pk=index))
+            list(Color.objects.filter(pk=0))
+
+        summary = recorder.summarize()
+        self.assertEqual(summary['queries'], middleware.N_PLUS_ONE_THRESHOLD + 1)
+        self.assertEqual(list(summary['duplicates'].values()), [2])
+        self.assertEqual(list(summary['n_plus_one'].values()), [middleware.N_PLUS_ONE_THRESHOLD + 1])
+
+    def test_create_many_is_not_n_plus_one(self):
+        recorder = QueryRecorder()
+        hex_colors = [parse_hex_color(f'{index:02x}0000') for index in range(10)]
+        with connection.execute_wrapper(recorder):
+            colors = Color.objects.create_many(hex_colors)
+        self.assertEqual(len(colors), 10)
+        self.assertEqual(recorder.summarize()['n_plus_one'], {})
+        self.assertLessEqual(recorder.summarize()['queries'], 3)
+
+
+class QueryBudgetMiddlewareTests(TestCase):
+    def get_response(self, queries):
+        def view(request):
+            for index in range(queries):
+                list(Color.objects.filter(hex_color=parse_hex_color(f'{index:02x}0000')))
+            return HttpResponse()
+        return view
+
+    def request(self, queries):
+        request = RequestFactory().get('/diaries/')
+        request.resolver_match = resolve('/diaries/')
+        return QueryBudgetMiddleware(self.get_response(queries))(request)
+
+    @mock.patch.object(middleware, 'QUERY_BUDGET_RAISE', False)
+    @mock.patch.object(middleware, 'QUERY_BUDGET_REPORT', None)
+    def test_not_used_without_debug_or_report(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            QueryBudgetMiddleware(self.get_response(0))
+
+    @mock.patch.object(middleware, 'QUERY_BUDGET_RAISE', True)
+    @mock.patch.object(middleware, 'QUERY_BUDGETS', {'color_diary:diary-index': 3})
+    def test_over_budget(self):
+        self.assertEqual(self.request(3).status_code, 200)
+        with self.assertRaises(QueryBudgetExceeded):
+            self.request(4)
+
+    @mock.patch.object(middleware, 'QUERY_BUDGET_RAISE', True)
+    @mock.patch.object(middleware, 'QUERY_BUDGETS', {})
+    def test_n_plus_one(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.request(middleware.N_PLUS_ONE_THRESHOLD)
+
+    @mock.patch.object(middleware, 'QUERY_BUDGET_RAISE', False)
+    @mock.patch.object(middleware, 'QUERY_BUDGETS', {'color_diary:diary-index': 3})
+    def test_report(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'logs', 'query_budget.jsonl')
+            with mock.patch.object(middleware, 'QUERY_BUDGET_REPORT', path), \
+                    self.assertLogs('color_diary.middleware', 'WARNING'):
+                self.request(2)
+                self.request(4)
+
+            with open(path) as report:
+                records = [json.loads(line) for line in report]
+            self.assertEqual([record['queries'] for record in records], [2, 4])
+            self.assertEqual({record['view'] for record in records}, {'color_diary:diary-index'})
+
+            out = StringIO()
+            call_command('query_budget_report', file=path, clear=True, stdout=out)
+            self.assertIn('color_diary:diary-index: 2 requests, mean 3.0, max 4 queries (budget 3)', out.getvalue())
+            self.assertFalse(os.path.exists(path))
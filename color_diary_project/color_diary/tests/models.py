@@ -1,11 +1,12 @@
 import time
 import datetime
 from django.utils import timezone
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from django.db.utils import IntegrityError
 
-from ..fields import HexColor
+from ..fields import HexColor, CompressedText
 from ..models import Color, Diary
 from .constant import *
 from ..signals import hex_color_list
@@ -75,6 +76,14 @@ class ColorModelTests(TestCase):
         transparent = Color.get_default_color()
         self.assertColor(transparent, 'FF', 'FF', 'FF', 0.0)
 
+    def test_get_default_color_id(self):
+        self.assertEqual(Color.get_default_color_id(), Color.get_default_color().pk)
+
+    def test_get_default_color_id_after_delete(self):
+        Color.objects.get(pk=Color.get_default_color_id()).delete()
+        default_color_id = Color.get_default_color_id()
+        self.assertEqual(Color.objects.get(pk=default_color_id).hex_color, Color.TRANSPARENT)
+
     def test_create_color(self):
         color = self.create_color(red='ff', green='00', blue='00')
         user = UserModelTests.create_user(email=EXAMPLE_EMAIL, password=PASSWORD1)
@@ -84,6 +93,34 @@ class ColorModelTests(TestCase):
         get_color = Color.objects.get(hex_color=hex_color)
         self.assertColor(get_color, 'FF', '00', '00', 1.0)
 
+    def test_hsv_columns_are_saved(self):
+        color = self.create_color(red='e6', green='00', blue='00', alpha=0.5)
+        get_color = Color.objects.get(pk=color.pk)
+        self.assertEqual(get_color.hue, get_color.hex_color.hue)
+        self.assertEqual(get_color.saturation, get_color.hex_color.saturation)
+        self.assertEqual(get_color.value, get_color.hex_color.value)
+        self.assertEqual(get_color.alpha, 0.5)
+
+    def test_hsv_ordering_matches_hex_color_order(self):
+        for code in ['ff2a00', '000000', 'ff0000', 'e60000', 'ff1919', '00ff00']:
+            Color.objects.create(hex_color=HexColor(code[:2], code[2:4], code[4:]))
+        colors = list(Color.objects.order_by(*Color.HSV_ORDERING))
+        self.assertEqual(colors, sorted(colors, key=lambda color: color.hex_color))
+
+    def test_lookups_on_packed_hex_color(self):
+        red = self.create_color(red='ff', green='00', blue='00')
+        green = self.create_color(red='00', green='ff', blue='00')
+        self.create_color(red='00', green='00', blue='ff')
+        self.assertEqual(Color.objects.get(hex_color='ff0000'), red)
+        self.assertEqual(
+            set(Color.objects.filter(hex_color__in=[HexColor('ff', '00', '00'), '00ff00'])),
+            {red, green}
+        )
+        self.assertEqual(
+            set(Color.objects.filter(hex_color__range=('00ff00', 'ff0000'))),
+            {red, green}
+        )
+
     def test_create_two_colors_with_same_hex_color(self):
         user = UserModelTests.create_user(email=EXAMPLE_EMAIL, password=PASSWORD1)
         color1 = self.create_color(red='ff', green='00', blue='00')
@@ -94,6 +131,37 @@ class ColorModelTests(TestCase):
         color_list = Color.objects.filter(hex_color=color1.hex_color)
         self.assertEqual(color_list.count(), 1)
 
+    def test_create_color_again_uses_one_query(self):
+        user = UserModelTests.create_user(email=EXAMPLE_EMAIL, password=PASSWORD1)
+        color = self.create_color(red='12', green='34', blue='56')
+        color.users.add(user)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.create_color(red='12', green='34', blue='56'), color)
+
+    def test_create_unreferenced_color_again_restarts_grace(self):
+        # 使い回した色が、パレットに入れる前にsweep_colorsに消されないようにする
+        color = self.create_color(red='12', green='34', blue='56')
+        an_hour_ago = timezone.now() - datetime.timedelta(hours=1)
+        Color.objects.filter(pk=color.pk).update(unreferenced_since=an_hour_ago)
+        with self.assertNumQueries(2):
+            self.assertEqual(self.create_color(red='12', green='34', blue='56'), color)
+        self.assertGreater(Color.objects.get(pk=color.pk).unreferenced_since, an_hour_ago)
+        self.assertEqual(Color.objects.create_many([color.hex_color])[color.hex_color], color)
+
+    def test_create_color_after_delete(self):
+        color = self.create_color(red='12', green='34', blue='56')
+        color_id = color.pk
+        color.delete()
+        self.assertFalse(Color.objects.filter(pk=color_id).exists())
+        new_color = self.create_color(red='12', green='34', blue='56')
+        self.assertTrue(Color.objects.filter(pk=new_color.pk).exists())
+        self.assertEqual(new_color.hex_color, HexColor('12', '34', '56'))
+
+    def test_hex_color_is_unique(self):
+        self.create_color(red='12', green='34', blue='56')
+        with self.assertRaises(IntegrityError):
+            Color(hex_color=HexColor('12', '34', '56')).save()
+
     def test_two_users_have_one_color_and_default_colors(self):
         user1 = UserModelTests.create_user(email=EXAMPLE_EMAIL, password=PASSWORD1)
         user2 = UserModelTests.create_user(email=EXAMPLE_EMAIL2, password=PASSWORD2)
@@ -153,6 +221,49 @@ class DiaryModelTests(TestCase):
         get_diary = Diary.objects.get(pk=diary.pk, user=user) # いちいち保存したものを再び取ってきて、値を確認するのってテストになるのかな？わからないけどとりあえず書いてみよう。
         self.assertDiary(diary=get_diary, user=user, color=color, color_level=1, created_at=now, updated_at=now, context=CONTEXT)
 
+    def test_long_context_is_compressed(self):
+        color = ColorModelTests.create_color('ff', '00', '00')
+        user = UserModelTests.create_user(email=EXAMPLE_EMAIL, password=PASSWORD1)
+        context = '長い日記。' * 500
+        diary = self.create_diary(user=user, color=color, color_level=1, context=context)
+        self.assertEqual(diary.context_length, len(context))
+
+        stored = Diary._base_manager.values_list('context', flat=True).get(pk=diary.pk)
+        self.assertIsInstance(stored, CompressedText)
+        self.assertTrue(stored.is_compressed)
+        self.assertEqual(str(stored), context)
+
+        # 参照した時に展開する
+        get_diary = Diary.objects.get(pk=diary.pk, user=user)
+        self.assertIsInstance(get_diary.__dict__['context'], CompressedText)
+        self.assertEqual(get_diary.context, context)
+        self.assertEqual(get_diary.__dict__['context'], context)
+
+    def test_save_without_reading_context(self):
+        color = ColorModelTests.create_color('ff', '00', '00')
+        user = UserModelTests.create_user(email=EXAMPLE_EMAIL, password=PASSWORD1)
+        context = '長い日記。' * 500
+        diary = self.create_diary(user=user, color=color, color_level=1, context=context)
+
+        get_diary = Diary.objects.get(pk=diary.pk, user=user)
+        get_diary.color_level = 2
+        get_diary.save()
+        self.assertIsInstance(get_diary.__dict__['context'], CompressedText)
+        get_diary = Diary.objects.get(pk=diary.pk, user=user)
+        self.assertEqual(get_diary.context, context)
+        self.assertEqual(get_diary.context_length, len(context))
+        self.assertEqual(get_diary.color_level, 2)
+
+    def test_preview(self):
+        color = ColorModelTests.create_color('ff', '00', '00')
+        user = UserModelTests.create_user(email=EXAMPLE_EMAIL, password=PASSWORD1)
+        diary = self.create_diary(user=user, color=color, color_level=1, context='あ' * 150)
+        self.assertEqual(diary.preview, 'あ' * 99 + '…')
+
+        diary.context = CONTEXT
+        diary.save()
+        self.assertEqual(Diary.objects.get(pk=diary.pk, user=user).preview, CONTEXT)
+
     def test_on_delete_after_user_delete(self):
         color = ColorModelTests.create_color('ff', '00', '00')
         user = UserModelTests.create_user(email=EXAMPLE_EMAIL, password=PASSWORD1)
@@ -197,3 +308,23 @@ class DiaryModelTests(TestCase):
         self.assertDiary(diary=get_diary, user=user, color=color, color_level=1, created_at=now, updated_at=now, context='')
 
 
+class DefaultColorIdTests(TransactionTestCase):
+    # トランザクションの外で調べたidだけがキャッシュされる
+    def tearDown(self):
+        Color.forget_default_color_id()
+
+    def test_get_default_color_id_is_cached(self):
+        default_color_id = Color.get_default_color_id()
+        self.assertEqual(default_color_id, Color.get_default_color().pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(Color.get_default_color_id(), default_color_id)
+
+    def test_get_default_color_id_is_not_cached_in_transaction(self):
+        with transaction.atomic():
+            Color.get_default_color_id()
+        self.assertIsNone(Color._default_color_id)
+
+    def test_get_default_color_id_after_delete(self):
+        Color.objects.get(pk=Color.get_default_color_id()).delete()
+        self.assertIsNone(Color._default_color_id)
+        self.assertEqual(Color.objects.get(pk=Color.get_default_color_id()).hex_color, Color.TRANSPARENT)
@@ -0,0 +1,155 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.http import http_date
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from ..fields import parse_hex_color
+from ..forms import ColorModelForm
+from ..models import Color, Diary
+from ..page_cache import get_cache, get_page_version
+from .constant import *
+
+
+class UserPageCacheTests(TestCase):
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(email=EXAMPLE_EMAIL, password=PASSWORD1)
+        self.client.login(email=EXAMPLE_EMAIL, password=PASSWORD1)
+        self.red = Color.objects.create(hex_color=parse_hex_color('ff0000'))
+        self.red.users.add(self.user)
+        self.diary = Diary.objects.create(user=self.user, color=self.red, color_level=8, context='first diary')
+
+    def get(self, name):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse(f'color_diary:{name}'))
+        return response, [query['sql'] for query in context.captured_queries]
+
+    def test_repeat_visit_does_not_read_diaries(self):
+        first, queries = self.get('diary-index')
+        self.assertTrue(any('color_diary_diary' in sql for sql in queries))
+
+        second, queries = self.get('diary-index')
+        self.assertFalse(any('color_diary_diary' in sql for sql in queries))
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['Content-Type'], first['Content-Type'])
+
+    def test_version_is_shared_between_processes(self):
+        # 他のプロセスが日記を変えてversionを変えても、このプロセスのキャッシュは消されない。
+        # それでもversionはデータベースから読むので、古いページは使われない
+        self.assertContains(self.get('diary-index')[0], 'first diary')
+        Diary._base_manager.filter(pk=self.diary.pk).update(preview='edited in another process')
+        get_user_model().objects.filter(pk=self.user.pk).update(page_version='other-process')
+        self.assertContains(self.get('diary-index')[0], 'edited in another process')
+
+    def test_saving_stale_user_keeps_version(self):
+        stale_user = get_user_model().objects.get(pk=self.user.pk)
+        Diary.objects.create(user=self.user, color=self.red, color_level=8, context='second diary')
+        version = get_user_model().objects.get(pk=self.user.pk).page_version
+        stale_user.is_staff = True
+        stale_user.save()
+        self.assertEqual(get_user_model().objects.get(pk=self.user.pk).page_version, version)
+
+    def test_diary_changes_invalidate(self):
+        self.get('diary-index')
+        Diary.objects.create(user=self.user, color=self.red, color_level=8, context='second diary')
+        self.assertContains(self.get('diary-index')[0], 'second diary')
+
+        self.diary.context = 'edited diary'
+        self.diary.save()
+        self.assertContains(self.get('diary-index')[0], 'edited diary')
+
+        self.diary.delete()
+        self.assertNotContains(self.get('diary-index')[0], 'edited diary')
+
+    def test_palette_changes_invalidate(self):
+        self.get('color-index')
+        blue = Color.objects.create(hex_color=parse_hex_color('0000ff'))
+        blue.users.add(self.user)
+        self.assertContains(self.get('color-index')[0], f'id="{blue.pk}"')
+
+        self.user.colors.remove(blue)
+        self.assertNotContains(self.get('color-index')[0], f'id="{blue.pk}"')
+
+        self.user.refresh_from_db()
+        version = get_page_version(self.user)
+        self.red.users.clear()
+        self.user.refresh_from_db()
+        self.assertNotEqual(get_page_version(self.user), version)
+
+    def test_edited_color_invalidates_diary_index(self):
+        self.get('diary-index')
+        form = ColorModelForm(data={'hex_color': '0000ff'}, instance=self.red, user=self.user)
+        self.assertTrue(form.is_valid())
+        form.save()
+        response, queries = self.get('diary-index')
+        self.assertEqual(response.context['diary_list'][0].color.hex_color, parse_hex_color('0000ff'))
+
+    def test_other_users_do_not_share_pages(self):
+        self.get('diary-index')
+        get_user_model().objects.create_user(email=EXAMPLE_EMAIL2, password=PASSWORD2)
+        self.client.login(email=EXAMPLE_EMAIL2, password=PASSWORD2)
+        self.assertNotContains(self.get('diary-index')[0], 'first diary')
+
+
+class ConditionalPageTests(TestCase):
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(email=EXAMPLE_EMAIL, password=PASSWORD1)
+        self.client.login(email=EXAMPLE_EMAIL, password=PASSWORD1)
+        self.red = Color.objects.create(hex_color=parse_hex_color('ff0000'))
+        self.red.users.add(self.user)
+        self.diary = Diary.objects.create(user=self.user, color=self.red, color_level=8, context='first diary')
+        self.token = RefreshToken.for_user(self.user).access_token
+
+    def test_if_none_match(self):
+        response = self.client.get(reverse('color_diary:diary-index'))
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertIn('private', response['Cache-Control'])
+
+        with CaptureQueriesContext(connection) as context:
+            not_modified = self.client.get(reverse('color_diary:diary-index'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b'')
+        self.assertFalse(any('color_diary_diary' in query['sql'] for query in context.captured_queries))
+
+        Diary.objects.create(user=self.user, color=self.red, color_level=8, context='second diary')
+        response = self.client.get(reverse('color_diary:diary-index'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertContains(response, 'second diary')
+
+    def test_if_modified_since_in_the_same_second(self):
+        # Last-Modifiedは付けず、If-Modified-Sinceだけでは304にしない。
+        # 秒単位なので、同じ秒の中で書かれた日記が見えなくなってしまう
+        response = self.client.get('/api/diaries/', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        self.assertFalse(response.has_header('Last-Modified'))
+        if_modified_since = http_date(time.time() + 1)
+
+        Diary.objects.create(user=self.user, color=self.red, color_level=8, context='second diary')
+        response = self.client.get('/api/diaries/', HTTP_AUTHORIZATION=f'Bearer {self.token}', HTTP_IF_MODIFIED_SINCE=if_modified_since)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 2)
+
+    def test_etag_depends_on_url(self):
+        response = self.client.get(reverse('color_diary:diary-index'))
+        other = self.client.get(reverse('color_diary:color-index'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(other.status_code, 200)
+
+    def test_list_api(self):
+        etags = {}
+        for url in ('/api/diaries/', '/api/colors/'):
+            response = self.client.get(url, HTTP_AUTHORIZATION=f'Bearer {self.token}')
+            self.assertEqual(response.status_code, 200)
+            etags[url] = response['ETag']
+            not_modified = self.client.get(url, HTTP_AUTHORIZATION=f'Bearer {self.token}', HTTP_IF_NONE_MATCH=etags[url])
+            self.assertEqual(not_modified.status_code, 304)
+
+        self.diary.delete()
+        response = self.client.get('/api/diaries/', HTTP_AUTHORIZATION=f'Bearer {self.token}', HTTP_IF_NONE_MATCH=etags['/api/diaries/'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [])
+
+    def test_list_api_without_token(self):
+        response = self.client.get('/api/diaries/', HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 401)
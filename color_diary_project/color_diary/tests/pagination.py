@@ -0,0 +1,87 @@
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from ..fields import parse_hex_color
+from ..models import Color, Diary
+from ..pagination import API_MAX_PAGE_SIZE, encode_cursor, decode_cursor, keyset_filter
+from .constant import *
+
+
+class CursorTests(SimpleTestCase):
+    def test_encode_and_decode(self):
+        created_at = timezone.now()
+        cursor = encode_cursor([created_at, 42])
+        self.assertEqual(decode_cursor(Diary, ('created_at', 'id'), cursor), [created_at, 42])
+
+    def test_decode_keeps_microseconds(self):
+        created_at = datetime.datetime(2021, 4, 1, 12, 0, 0, 999999, tzinfo=datetime.timezone.utc)
+        cursor = encode_cursor([created_at, 1])
+        self.assertEqual(decode_cursor(Diary, ('created_at', 'id'), cursor)[0], created_at)
+
+    def test_decode_invalid_cursor(self):
+        for cursor in ['', '1', '1.2.3', 'a.1', '1.a']:
+            with self.assertRaises(ValueError):
+                decode_cursor(Diary, ('created_at', 'id'), cursor)
+
+    def test_keyset_filter(self):
+        condition = keyset_filter(('created_at', 'id'), [1, 2])
+        self.assertEqual(str(condition), "(OR: ('created_at__lt', 1), (AND: ('created_at', 1), ('id__lt', 2)))")
+
+
+class APIPaginationTests(TestCase):
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(email=EXAMPLE_EMAIL, password=PASSWORD1)
+        self.red = Color.objects.create(hex_color=parse_hex_color('ff0000'))
+        created_at = timezone.now()
+        # 同じ作成日時の日記はidの順に並ぶ
+        self.diaries = [
+            Diary.objects.create(user=self.user, color=self.red, color_level=5, context=str(i), created_at=created_at - datetime.timedelta(days=i // 2))
+            for i in range(5)
+        ]
+        self.token = RefreshToken.for_user(self.user).access_token
+
+    def get(self, url, **params):
+        return self.client.get(url, params, HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def test_diary_pages(self):
+        ids = []
+        response = self.get('/api/diaries/', page_size=2)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            ids += [diary['id'] for diary in response.json()['results']]
+            if response.json()['next'] is None:
+                self.assertFalse(response.has_header('Link'))
+                break
+            self.assertEqual(response['Link'], f'<{response.json()["next"]}>; rel="next"')
+            response = self.client.get(response.json()['next'], HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+        expected = sorted(self.diaries, key=lambda diary: (diary.created_at, diary.pk), reverse=True)
+        self.assertEqual(ids, [diary.pk for diary in expected])
+
+    def test_constant_queries(self):
+        for page_size in (1, 5):
+            with CaptureQueriesContext(connection) as context:
+                self.get('/api/diaries/', page_size=page_size)
+            self.assertEqual(len(context.captured_queries), 2)
+
+    def test_page_size(self):
+        self.assertEqual(len(self.get('/api/diaries/', page_size=0).json()['results']), 1)
+        self.assertEqual(len(self.get('/api/diaries/', page_size='a').json()['results']), 5)
+        self.assertLessEqual(len(self.get('/api/diaries/', page_size=API_MAX_PAGE_SIZE + 1).json()['results']), API_MAX_PAGE_SIZE)
+
+    def test_invalid_cursor(self):
+        for cursor in ['invalid', '!!', 'MS5h']:
+            self.assertEqual(self.get('/api/diaries/', cursor=cursor).status_code, 404)
+
+    def test_color_pages(self):
+        response = self.get('/api/colors/', page_size=4)
+        ids = [color['id'] for color in response.json()['results']]
+        response = self.client.get(response.json()['next'], HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        ids += [color['id'] for color in response.json()['results']]
+        self.assertEqual(ids, sorted(self.user.colors.values_list('pk', flat=True), reverse=True)[:8])
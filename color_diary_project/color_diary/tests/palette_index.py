@@ -0,0 +1,138 @@
+import random
+
+import numpy as np
+
+from django.test import TestCase, SimpleTestCase
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from ..models import Color, Diary
+from ..fields import parse_hex_color
+from ..palette_index import KDTree, get_palette_index, nearest_diaries, forget_palette_index
+from .constant import *
+
+
+class KDTreeTests(SimpleTestCase):
+    def setUp(self) -> None:
+        random.seed(0)
+        self.points = {key: (random.random(), random.random(), random.random()) for key in range(200)}
+
+    def brute_force(self, points, point, k):
+        distances = sorted((sum((a - b) ** 2 for a, b in zip(point, value)) ** 0.5, key) for key, value in points.items())
+        return distances[:k]
+
+    def test_nearest(self):
+        tree = KDTree(self.points.items())
+        for _ in range(20):
+            point = (random.random(), random.random(), random.random())
+            self.assertEqual(tree.nearest(point, k=5), self.brute_force(self.points, point, 5))
+
+    def test_insert_and_remove(self):
+        tree = KDTree()
+        for key, point in self.points.items():
+            tree.insert(key, point)
+        for key in range(0, 200, 2):
+            tree.remove(key)
+            del self.points[key]
+        self.assertEqual(len(tree), 100)
+        point = (0.5, 0.5, 0.5)
+        self.assertEqual(tree.nearest(point, k=10), self.brute_force(self.points, point, 10))
+
+    def test_empty(self):
+        self.assertEqual(KDTree().nearest((0, 0, 0), k=3), [])
+
+    def test_k_less_than_one(self):
+        tree = KDTree(self.points.items())
+        self.assertEqual(tree.nearest((0, 0, 0), k=0), [])
+        self.assertEqual(tree.nearest((0, 0, 0), k=-3), [])
+
+
+class NearestDiaryTests(TestCase):
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(email=EXAMPLE_EMAIL, password=PASSWORD1)
+        self.red = Color.objects.create(hex_color=parse_hex_color('ff0000'))
+        self.blue = Color.objects.create(hex_color=parse_hex_color('0000ff'))
+        self.user.colors.add(self.red, self.blue)
+        self.red_diary = Diary.objects.create(user=self.user, color=self.red, color_level=10, context=CONTEXT)
+        self.light_red_diary = Diary.objects.create(user=self.user, color=self.red, color_level=2, context=CONTEXT)
+        self.blue_diary = Diary.objects.create(user=self.user, color=self.blue, color_level=10, context=CONTEXT)
+
+        self.user2 = get_user_model().objects.create_user(email=EXAMPLE_EMAIL2, password=PASSWORD2)
+        self.user2.colors.add(self.red)
+        self.diary_of_user2 = Diary.objects.create(user=self.user2, color=self.red, color_level=10, context=CONTEXT)
+
+    def tearDown(self) -> None:
+        forget_palette_index(self.user.pk)
+        forget_palette_index(self.user2.pk)
+
+    def test_nearest_color_comes_first(self):
+        diaries = list(nearest_diaries(self.user, parse_hex_color('ee1111'), k=1))
+        self.assertEqual(set(diaries), {self.red_diary, self.light_red_diary})
+
+        # デフォルトの色も含めて全ての色を対象にすると、青の日記が最後に来る
+        diaries = list(nearest_diaries(self.user, parse_hex_color('ee1111'), k=20))
+        self.assertEqual(set(diaries[:2]), {self.red_diary, self.light_red_diary})
+        self.assertEqual(diaries[-1], self.blue_diary)
+        self.assertNotIn(self.diary_of_user2, diaries)
+
+    def test_weighted_by_color_level(self):
+        diaries = list(nearest_diaries(self.user, parse_hex_color('ff0000'), k=1, weighted=True))
+        self.assertEqual(diaries, [self.red_diary])
+        self.assertAlmostEqual(diaries[0].distance, 0.0)
+
+        diaries = list(nearest_diaries(self.user, parse_hex_color('ffcccc'), k=1, weighted=True))
+        self.assertEqual(diaries, [self.light_red_diary])
+
+    def test_distance_is_passed_as_float(self):
+        # MySQLのドライバはnumpy.float64を文字列として渡すので、距離で数値の順に並ばなくなる
+        queryset = nearest_diaries(self.user, parse_hex_color('ee1111'), k=20)
+        sql, params = queryset.query.sql_with_params()
+        self.assertTrue(all(type(param) is not np.float64 for param in params))
+        distances = [diary.distance for diary in queryset]
+        self.assertTrue(all(type(distance) is float for distance in distances))
+        self.assertEqual(distances, sorted(distances))
+
+    def test_index_is_updated_incrementally(self):
+        index = get_palette_index(self.user.pk)
+        green = Color.objects.create(hex_color=parse_hex_color('00ff00'))
+        self.user.colors.add(green)
+        self.assertIs(get_palette_index(self.user.pk), index)
+        self.assertIn(green.pk, index.colors)
+
+        self.user.colors.remove(self.blue)
+        self.assertIs(get_palette_index(self.user.pk), index)
+        self.assertNotIn(self.blue.pk, index.colors)
+
+    def test_query_count(self):
+        get_palette_index(self.user.pk)
+        with self.assertNumQueries(2):
+            list(nearest_diaries(self.user, parse_hex_color('ff0000')))
+
+    def test_view(self):
+        self.client.login(email=EXAMPLE_EMAIL, password=PASSWORD1)
+        response = self.client.get(reverse('color_diary:nearest-diary-index'), {'color': '0000ee'})
+        self.assertEqual(response.context['diary_list'][0], self.blue_diary)
+
+    def test_view_404_with_invalid_color(self):
+        self.client.login(email=EXAMPLE_EMAIL, password=PASSWORD1)
+        response = self.client.get(reverse('color_diary:nearest-diary-index'), {'color': 'zzzzzz'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_api(self):
+        token = RefreshToken.for_user(self.user).access_token
+        response = self.client.get('/api/diaries/nearest/', {'color': '0000ee', 'k': 1}, HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.json()], [self.blue_diary.pk])
+        self.assertIn('distance', response.json()[0])
+
+    def test_api_with_invalid_k_and_limit(self):
+        token = RefreshToken.for_user(self.user).access_token
+        for params in [{'k': 0}, {'k': -3}, {'limit': -1}, {'limit': 0}]:
+            response = self.client.get('/api/diaries/nearest/', {'color': '0000ee', **params}, HTTP_AUTHORIZATION=f'Bearer {token}')
+            self.assertEqual(response.status_code, 400)
+
+    def test_api_caps_k_and_limit(self):
+        token = RefreshToken.for_user(self.user).access_token
+        response = self.client.get('/api/diaries/nearest/', {'color': '0000ee', 'k': 10 ** 9, 'limit': 10 ** 9}, HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 200)
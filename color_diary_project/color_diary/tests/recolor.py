@@ -0,0 +1,113 @@
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from ..fields import parse_hex_color
+from ..forms import ColorModelForm
+from ..models import Color, Diary, DiaryDailySummary
+from ..recolor import remap_colors
+from .constant import *
+
+
+class RemapColorsTests(TestCase):
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(email=EXAMPLE_EMAIL, password=PASSWORD1)
+        self.red = Color.objects.create(hex_color=parse_hex_color('ff0000'))
+        self.blue = Color.objects.create(hex_color=parse_hex_color('0000ff'))
+        self.green = Color.objects.create(hex_color=parse_hex_color('00ff00'))
+        self.yellow = Color.objects.create(hex_color=parse_hex_color('ffff00'))
+        self.user.colors.add(self.red, self.blue, self.green)
+
+        self.user2 = get_user_model().objects.create_user(email=EXAMPLE_EMAIL2, password=PASSWORD2)
+        self.user2.colors.add(self.blue)
+
+        self.date = datetime.date(2021, 4, 1)
+        created_at = timezone.make_aware(datetime.datetime.combine(self.date, datetime.time(12)))
+        for color in [self.red, self.red, self.blue, self.red, self.green, self.blue, self.red]:
+            Diary.objects.create(user=self.user, color=color, color_level=5, context='a', created_at=created_at)
+        self.diary_of_user2 = Diary.objects.create(user=self.user2, color=self.blue, color_level=5, context='b')
+
+    def color_ids(self, user):
+        return list(Diary.objects.filter(user).order_by('pk').values_list('color_id', flat=True))
+
+    def test_remap_in_chunks(self):
+        recolored = remap_colors(self.user, {self.red: self.yellow, self.blue.pk: self.green.pk}, chunk_size=2)
+
+        self.assertEqual(recolored, 6)
+        self.assertEqual(self.color_ids(self.user), [self.yellow.pk] * 2 + [self.green.pk] + [self.yellow.pk] + [self.green.pk] * 2 + [self.yellow.pk])
+        self.assertEqual(self.color_ids(self.user2), [self.blue.pk])
+        summary = DiaryDailySummary.objects.get(user=self.user, date=self.date)
+        self.assertEqual(summary.color_counts, {str(self.yellow.pk): 4, str(self.green.pk): 3})
+
+    def test_palette(self):
+        remap_colors(self.user, {self.red: self.yellow, self.blue: self.green})
+
+        palette = set(self.user.colors.all())
+        self.assertTrue({self.yellow, self.green} <= palette)
+        self.assertFalse({self.red, self.blue} & palette)
+        # 誰も使わなくなった色はsweep_colorsが消す
+        self.assertEqual(Color.objects.get(pk=self.red.pk).ref_count, 0)
+        self.assertEqual(Color.objects.get(pk=self.blue.pk).ref_count, 2)
+        self.assertIn(self.blue, self.user2.colors.all())
+
+    def test_same_color(self):
+        self.assertEqual(remap_colors(self.user, {self.red: self.red}), 0)
+        self.assertIn(self.red, self.user.colors.all())
+
+    def test_invalid_color_map(self):
+        with self.assertRaises(ValueError):
+            remap_colors(self.user, {self.red: self.blue, self.blue: self.green})
+        with self.assertRaises(ValueError):
+            remap_colors(self.user, {Color.get_default_color(): self.green})
+        self.assertEqual(self.color_ids(self.user).count(self.red.pk), 4)
+
+    def test_edit_color_form(self):
+        form = ColorModelForm(user=self.user, instance=self.red, data={'hex_color': 'ffff00'})
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.save(), self.yellow)
+        self.assertEqual(self.color_ids(self.user).count(self.yellow.pk), 4)
+        self.assertNotIn(self.red, self.user.colors.all())
+
+    def test_edit_color_form_with_same_color(self):
+        # 同じ色のまま保存しても、パレットから消えない
+        form = ColorModelForm(user=self.user, instance=self.red, data={'hex_color': 'ff0000'})
+        self.assertTrue(form.is_valid())
+        form.save()
+        self.assertIn(self.red, self.user.colors.all())
+
+
+class RemapColorsAPITests(TestCase):
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(email=EXAMPLE_EMAIL, password=PASSWORD1)
+        self.red = Color.objects.create(hex_color=parse_hex_color('ff0000'))
+        self.blue = Color.objects.create(hex_color=parse_hex_color('0000ff'))
+        self.user.colors.add(self.red, self.blue)
+        self.other_color = Color.objects.create(hex_color=parse_hex_color('123456'))
+        self.diary = Diary.objects.create(user=self.user, color=self.red, color_level=5, context='a')
+        self.token = RefreshToken.for_user(self.user).access_token
+
+    def post(self, data):
+        return self.client.post('/api/colors/remap/', data, content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def test_remap(self):
+        response = self.post({'colors': {str(self.red.pk): 'ffff00', str(self.blue.pk): '00ff00'}})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['recolored'], 1)
+        yellow = Color.objects.get(hex_color=parse_hex_color('ffff00'))
+        self.assertEqual(Diary.objects.get(self.user, pk=self.diary.pk).color, yellow)
+        codes = {color['hex_color']['code'] for color in response.json()['colors']}
+        self.assertTrue({'#FFFF00', '#00FF00'} <= codes)
+        self.assertNotIn(self.red, self.user.colors.all())
+
+    def test_color_not_in_palette(self):
+        response = self.post({'colors': {str(self.other_color.pk): 'ffff00'}})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Diary.objects.get(self.user, pk=self.diary.pk).color, self.red)
+
+    def test_invalid_hex_color(self):
+        response = self.post({'colors': {str(self.red.pk): 'zzzzzz'}})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,189 @@
+import datetime
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from ..fields import parse_hex_color
+from ..models import Color, Diary
+from ..recolor import remap_colors
+from ..utils import get_hashids
+from .constant import *
+
+
+class ColorReferenceCountTests(TestCase):
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(email=EXAMPLE_EMAIL, password=PASSWORD1)
+        self.user2 = get_user_model().objects.create_user(email=EXAMPLE_EMAIL2, password=PASSWORD2)
+        self.red = Color.objects.create(hex_color=parse_hex_color('ff0000'))
+        self.blue = Color.objects.create(hex_color=parse_hex_color('0000ff'))
+
+    def ref_count(self, color):
+        return Color.objects.get(pk=color.pk).ref_count
+
+    def assertRecounted(self):
+        # 差分で保ったref_countが、数え直した値と同じ
+        counts = dict(Color.objects.values_list('pk', 'ref_count'))
+        Color.objects.recount_references()
+        self.assertEqual(counts, dict(Color.objects.values_list('pk', 'ref_count')))
+
+    def test_new_user(self):
+        self.assertEqual(self.ref_count(Color.get_default_color()), 2)
+        self.assertEqual(self.ref_count(self.red), 0)
+        self.assertRecounted()
+
+    def test_palette(self):
+        self.user.colors.add(self.red, self.blue)
+        self.red.users.add(self.user, self.user2)
+        self.assertEqual(self.ref_count(self.red), 2)
+        self.assertEqual(self.ref_count(self.blue), 1)
+
+        # パレットに無い色を外しても減らない
+        self.user2.colors.remove(self.red, self.blue)
+        self.assertEqual(self.ref_count(self.red), 1)
+        self.assertEqual(self.ref_count(self.blue), 1)
+
+        self.red.users.clear()
+        self.user.colors.clear()
+        self.assertEqual(self.ref_count(self.red), 0)
+        self.assertEqual(self.ref_count(self.blue), 0)
+        self.assertIsNotNone(Color.objects.get(pk=self.red.pk).unreferenced_since)
+        self.assertRecounted()
+
+    def test_diary(self):
+        diary = Diary.objects.create(user=self.user, color=self.red, color_level=5, context='a')
+        self.assertEqual(self.ref_count(self.red), 1)
+        self.assertIsNone(Color.objects.get(pk=self.red.pk).unreferenced_since)
+
+        diary = Diary.objects.get(self.user, pk=diary.pk)
+        diary.color = self.blue
+        diary.save()
+        self.assertEqual(self.ref_count(self.red), 0)
+        self.assertEqual(self.ref_count(self.blue), 1)
+
+        diary.context = 'b'
+        diary.save()
+        self.assertEqual(self.ref_count(self.blue), 1)
+
+        diary.delete()
+        self.assertEqual(self.ref_count(self.blue), 0)
+        self.assertRecounted()
+
+    def test_deleted_user(self):
+        self.user.colors.add(self.red)
+        Diary.objects.create(user=self.user, color=self.blue, color_level=5, context='a')
+        self.user.delete()
+        self.assertEqual(self.ref_count(self.red), 0)
+        self.assertEqual(self.ref_count(self.blue), 0)
+        self.assertRecounted()
+
+    def test_deleted_user_queries_do_not_grow_with_diaries(self):
+        def delete_user(email, diary_count):
+            user = get_user_model().objects.create_user(email=email, password=PASSWORD1)
+            user.colors.add(self.red)
+            for i in range(diary_count):
+                Diary.objects.create(user=user, color=[self.red, self.blue][i % 2], color_level=5, context='a')
+            with CaptureQueriesContext(connection) as context:
+                user.delete()
+            return len(context.captured_queries)
+
+        self.assertEqual(delete_user('one@example.com', 1), delete_user('many@example.com', 6))
+        self.assertFalse(Diary._base_manager.filter(user__email__in=['one@example.com', 'many@example.com']).exists())
+        self.assertEqual(self.ref_count(self.red), 0)
+        self.assertRecounted()
+
+    def test_deleted_users_by_queryset(self):
+        self.user.colors.add(self.red)
+        self.user2.colors.add(self.red)
+        Diary.objects.create(user=self.user, color=self.blue, color_level=5, context='a')
+        Diary.objects.create(user=self.user2, color=self.blue, color_level=5, context='b')
+        get_user_model().objects.filter(pk__in=[self.user.pk, self.user2.pk]).delete()
+        self.assertEqual(self.ref_count(self.red), 0)
+        self.assertEqual(self.ref_count(self.blue), 0)
+        self.assertFalse(Diary._base_manager.exists())
+        self.assertRecounted()
+
+    def test_deleted_color(self):
+        Diary.objects.create(user=self.user, color=self.red, color_level=5, context='a')
+        self.red.delete()
+        self.assertRecounted()
+
+    def test_remap_colors(self):
+        self.user.colors.add(self.red)
+        for _ in range(3):
+            Diary.objects.create(user=self.user, color=self.red, color_level=5, context='a')
+        remap_colors(self.user, {self.red: self.blue}, chunk_size=2)
+        self.assertEqual(self.ref_count(self.red), 0)
+        self.assertEqual(self.ref_count(self.blue), 4)
+        self.assertRecounted()
+
+    def test_delete_color_view_does_not_count(self):
+        self.user.colors.add(self.red)
+        self.client.login(email=EXAMPLE_EMAIL, password=PASSWORD1)
+        url = reverse('color_diary:delete-color', kwargs={'color_hash_id': get_hashids().encode(self.red.pk)})
+        with CaptureQueriesContext(connection) as context:
+            self.client.post(url)
+        self.assertFalse(any('COUNT(' in query['sql'] for query in context.captured_queries))
+        self.assertEqual(self.ref_count(self.red), 0)
+
+
+class SweepColorsTests(TestCase):
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(email=EXAMPLE_EMAIL, password=PASSWORD1)
+        self.colors = [Color.objects.create(hex_color=parse_hex_color(f'0000{i:02x}')) for i in range(5)]
+        self.used = Color.objects.create(hex_color=parse_hex_color('ff0000'))
+        self.user.colors.add(self.used)
+        self.one_hour_ago = timezone.now() - datetime.timedelta(hours=1, minutes=1)
+
+    def sweep(self, *args):
+        out = StringIO()
+        call_command('sweep_colors', '--sleep', '0', *args, stdout=out)
+        return out.getvalue()
+
+    def test_sweep(self):
+        Color.objects.filter(pk__in=[color.pk for color in self.colors]).update(unreferenced_since=self.one_hour_ago)
+        self.assertIn('deleted 5', self.sweep('--batch-size', '2'))
+        self.assertFalse(Color.objects.filter(pk__in=[color.pk for color in self.colors]).exists())
+        self.assertTrue(Color.objects.filter(pk=self.used.pk).exists())
+        self.assertTrue(Color.objects.filter(pk=Color.get_default_color_id()).exists())
+
+    def test_sweep_deletes_a_batch_at_once(self):
+        Color.objects.filter(pk__in=[color.pk for color in self.colors]).update(unreferenced_since=self.one_hour_ago)
+        with CaptureQueriesContext(connection) as context:
+            self.sweep()
+        self.assertEqual(sum(query['sql'].startswith('DELETE') for query in context.captured_queries), 1)
+
+    def test_reused_color_is_not_swept(self):
+        Color.objects.filter(pk__in=[color.pk for color in self.colors]).update(unreferenced_since=self.one_hour_ago)
+        self.assertEqual(Color.objects.create(hex_color=self.colors[0].hex_color), self.colors[0])
+        self.assertIn('deleted 4', self.sweep())
+        self.assertTrue(Color.objects.filter(pk=self.colors[0].pk).exists())
+
+    def test_default_color_is_never_swept(self):
+        # 他のプロセスが覚えているidが消えないように、誰も使っていなくても、覚えているidが古くても消さない
+        Color.users.through.objects.filter(color__hex_color=Color.TRANSPARENT).delete()
+        Color.objects.filter(hex_color=Color.TRANSPARENT).update(ref_count=0, unreferenced_since=self.one_hour_ago)
+        Color._default_color_id = self.used.pk
+        try:
+            self.sweep()
+        finally:
+            Color.forget_default_color_id()
+        self.assertTrue(Color.objects.filter(hex_color=Color.TRANSPARENT).exists())
+
+    def test_grace(self):
+        # 作ったばかりの色は、まだパレットに入れる前かもしれないので消さない
+        self.assertIn('deleted 0', self.sweep())
+
+    def test_drifted_ref_count(self):
+        Color.objects.filter(pk=self.used.pk).update(ref_count=0, unreferenced_since=self.one_hour_ago)
+        self.sweep()
+        self.assertTrue(Color.objects.filter(pk=self.used.pk).exists())
+
+        self.sweep('--recount')
+        self.assertEqual(Color.objects.get(pk=self.used.pk).ref_count, 1)
+        self.assertIsNone(Color.objects.get(pk=self.used.pk).unreferenced_since)
@@ -0,0 +1,129 @@
+from unittest import mock
+
+from django.test import TestCase, SimpleTestCase
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from ..fields import parse_hex_color
+from ..models import Color, Diary, DiaryNgram
+from ..search import SEARCH_RESULT_LIMIT, normalize, ngram_counts, make_snippet, split_snippet, search_diaries
+from .constant import *
+
+
+class NgramTests(SimpleTestCase):
+    def test_normalize(self):
+        self.assertEqual(normalize('ＡＢＣ ｶﾀｶﾅ'), ('abc カタカナ', list(range(8))))
+
+    def test_normalize_returns_original_positions(self):
+        # ㍿は4文字になる
+        normalized, positions = normalize('a㍿b')
+        self.assertEqual(normalized, 'a株式会社b')
+        self.assertEqual(positions, [0, 1, 1, 1, 1, 2])
+
+    def test_ngram_counts(self):
+        self.assertEqual(ngram_counts('今日は 今日'), {'今日': 2, '日は': 1, 'は': 1, '日': 1})
+
+    def test_make_snippet(self):
+        snippet, highlights = make_snippet('今日はＡＢＣに行った', ['abc'])
+        self.assertEqual(snippet, '今日はＡＢＣに行った')
+        self.assertEqual(highlights, [(3, 6)])
+        self.assertEqual(split_snippet(snippet, highlights), [('今日は', False), ('ＡＢＣ', True), ('に行った', False)])
+
+    def test_make_snippet_is_cut(self):
+        context = 'あ' * 100 + '散歩' + 'い' * 100
+        snippet, highlights = make_snippet(context, ['散歩'])
+        self.assertEqual(snippet, 'あ' * 30 + '散歩' + 'い' * 30)
+        self.assertEqual(highlights, [(30, 32)])
+
+    def test_make_snippet_without_match(self):
+        self.assertIsNone(make_snippet('今日は晴れ', ['雨']))
+
+
+class DiarySearchTests(TestCase):
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(email=EXAMPLE_EMAIL, password=PASSWORD1)
+        self.user2 = get_user_model().objects.create_user(email=EXAMPLE_EMAIL2, password=PASSWORD2)
+        self.color = Color.objects.create(hex_color=parse_hex_color('ff0000'))
+
+        self.walk_diary = Diary.objects.create(user=self.user, color=self.color, color_level=5, context='公園を散歩した。散歩は楽しい。')
+        self.rain_diary = Diary.objects.create(user=self.user, color=self.color, color_level=5, context='雨で散歩に行けなかった')
+        self.work_diary = Diary.objects.create(user=self.user, color=self.color, color_level=5, context='仕事でDjangoを書いた')
+        self.diary_of_user2 = Diary.objects.create(user=self.user2, color=self.color, color_level=5, context='散歩した')
+
+    def search(self, query, **kwargs):
+        return search_diaries(self.user, query, **kwargs)
+
+    def test_ranked_by_count(self):
+        self.assertEqual(self.search('散歩'), [self.walk_diary, self.rain_diary])
+
+    def test_all_words_must_match(self):
+        self.assertEqual(self.search('散歩 雨'), [self.rain_diary])
+        self.assertEqual(self.search('散歩 雪'), [])
+
+    def test_one_character(self):
+        self.assertEqual(self.search('雨'), [self.rain_diary])
+        # 出現回数が同じなら新しい順
+        self.assertEqual(self.search('た'), [self.work_diary, self.rain_diary, self.walk_diary])
+
+    def test_normalized_query(self):
+        self.assertEqual(self.search('ＤＪＡＮＧＯ'), [self.work_diary])
+
+    def test_bigrams_in_different_places_do_not_match(self):
+        # 「散歩」と「歩し」は両方あるが「散歩し」はない
+        Diary.objects.create(user=self.user, color=self.color, color_level=5, context='散歩 歩した')
+        self.assertEqual(self.search('散歩し'), [self.walk_diary])
+
+    def test_index_is_updated(self):
+        self.rain_diary.context = '晴れたので公園に行った'
+        self.rain_diary.save()
+        self.assertEqual(self.search('散歩'), [self.walk_diary])
+        self.assertEqual(self.search('晴れ'), [self.rain_diary])
+        self.assertEqual(
+            DiaryNgram.objects.filter(diary=self.rain_diary).count(),
+            len(ngram_counts(self.rain_diary.context))
+        )
+
+        self.rain_diary.delete()
+        self.assertEqual(self.search('晴れ'), [])
+
+    def test_snippet(self):
+        diary = self.search('雨')[0]
+        self.assertEqual(diary.snippet, '雨で散歩に行けなかった')
+        self.assertEqual(diary.highlights, [(0, 1)])
+
+    def test_query_count(self):
+        with self.assertNumQueries(2):
+            self.search('散歩')
+
+    def test_view(self):
+        self.client.login(email=EXAMPLE_EMAIL, password=PASSWORD1)
+        response = self.client.get(reverse('color_diary:diary-search'), {'q': '雨'})
+        self.assertEqual(response.context['diary_list'], [self.rain_diary])
+        self.assertContains(response, '<mark>雨</mark>')
+
+    def test_view_without_result(self):
+        self.client.login(email=EXAMPLE_EMAIL, password=PASSWORD1)
+        response = self.client.get(reverse('color_diary:diary-search'), {'q': '雪'})
+        self.assertEqual(response.context['diary_list'], [])
+        self.assertContains(response, '「雪」を含む日記は見つかりませんでした。')
+
+    def test_api(self):
+        token = RefreshToken.for_user(self.user).access_token
+        response = self.client.get('/api/diaries/search/', {'q': '散歩'}, HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.json()], [self.walk_diary.pk, self.rain_diary.pk])
+        self.assertEqual(response.json()[1]['highlights'], [[2, 4]])
+
+    def test_api_with_invalid_limit(self):
+        token = RefreshToken.for_user(self.user).access_token
+        for limit in [-1, 0]:
+            response = self.client.get('/api/diaries/search/', {'q': '散歩', 'limit': limit}, HTTP_AUTHORIZATION=f'Bearer {token}')
+            self.assertEqual(response.status_code, 400)
+
+    def test_api_caps_limit(self):
+        token = RefreshToken.for_user(self.user).access_token
+        with mock.patch('color_diary.views.api.search_diaries', return_value=[]) as search:
+            response = self.client.get('/api/diaries/search/', {'q': '散歩', 'limit': 10 ** 9}, HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(search.call_args.kwargs['limit'], SEARCH_RESULT_LIMIT)
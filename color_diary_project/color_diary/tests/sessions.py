@@ -0,0 +1,48 @@
+import datetime
+from io import StringIO
+
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from ..checks import check_session_cache
+
+
+class PurgeSessionsTests(TestCase):
+    def setUp(self) -> None:
+        now = timezone.now()
+        for index in range(5):
+            Session.objects.create(session_key=f'expired{index}', session_data='', expire_date=now - datetime.timedelta(days=1))
+        Session.objects.create(session_key='alive', session_data='', expire_date=now + datetime.timedelta(days=1))
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db')
+    def test_purge_in_chunks(self):
+        out = StringIO()
+        call_command('purge_sessions', chunk_size=2, sleep=0, stdout=out)
+        self.assertIn('deleted 5 expired sessions.', out.getvalue())
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['alive'])
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_cookie_sessions(self):
+        out = StringIO()
+        call_command('purge_sessions', stdout=out)
+        self.assertIn('does not store sessions in the database.', out.getvalue())
+        self.assertEqual(Session.objects.count(), 6)
+
+
+class SessionCacheCheckTests(SimpleTestCase):
+    LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    MEMCACHED = {'default': {'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache', 'LOCATION': '127.0.0.1:11211'}}
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db', CACHES=LOCMEM)
+    def test_cached_sessions_on_local_cache(self):
+        self.assertEqual([error.id for error in check_session_cache(None)], ['color_diary.E001'])
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db', CACHES=MEMCACHED)
+    def test_cached_sessions_on_shared_cache(self):
+        self.assertEqual(check_session_cache(None), [])
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db', CACHES=LOCMEM)
+    def test_db_sessions(self):
+        self.assertEqual(check_session_cache(None), [])
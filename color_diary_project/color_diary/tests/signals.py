@@ -1,5 +1,6 @@
 from django.test import TestCase
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import update_last_login
 
 from ..fields import HexColor
 from ..models import Color
@@ -31,3 +32,24 @@ class UserPostSaveTests(TestCase):
         self.assertEqual(Color.objects.all().count(), 1 + len(hex_color_list))
         self.assertEqual(Color.objects.filter(users__id=user1.pk).count(), 1 + len(hex_color_list))
         self.assertEqual(Color.objects.filter(users__id=user2.pk).count(), 1 + len(hex_color_list))
+
+    def test_default_color_setting_queries_on_signup(self):
+        UserModelTests.create_user(email=EXAMPLE_EMAIL, password=PASSWORD1)
+        # INSERT user, SELECT colors, INSERT user_colors, UPDATE ref_count
+        with self.assertNumQueries(4):
+            UserModelTests.create_user(email=EXAMPLE_EMAIL2, password=PASSWORD2)
+
+    def test_default_color_setting_is_not_run_on_login(self):
+        user = UserModelTests.create_user(email=EXAMPLE_EMAIL, password=PASSWORD1)
+        user.colors.remove(*user.colors.exclude(hex_color=Color.TRANSPARENT))
+        # ログインの時にユーザーについて実行されるのは、last_loginのUPDATEだけ
+        with self.assertNumQueries(1):
+            update_last_login(None, user)
+        self.assertEqual(user.colors.all().count(), 1)
+
+    def test_default_color_setting_is_not_run_on_update(self):
+        user = UserModelTests.create_user(email=EXAMPLE_EMAIL, password=PASSWORD1)
+        user.colors.clear()
+        with self.assertNumQueries(1):
+            user.save()
+        self.assertEqual(user.colors.all().count(), 0)
@@ -0,0 +1,116 @@
+import datetime
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from ..fields import parse_hex_color
+from ..forms import ColorModelForm
+from ..models import Color, Diary, DiaryDailySummary
+from .constant import *
+
+
+class DiaryDailySummaryTests(TestCase):
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(email=EXAMPLE_EMAIL, password=PASSWORD1)
+        self.red = Color.objects.create(hex_color=parse_hex_color('ff0000'))
+        self.blue = Color.objects.create(hex_color=parse_hex_color('0000ff'))
+        self.user.colors.add(self.red, self.blue)
+        self.date = datetime.date(2021, 4, 1)
+
+    def local_datetime(self, date, hour):
+        return timezone.make_aware(datetime.datetime.combine(date, datetime.time(hour)))
+
+    def create_diary(self, color, color_level, context, date=None, hour=12):
+        return Diary.objects.create(
+            user=self.user, color=color, color_level=color_level, context=context,
+            created_at=self.local_datetime(date or self.date, hour)
+        )
+
+    def get_summary(self, date=None):
+        return DiaryDailySummary.objects.get(user=self.user, date=date or self.date)
+
+    def assertSummary(self, summary, count, color_counts, mean_color_level, context_length):
+        self.assertEqual(summary.count, count)
+        self.assertEqual(summary.color_counts, color_counts)
+        self.assertEqual(summary.mean_color_level, mean_color_level)
+        self.assertEqual(summary.context_length, context_length)
+
+    def test_create(self):
+        self.create_diary(self.red, 2, '今日は晴れ')
+        self.create_diary(self.red, 4, 'abc')
+        self.create_diary(self.blue, 6, '', hour=23)
+        self.assertSummary(self.get_summary(), 3, {str(self.red.pk): 2, str(self.blue.pk): 1}, 4, 8)
+
+    def test_local_date(self):
+        # TIME_ZONEでの日付で集計する。0時を過ぎたら次の日
+        self.create_diary(self.red, 5, 'a', hour=0)
+        self.create_diary(self.red, 5, 'b', date=self.date + datetime.timedelta(days=1), hour=0)
+        self.assertEqual(self.get_summary().count, 1)
+        self.assertEqual(self.get_summary(self.date + datetime.timedelta(days=1)).count, 1)
+
+    def test_update(self):
+        diary = self.create_diary(self.red, 2, 'abc')
+        diary.context = 'abcdef'
+        diary.color = self.blue
+        diary.save()
+        self.assertSummary(self.get_summary(), 1, {str(self.blue.pk): 1}, 2, 6)
+
+    def test_move_to_other_date(self):
+        diary = self.create_diary(self.red, 2, 'abc')
+        diary = Diary.objects.get(self.user, pk=diary.pk)
+        diary.created_at = self.local_datetime(self.date + datetime.timedelta(days=1), 12)
+        diary.save()
+        self.assertFalse(DiaryDailySummary.objects.filter(user=self.user, date=self.date).exists())
+        self.assertEqual(self.get_summary(self.date + datetime.timedelta(days=1)).count, 1)
+
+    def test_delete(self):
+        diary = self.create_diary(self.red, 2, 'abc')
+        self.create_diary(self.red, 4, 'de')
+        diary.delete()
+        self.assertSummary(self.get_summary(), 1, {str(self.red.pk): 1}, 4, 2)
+
+        Diary.objects.get(self.user, color=self.red).delete()
+        self.assertFalse(DiaryDailySummary.objects.filter(user=self.user).exists())
+
+    def test_recolor_by_color_model_form(self):
+        self.create_diary(self.red, 2, 'abc')
+        form = ColorModelForm(user=self.user, instance=self.red, data={'hex_color': '00ff00'})
+        self.assertTrue(form.is_valid())
+        form.save()
+        green = Color.objects.get(hex_color=parse_hex_color('00ff00'))
+        self.assertEqual(self.get_summary().color_counts, {str(green.pk): 1})
+
+    def test_delete_color(self):
+        self.create_diary(self.red, 2, 'abc')
+        self.red.delete()
+        self.assertEqual(self.get_summary().color_counts, {str(Color.get_default_color_id()): 1})
+
+    def test_user_delete(self):
+        self.create_diary(self.red, 2, 'abc')
+        self.user.delete()
+        self.assertFalse(DiaryDailySummary.objects.exists())
+
+    def test_rebuild_command(self):
+        self.create_diary(self.red, 2, 'abc')
+        self.create_diary(self.blue, 4, 'de', date=self.date + datetime.timedelta(days=3))
+        fields = ('user', 'date', 'count', 'color_counts', 'color_level_sum', 'context_length')
+        expected = list(DiaryDailySummary.objects.order_by('date').values(*fields))
+        DiaryDailySummary.objects.all().delete()
+
+        call_command('rebuild_daily_summaries', stdout=StringIO())
+        self.assertEqual(list(DiaryDailySummary.objects.order_by('date').values(*fields)), expected)
+        self.assertEqual(len(expected), 2)
+
+    def test_api(self):
+        self.create_diary(self.red, 2, 'abc')
+        self.create_diary(self.red, 4, 'abc', date=self.date + datetime.timedelta(days=3))
+        token = RefreshToken.for_user(self.user).access_token
+        response = self.client.get('/api/daily-summaries/', {'from': '2021-04-02'}, HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [{
+            'date': '2021-04-04', 'count': 1, 'color_counts': {str(self.red.pk): 1}, 'mean_color_level': 4.0, 'context_length': 3
+        }])
@@ -0,0 +1,34 @@
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase
+from hashids import Hashids
+
+from ..utils import MIN_LENGTH, SALT, get_hashids
+
+
+class HashidsCodecTests(SimpleTestCase):
+    def setUp(self) -> None:
+        self.hashids = Hashids(salt=SALT, min_length=MIN_LENGTH)
+
+    def test_shared(self):
+        self.assertIs(get_hashids(), get_hashids())
+
+    def test_same_as_hashids(self):
+        for value in (0, 1, 12345, 2111549857857):
+            hash_id = get_hashids().encode(value)
+            self.assertEqual(hash_id, self.hashids.encode(value))
+            self.assertEqual(get_hashids().decode(hash_id), (value,))
+        self.assertEqual(get_hashids().decode('invalid'), ())
+
+    def test_cached(self):
+        codec = get_hashids()
+        codec.encode(98765)
+        hits = codec.encode.cache_info().hits
+        codec.encode(98765)
+        self.assertEqual(codec.encode.cache_info().hits, hits + 1)
+
+    def test_attach(self):
+        objects = [SimpleNamespace(pk=pk) for pk in (3, 1, 2)]
+        self.assertIs(get_hashids().attach(objects), objects)
+        self.assertEqual([obj.hash_id for obj in objects], [self.hashids.encode(pk) for pk in (3, 1, 2)])
+        self.assertEqual(get_hashids().encode_many(['3', 1]), [self.hashids.encode(3), self.hashids.encode(1)])
@@ -1,19 +1,28 @@
 import re
+import json
 import logging
+from io import StringIO
 
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.core.signing import dumps
 from django.core import mail
+from django.core.management import call_command
 from django.contrib.auth import get_user_model, REDIRECT_FIELD_NAME, authenticate
 from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
 
 from .models import Diary, Color
 from .fields import parse_hex_color
 from .constant import *
+from ..page_cache import invalidate_pages
 from ..utils import get_hashids
 from ..forms import DEFAULT_COLOR_LEVEL
 from ..views import CREATE
+from ..pagination import DIARY_PAGE_SIZE
+from ..serializers import DiaryPreviewSerializer
 
 
 logger = logging.getLogger(__name__)
@@ -219,6 +228,86 @@ class ChooseColorViewTests(TestCase):
         self.assertEqual(response.status_code, 404)
 
 
+class ComposeDiaryViewTests(TestCase):
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(email=EXAMPLE_EMAIL, password=PASSWORD1)
+        self.red = Color.objects.create(hex_color=parse_hex_color('ff0000'))
+        self.green = Color.objects.create(hex_color=parse_hex_color('00ff00'))
+        self.user.colors.add(self.red, self.green)
+        self.diary = Diary.objects.create(user=self.user, color=self.red, color_level=8, context=CONTEXT)
+
+        self.user2 = get_user_model().objects.create_user(email=EXAMPLE_EMAIL2, password=PASSWORD2)
+        self.blue = Color.objects.create(hex_color=parse_hex_color('0000ff'))
+        self.user2.colors.add(self.blue)
+        self.diary_user2 = Diary.objects.create(user=self.user2, color=self.blue, color_level=1, context=CONTEXT)
+
+        self.client.login(username=EXAMPLE_EMAIL, password=PASSWORD1)
+
+    def compose_url(self, diary_id):
+        return reverse('color_diary:compose-diary', kwargs={'diary_hash_id': get_hashids().encode(diary_id)})
+
+    def test_compose_with_anonymous_user(self):
+        self.client.logout()
+        url = self.compose_url(CREATE)
+        self.assertRedirects(self.client.get(url), f'/login/?{REDIRECT_FIELD_NAME}={url}')
+
+    def test_get_when_creating_diary(self):
+        response = self.client.get(self.compose_url(CREATE))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['form'].initial['color'], Color.get_default_color_id())
+        self.assertEqual(response.context['form'].initial['color_level'], DEFAULT_COLOR_LEVEL)
+        self.assertEqual(set(response.context['form'].fields['color'].queryset), set(self.user.colors.all()))
+        self.assertNotIn(self.blue, response.context['form'].fields['color'].queryset)
+
+    def test_create_in_one_request(self):
+        session_keys = set(self.client.session.keys())
+        response = self.client.post(self.compose_url(CREATE), {
+            'color': self.green.pk, 'color_level': 3, 'context': 'composed diary',
+        })
+        self.assertRedirects(response, reverse('color_diary:diary-index'))
+        diary = Diary.objects.filter(self.user, context='composed diary').get()
+        self.assertEqual((diary.color, diary.color_level), (self.green, 3))
+        self.assertIsNotNone(diary.created_at)
+        self.assertEqual(set(self.client.session.keys()), session_keys)
+
+    def test_edit_in_one_request(self):
+        response = self.client.get(self.compose_url(self.diary.pk))
+        self.assertEqual(response.context['form'].initial['color'], self.red.pk)
+        self.assertEqual(response.context['form'].initial['color_level'], 8)
+
+        created_at = self.diary.created_at
+        response = self.client.post(self.compose_url(self.diary.pk), {
+            'color': self.green.pk, 'color_level': 2, 'context': 'edited diary',
+            'created_at': timezone.localtime(created_at).strftime('%Y-%m-%d %H:%M:%S.%f'),
+        })
+        self.assertRedirects(response, reverse('color_diary:diary-index'))
+        self.diary.refresh_from_db()
+        self.assertEqual((self.diary.color, self.diary.color_level, self.diary.context), (self.green, 2, 'edited diary'))
+        self.assertEqual(self.diary.created_at, created_at)
+
+    def test_color_of_other_user(self):
+        response = self.client.post(self.compose_url(CREATE), {
+            'color': self.blue.pk, 'color_level': 3, 'context': 'composed diary',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('color', response.context['form'].errors)
+        self.assertFalse(Diary.objects.filter(self.user, context='composed diary').exists())
+
+    def test_invalid_color_level(self):
+        response = self.client.post(self.compose_url(CREATE), {
+            'color': self.red.pk, 'color_level': 11, 'context': 'composed diary',
+        })
+        self.assertIn('color_level', response.context['form'].errors)
+
+    def test_diary_of_other_user(self):
+        self.assertEqual(self.client.get(self.compose_url(self.diary_user2.pk)).status_code, 404)
+        response = self.client.post(self.compose_url(self.diary_user2.pk), {
+            'color': self.red.pk, 'color_level': 3, 'context': 'composed diary',
+        })
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.client.get(reverse('color_diary:compose-diary', kwargs={'diary_hash_id': 'invalid'})).status_code, 404)
+
+
 class DeleteDiaryViewTests(TestCase):
     def setUp(self) -> None:
         self.user = get_user_model().objects.create_user(email=EXAMPLE_EMAIL, password=PASSWORD1)
@@ -324,9 +413,34 @@ class DeleteColorViewTests(TestCase):
     def test_delete_color_that_belongs_to_one_user_and_then_object_deleted(self):
         hash_id = get_hashids().encode(self.user_color2.pk)
         self.client.post(reverse('color_diary:delete-color', kwargs={'color_hash_id': hash_id}))
+        # 色はsweep_colorsが猶予の後に消す
+        self.assertEqual(Color.objects.get(hex_color=parse_hex_color('0000ff')).ref_count, 0)
+        call_command('sweep_colors', '--grace', '0', stdout=StringIO())
         self.assertEqual(Color.objects.filter(hex_color=parse_hex_color('0000ff')).count(), 0)
 
 
+    def test_diaries_of_deleted_color_get_default_color_and_can_be_edited(self):
+        diary = Diary.objects.create(user=self.user, color=self.user_color, color_level=5, context=CONTEXT)
+        hash_id = get_hashids().encode(self.user_color.pk)
+        self.client.post(reverse('color_diary:delete-color', kwargs={'color_hash_id': hash_id}))
+        diary = Diary.objects.get(self.user, pk=diary.pk)
+        self.assertEqual(diary.color_id, Color.get_default_color_id())
+
+        response = self.client.post(reverse('color_diary:edit-diary', kwargs={'diary_hash_id': get_hashids().encode(diary.pk)}), data={
+            'context': 'edited',
+            'color': diary.color_id,
+            'color_level': 3,
+        })
+        self.assertRedirects(response, reverse('color_diary:diary-index'))
+        self.assertEqual(Diary.objects.get(self.user, pk=diary.pk).context, 'edited')
+
+    def test_cannot_delete_default_color_and_return_404(self):
+        hash_id = get_hashids().encode(Color.get_default_color_id())
+        response = self.client.post(reverse('color_diary:delete-color', kwargs={'color_hash_id': hash_id}))
+        self.assertEqual(response.status_code, 404)
+        self.assertIn(Color.get_default_color(), self.user.colors.all())
+
+
 class EditDiaryViewTests(TestCase):
     def setUp(self) -> None:
         self.user = get_user_model().objects.create_user(email=EXAMPLE_EMAIL, password=PASSWORD1)
@@ -527,6 +641,58 @@ class DiaryIndexViewTests(TestCase):
         self.old_diary.context = 'this is an updated old diary.'
         self.assertQuerysetEqual(response.context['diary_list'], [f'<Diary: Diary object ({self.new_diary.pk})>', f'<Diary: Diary object ({self.old_diary.pk})>'])
 
+    def create_diaries(self, count):
+        created_at = timezone.now() - timezone.timedelta(days=1)
+        return [
+            Diary.objects.create(user=self.user, color=self.color, color_level=5, context=f'diary {i}', created_at=created_at)
+            for i in range(count)
+        ]
+
+    def test_diary_index_shows_first_page(self):
+        self.create_diaries(DIARY_PAGE_SIZE)
+        response = self.client.get(reverse('color_diary:diary-index'))
+        self.assertEqual(len(response.context['diary_list']), DIARY_PAGE_SIZE)
+        self.assertEqual(response.context['diary_list'][:2], [self.new_diary, self.old_diary])
+        self.assertIn(reverse('color_diary:diary-index-fragment'), response.context['next_url'])
+
+    def test_diary_index_fragment_shows_rest(self):
+        # 同じcreated_atの日記はidの降順に並ぶ
+        diaries = self.create_diaries(DIARY_PAGE_SIZE)
+        response = self.client.get(reverse('color_diary:diary-index'))
+        response = self.client.get(response.context['next_url'])
+        self.assertEqual(response.context['diary_list'], diaries[::-1][DIARY_PAGE_SIZE - 2:])
+        self.assertIsNone(response.context['next_url'])
+        self.assertContains(response, 'diary 0')
+        self.assertNotContains(response, '<html')
+
+    def test_diary_index_fragment_with_invalid_cursor(self):
+        response = self.client.get(reverse('color_diary:diary-index-fragment'), {'cursor': 'invalid'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_diary_index_does_not_load_context(self):
+        Diary.objects.create(user=self.user, color=self.color, color_level=8, context='あ' * 150)
+        response = self.client.get(reverse('color_diary:diary-index'))
+        for diary in response.context['diary_list']:
+            self.assertIn('context', diary.get_deferred_fields())
+        self.assertContains(response, 'あ' * 99 + '…')
+
+    def test_diary_index_renders_card_colors(self):
+        # 赤(ff0000)をcolor_level 8で白に重ねると、#ff3333
+        response = self.client.get(reverse('color_diary:diary-index'))
+        self.assertContains(response, 'border-color: #e52d2d; background-color: #ff3333; color: #ffffff;', count=2)
+        self.assertContains(response, "'rgba(255, 255, 255, 0.6)' : '#ffffff'", count=2)
+
+    def test_diary_index_queries_do_not_depend_on_diary_count(self):
+        # ページがキャッシュされていない時のクエリ数(セッション・ユーザー・日記)
+        self.client.get(reverse('color_diary:diary-index'))
+        invalidate_pages([self.user.pk])
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse('color_diary:diary-index'))
+        self.assertLessEqual(len(context.captured_queries), 3)
+        self.create_diaries(DIARY_PAGE_SIZE * 2)
+        with self.assertNumQueries(len(context.captured_queries)):
+            self.client.get(reverse('color_diary:diary-index'))
+
 
 class ColorIndexViewTests(TestCase):
     def setUp(self) -> None:
@@ -580,4 +746,49 @@ class ColorIndexViewTests(TestCase):
 
 
 class WelcomeViewTests(TestCase):
-    pass
\ No newline at end of file
+    pass
+
+class DiaryViewSetTests(TestCase):
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(email=EXAMPLE_EMAIL, password=PASSWORD1)
+        self.color = Color.objects.create(hex_color=parse_hex_color('ff0000'))
+        self.diary = Diary.objects.create(user=self.user, color=self.color, color_level=8, context='あ' * 150)
+        self.token = RefreshToken.for_user(self.user).access_token
+
+    def test_list_returns_preview(self):
+        response = self.client.get('/api/diaries/', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['preview'], 'あ' * 99 + '…')
+        self.assertNotIn('context', response.json()['results'][0])
+
+    def test_list_returns_card_colors(self):
+        response = self.client.get('/api/diaries/', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        self.assertEqual(
+            {key: response.json()['results'][0][key] for key in ('background_color', 'border_color', 'font_color')},
+            {'background_color': '#ff3333', 'border_color': '#e52d2d', 'font_color': '#ffffff'},
+        )
+
+    def test_list_is_same_as_preview_serializer(self):
+        Diary.objects.create(user=self.user, color=Color.get_default_color(), color_level=3, context='transparent')
+        Diary.objects.create(user=self.user, color=self.color, color_level=1, context='')
+        half = Color.objects.create(hex_color=parse_hex_color('12ab5f0.5'))
+        Diary.objects.create(user=self.user, color=half, color_level=10, context='half')
+
+        response = self.client.get('/api/diaries/', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        queryset = Diary.objects.all(self.user).select_related('user', 'color').defer('context').order_by('-created_at', '-id')
+        self.assertEqual(response.json()['results'], json.loads(json.dumps(DiaryPreviewSerializer(queryset, many=True).data)))
+
+    def test_list_queries(self):
+        for _ in range(5):
+            Diary.objects.create(user=self.user, color=self.color, color_level=8, context='a')
+        invalidate_pages([self.user.pk])
+        with CaptureQueriesContext(connection) as context:
+            self.client.get('/api/diaries/', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        # ユーザー, 日記(色をJOIN)
+        self.assertEqual(sum('color_diary_diary' in query['sql'] for query in context.captured_queries), 1)
+        self.assertEqual(len(context.captured_queries), 2)
+
+    def test_detail_returns_context(self):
+        response = self.client.get(f'/api/diaries/{self.diary.pk}/', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['context'], 'あ' * 150)
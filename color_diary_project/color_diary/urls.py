@@ -8,6 +8,7 @@ from . import views
 router = routers.DefaultRouter()
 router.register(r'colors', views.ColorViewSet, basename='color')
 router.register(r'diaries', views.DiaryViewSet, basename='diary')
+router.register(r'daily-summaries', views.DiaryDailySummaryViewSet, basename='daily-summary')
 router.register(r'users', views.UserViewSet)
 
 
@@ -24,7 +25,11 @@ urlpatterns = [
     path('register/done/', views.RegisterDoneView.as_view(), name='register-done'),
     path('register/<token>/', views.RegisterCompleteView.as_view(), name='register-complete'),
     path('diaries/', views.DiaryIndexView.as_view(), name='diary-index'),
+    path('diaries/fragment/', views.DiaryIndexFragmentView.as_view(), name='diary-index-fragment'),
+    path('diaries/search/', views.DiarySearchView.as_view(), name='diary-search'),
+    path('diaries/nearest/', views.NearestDiaryIndexView.as_view(), name='nearest-diary-index'),
     path('diaries/<str:diary_hash_id>/choose-color/', views.ChooseColorView.as_view(), name='choose-color'),
+    path('diaries/<str:diary_hash_id>/compose/', views.ComposeDiaryView.as_view(), name='compose-diary'),
     path('diaries/<str:diary_hash_id>/', views.EditDiaryView.as_view(), name='edit-diary'),
     path('diaries/<str:diary_hash_id>/delete/', views.DeleteDiaryView.as_view(), name='delete-diary'),
     path('colors/', views.ColorIndexView.as_view(), name='color-index'),
@@ -1,10 +1,43 @@
+from functools import lru_cache
+
+from django.conf import settings
 from hashids import Hashids
 
 
 SALT = 'Color Diary Project by neco8'
 MIN_LENGTH = 20
+HASHIDS_CACHE_SIZE = getattr(settings, 'HASHIDS_CACHE_SIZE', 4096)
+
+
+class HashidsCodec:
+    # Hashidsはインスタンスを作る度にsaltでアルファベットを並べ替えるので、プロセスで一つだけ作って使い回す。
+    # 同じidは一覧・URL・テンプレートで何度もencode/decodeされるので、結果もLRUで覚えておく
+    def __init__(self, salt=SALT, min_length=MIN_LENGTH, maxsize=HASHIDS_CACHE_SIZE):
+        self.hashids = Hashids(salt=salt, min_length=min_length)
+        self.encode = lru_cache(maxsize=maxsize)(self.hashids.encode)
+        # decodeはtupleを返すので、キャッシュした値を呼び出し側が書き換える事はない
+        self.decode = lru_cache(maxsize=maxsize)(self.hashids.decode)
+
+    def encode_many(self, values):
+        # [hash id]を返す
+        encode = self.encode
+        return [encode(int(value)) for value in values]
+
+    def attach(self, objects, attr='hash_id'):
+        # 一覧の各オブジェクトに、pkのhash idを付ける
+        # QuerySetでも一度だけ評価する(キャッシュされた同じインスタンスが返る)
+        object_list = list(objects)
+        for obj, hash_id in zip(object_list, self.encode_many(obj.pk for obj in object_list)):
+            setattr(obj, attr, hash_id)
+        return objects
+
+    def cache_clear(self):
+        self.encode.cache_clear()
+        self.decode.cache_clear()
+
+
+_hashids_codec = HashidsCodec()
 
 
 def get_hashids():
-    hashids = Hashids(salt=SALT, min_length=MIN_LENGTH)
-    return hashids
\ No newline at end of file
+    return _hashids_codec
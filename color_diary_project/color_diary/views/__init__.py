@@ -1,5 +1,6 @@
 from .top import *
 from .choose_color import *
+from .compose import *
 from .delete import *
 from .edit import *
 from .index import *
@@ -1,24 +1,149 @@
+import datetime
+
+from django.utils.decorators import method_decorator
 from rest_framework import viewsets
 from rest_framework import permissions
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
 
-from ..models import User
-from ..serializers import ColorSerializer, DiarySerializer, UserSerializer
+from ..models import Color, User
+from ..fields import parse_hex_color
+from ..page_cache import conditional_page
+from ..pagination import ColorKeysetPagination, KeysetPagination
+from ..palette_index import NEAREST_MAX_K, NEAREST_MAX_LIMIT, nearest_diaries
+from ..recolor import remap_colors
+from ..search import SEARCH_RESULT_LIMIT, search_diaries
+from ..serializers import ColorSerializer, DiarySerializer, DiaryPreviewSerializer, DiaryDailySummarySerializer, UserSerializer
+from ..serializers import diary_preview_rows, serialize_diary_previews
 
 
 class ColorViewSet(viewsets.ModelViewSet):
     serializer_class = ColorSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ColorKeysetPagination
 
     def get_queryset(self):
         return self.request.user.colors.all()
 
+    @method_decorator(conditional_page)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @action(detail=False, methods=['post'])
+    def remap(self, request):
+        # パレットを読み込んだ時などに、複数の色をまとめて付け替える。
+        # POST /api/colors/remap/ {"colors": {"<前の色のid>": "FF0000", ...}}
+        colors = request.data.get('colors')
+        if not isinstance(colors, dict) or not colors:
+            raise ValidationError({'colors': ['colors must be a non-empty object.']})
+        try:
+            hex_colors = {int(color_id): parse_hex_color(hex_color) for color_id, hex_color in colors.items()}
+        except (TypeError, ValueError) as err:
+            raise ValidationError({'colors': [str(err)]})
+
+        palette = set(self.get_queryset().filter(pk__in=hex_colors).values_list('pk', flat=True))
+        unknown = sorted(hex_colors.keys() - palette)
+        if unknown:
+            raise ValidationError({'colors': [f'{color_id} is not in the palette.' for color_id in unknown]})
+
+        new_colors = Color.objects.create_many(hex_colors.values())
+        try:
+            recolored = remap_colors(request.user, {
+                color_id: new_colors[hex_color] for color_id, hex_color in hex_colors.items()
+            })
+        except ValueError as err:
+            raise ValidationError({'colors': [str(err)]})
+
+        data = self.get_serializer(self.get_queryset().order_by(*Color.HSV_ORDERING), many=True).data
+        return Response({'recolored': recolored, 'colors': data})
+
 
 class DiaryViewSet(viewsets.ModelViewSet):
     serializer_class = DiarySerializer
     permission_classes = [permissions.IsAuthenticated]
+    # 新しい順に(created_at, id)のkeyset paginationで返す。索引diary_user_created_idxを使うので、
+    # 日記が多くても1ページの時間は変わらない
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        queryset = self.request.user.diaries.all(user=self.request.user).select_related('user', 'color')
+        if self.action == 'list':
+            queryset = queryset.defer('context')
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return DiaryPreviewSerializer
+        return super().get_serializer_class()
+
+    @method_decorator(conditional_page)
+    def list(self, request, *args, **kwargs):
+        # 一覧をポーリングされても、変わっていなければシリアライズせずに304を返す。
+        # 変わっていれば、DiaryPreviewSerializerと同じ内容をモデルを作らずにvalues_listから作る
+        rows = self.paginate_queryset(diary_preview_rows(self.filter_queryset(self.get_queryset())))
+        return self.get_paginated_response(serialize_diary_previews(rows, request.user))
+
+    @action(detail=False)
+    def nearest(self, request):
+        # /api/diaries/nearest/?color=FF0000&weighted=1&k=5&limit=20
+        try:
+            hex_color = parse_hex_color(request.query_params.get('color', ''))
+        except ValueError as err:
+            raise ValidationError({'color': [str(err)]})
+        try:
+            k = int(request.query_params.get('k', 5))
+            limit = int(request.query_params.get('limit', 20))
+        except ValueError:
+            raise ValidationError({'k': ['k and limit must be integer.']})
+        if k < 1 or limit < 1:
+            raise ValidationError({'k': ['k and limit must be positive.']})
+        k = min(k, NEAREST_MAX_K)
+        limit = min(limit, NEAREST_MAX_LIMIT)
+        weighted = request.query_params.get('weighted') in ('1', 'true')
+
+        diaries = list(nearest_diaries(request.user, hex_color, k=k, weighted=weighted, limit=limit))
+        data = self.get_serializer(diaries, many=True).data
+        for item, diary in zip(data, diaries):
+            item['distance'] = diary.distance
+        return Response(data)
+
+    @action(detail=False)
+    def search(self, request):
+        # /api/diaries/search/?q=検索語&limit=50
+        try:
+            limit = int(request.query_params.get('limit', SEARCH_RESULT_LIMIT))
+        except ValueError:
+            raise ValidationError({'limit': ['limit must be integer.']})
+        if limit < 1:
+            raise ValidationError({'limit': ['limit must be positive.']})
+        limit = min(limit, SEARCH_RESULT_LIMIT)
+
+        diaries = search_diaries(request.user, request.query_params.get('q', ''), limit=limit)
+        data = self.get_serializer(diaries, many=True).data
+        for item, diary in zip(data, diaries):
+            item['score'] = diary.score
+            item['snippet'] = diary.snippet
+            item['highlights'] = diary.highlights
+        return Response(data)
+
+
+class DiaryDailySummaryViewSet(viewsets.ReadOnlyModelViewSet):
+    # /api/daily-summaries/?from=2021-04-01&to=2021-04-30
+    serializer_class = DiaryDailySummarySerializer
+    permission_classes = [permissions.IsAuthenticated]
+    lookup_field = 'date'
 
     def get_queryset(self):
-        return self.request.user.diaries.all(user=self.request.user)
+        queryset = self.request.user.daily_summaries.order_by('date')
+        try:
+            if 'from' in self.request.query_params:
+                queryset = queryset.filter(date__gte=datetime.date.fromisoformat(self.request.query_params['from']))
+            if 'to' in self.request.query_params:
+                queryset = queryset.filter(date__lte=datetime.date.fromisoformat(self.request.query_params['to']))
+        except ValueError:
+            raise ValidationError({'from': ['from and to must be YYYY-MM-DD.']})
+        return queryset
 
 
 class UserViewSet(viewsets.ModelViewSet):
@@ -0,0 +1,45 @@
+from django.http import HttpResponseNotFound
+from django.shortcuts import render, redirect
+from django.urls import reverse_lazy
+from django.views import View
+from django.contrib.auth.mixins import LoginRequiredMixin
+
+from ..forms import ComposeDiaryForm
+from ..models import Diary
+from ..utils import get_hashids
+from .edit import CREATE
+
+
+class ComposeDiaryView(LoginRequiredMixin, View):
+    # 色・レベル・本文を一つのページで入力する。
+    # ChooseColorView → EditDiaryViewと違い、選んだ色をセッションに書かずに一度のPOSTで保存する
+    login_url = reverse_lazy('color_diary:login')
+    template_name = 'color_diary/compose_diary.html'
+
+    def get_diary(self, request, diary_hash_id):
+        # 新規作成ならNone。存在しなければDiary.DoesNotExist、URLが不正ならIndexError
+        diary_id = get_hashids().decode(diary_hash_id)[0]
+        if diary_id == CREATE:
+            return None
+        return Diary.objects.get(request.user, id=diary_id)
+
+    def get(self, request, *args, **kwargs):
+        try:
+            diary = self.get_diary(request, kwargs['diary_hash_id'])
+        except (IndexError, Diary.DoesNotExist):
+            return HttpResponseNotFound()
+
+        form = ComposeDiaryForm(user=request.user, instance=diary)
+        return render(request, self.template_name, {'form': form, 'CREATE': CREATE})
+
+    def post(self, request, *args, **kwargs):
+        try:
+            diary = self.get_diary(request, kwargs['diary_hash_id'])
+        except (IndexError, Diary.DoesNotExist):
+            return HttpResponseNotFound()
+
+        form = ComposeDiaryForm(user=request.user, instance=diary, data=request.POST)
+        if form.is_valid():
+            form.save()
+            return redirect('color_diary:diary-index')
+        return render(request, self.template_name, {'form': form, 'CREATE': CREATE})
@@ -7,6 +7,7 @@ from django.urls import reverse, reverse_lazy
 from ..utils import get_hashids
 from .utils import get_previous_url
 from ..models import Diary, Color
+from ..recolor import remap_colors
 
 
 class DeleteDiaryView(LoginRequiredMixin, View):
@@ -72,7 +73,10 @@ class DeleteColorView(LoginRequiredMixin, View):
         except Color.DoesNotExist:
             return HttpResponseNotFound()
 
-        color.users.remove(request.user)
-        if color.users.all().count() == 0:
-            color.delete()
+        # デフォルトの色はパレットから外せない
+        if color.pk == Color.get_default_color_id():
+            return HttpResponseNotFound()
+        # 外した色の日記はデフォルトの色に付け替える。パレットから外すのは、残りの日記を付け替えるのと同じトランザクション。
+        # 誰も使わなくなった色は、ref_countを見てsweep_colorsが消す
+        remap_colors(request.user, {color: Color.get_default_color_id()})
         return redirect(reverse('color_diary:color-index'))
\ No newline at end of file
@@ -110,7 +110,7 @@ class EditColorView(LoginRequiredMixin, View):
 
         if color_id == CREATE:
             self.form = ColorModelForm(user=request.user, initial={'hex_color': '000000'})
-        elif color_id == Color.get_default_color().pk:
+        elif color_id == Color.get_default_color_id():
             return HttpResponseNotFound()
         else: # 編集
             try:
@@ -130,7 +130,7 @@ class EditColorView(LoginRequiredMixin, View):
 
         if color_id == CREATE:
             self.form = ColorModelForm(user=request.user, data=request.POST)
-        elif color_id == Color.get_default_color().pk:
+        elif color_id == Color.get_default_color_id():
             return HttpResponseNotFound()
         else: # 編集
             try:
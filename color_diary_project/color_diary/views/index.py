@@ -1,49 +1,124 @@
+from django.http import Http404, HttpResponse
 from django.views.generic import ListView
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Case, When, Value, IntegerField
+from django.utils.decorators import method_decorator
 
 from .edit import CREATE
 from ..models import Diary, Color
+from ..fields import parse_hex_color
+from ..palette_index import nearest_diaries
+from ..page_cache import PAGE_CACHE_TIMEOUT, conditional_page, get_cache, page_cache_key
+from ..pagination import DIARY_PAGE_SIZE, keyset_paginate
+from ..render_colors import attach_diary_colors
+from ..search import search_diaries
+from ..utils import get_hashids
 
 
-class DiaryIndexView(LoginRequiredMixin, ListView):
+def get_diary_objects(diary_list):
+    # Vueのdataのobjectsに渡す値。カードの色はattach_diary_colorsで計算してテンプレートに書く
+    return {
+        diary.pk: {
+            'isMenuVisible': False,
+            'isHovered': False,
+        }
+        for diary in diary_list
+    }
+
+
+class UserPageCacheMixin:
+    # 描画したページをユーザー毎にキャッシュする。日記や色が変わるとsignalsでversionが変わり、使われなくなる。
+    # キャッシュにあればquerysetは評価しないので、日記のテーブルは読まない。
+    # ブラウザが同じversionのページを持っていれば、キャッシュも読まずに304を返す
+    @method_decorator(conditional_page)
+    def get(self, request, *args, **kwargs):
+        key = page_cache_key(request)
+        cached = get_cache().get(key)
+        if cached is not None:
+            content, content_type = cached
+            return HttpResponse(content, content_type=content_type)
+
+        response = super().get(request, *args, **kwargs)
+
+        def cache_response(response):
+            if response.status_code == 200:
+                get_cache().set(key, (response.content, response['Content-Type']), PAGE_CACHE_TIMEOUT)
+
+        response.add_post_render_callback(cache_response)
+        return response
+
+
+class DiaryIndexView(LoginRequiredMixin, UserPageCacheMixin, ListView):
     # todo: フィルタ機能をつける
+    # 日記は新しい順にDIARY_PAGE_SIZE件ずつ表示し、続きはスクロールした時にDiaryIndexFragmentViewから取ってくる
     login_url = reverse_lazy('color_diary:login')
     template_name = 'color_diary/diary_index.html'
     context_object_name = 'diary_list'
+    page_size = DIARY_PAGE_SIZE
+    next_cursor = None
 
     def get_queryset(self):
-        return Diary.objects.all(user=self.request.user).order_by('-created_at')
+        queryset = Diary.objects.all(user=self.request.user).select_related('color').defer('context')
+        try:
+            diary_list, self.next_cursor = keyset_paginate(
+                queryset, ('created_at', 'id'), cursor=self.request.GET.get('cursor'), size=self.page_size
+            )
+        except ValueError:
+            raise Http404()
+        return diary_list
 
     def get_context_data(self, *, object_list=None, **kwargs):
         context = super().get_context_data(object_list=object_list, **kwargs)
         context['CREATE'] = CREATE
+        # テンプレートのURLで使うhash idは、ページの分をまとめて付けておく
+        get_hashids().attach(context['diary_list'])
+        attach_diary_colors(context['diary_list'])
+        context['diary_objects'] = get_diary_objects(context['diary_list'])
+        context['next_url'] = None
+        if self.next_cursor is not None:
+            context['next_url'] = f"{reverse('color_diary:diary-index-fragment')}?cursor={self.next_cursor}"
         return context
 
 
-class ColorIndexView(LoginRequiredMixin, ListView):
+class DiaryIndexFragmentView(DiaryIndexView):
+    # 日記一覧の続きのページ。HTMLの断片を返す
+    template_name = 'color_diary/diary_index_fragment.html'
+
+
+class DiarySearchView(DiaryIndexView):
+    # ?q=検索語 を含む日記を、一致した部分のスニペットと一緒に表示する
+    def get_queryset(self):
+        return search_diaries(self.request.user, self.request.GET.get('q', ''))
+
+    def get_context_data(self, *, object_list=None, **kwargs):
+        context = super().get_context_data(object_list=object_list, **kwargs)
+        context['is_search'] = True
+        context['query'] = self.request.GET.get('q', '')
+        return context
+
+
+class NearestDiaryIndexView(DiaryIndexView):
+    # ?color=FF0000 の色に近い日記を近い順に表示する。weighted=1でcolor_levelも考慮する
+    def get_queryset(self):
+        try:
+            hex_color = parse_hex_color(self.request.GET.get('color', ''))
+        except ValueError:
+            raise Http404()
+        weighted = self.request.GET.get('weighted') == '1'
+        return nearest_diaries(self.request.user, hex_color, weighted=weighted).defer('context')
+
+
+class ColorIndexView(LoginRequiredMixin, UserPageCacheMixin, ListView):
     login_url = reverse_lazy('color_diary:login')
     template_name = 'color_diary/color_index.html'
     context_object_name = 'color_list'
 
     def get_queryset(self):
-        queryset = Color.objects.filter(users=self.request.user)
-        sorted_list = sorted(queryset, key=lambda color: color.hex_color)
-
-        cases = []
-        for hex_color_order, color in enumerate(sorted_list):
-            cases.append(When(id=color.pk, then=Value(hex_color_order)))
-
-        return queryset.annotate(
-            hex_color_order=Case(
-                *cases,
-                output_field=IntegerField()
-            )
-        ).order_by('hex_color_order')
+        return Color.objects.filter(users=self.request.user).order_by(*Color.HSV_ORDERING)
 
     def get_context_data(self, *, object_list=None, **kwargs):
         context = super().get_context_data(object_list=object_list, **kwargs)
         context['CREATE'] = CREATE
-        context['default_color'] = Color.get_default_color()
+        get_hashids().attach(context['color_list'])
+        context['default_color_id'] = Color.get_default_color_id()
         return context
\ No newline at end of file
@@ -37,6 +37,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'color_diary.middleware.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -85,6 +86,33 @@ DATABASES = {
 }
 
 
+# 一覧ページのキャッシュ(color_diary.page_cache)で使う。
+# ページのversionはキャッシュではなくユーザーの行(User.page_version)にあるので、プロセス毎のLocMemCacheでも
+# 他のプロセスで変わった日記が見えなくなる事はない。共有できるものにすると、プロセス間でページを使い回せる
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 3000,
+        },
+    }
+}
+PAGE_CACHE_TIMEOUT = 60 * 60
+
+# セッションの保存先。環境変数SESSION_PROFILEで選ぶ
+# db: データベース
+# cache: キャッシュから読み、無ければデータベースから読む。書き込みは両方に行う。
+#        ログアウトが全てのプロセスに伝わるように、CACHESを共有できるもの(memcachedなど)にした時だけ使える(color_diary.E001)
+# cookie: 署名付きのcookie。データベースを使わないが、中身はユーザーから読める
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cache': 'django.contrib.sessions.backends.cached_db',
+    'cookie': 'django.contrib.sessions.backends.signed_cookies',
+}
+SESSION_PROFILE = os.environ.get('SESSION_PROFILE', 'db')
+SESSION_ENGINE = SESSION_ENGINES[SESSION_PROFILE]
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
@@ -140,6 +168,24 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer', 'JWT')
 }
 
+# ビュー毎のクエリ数の上限。QueryBudgetMiddlewareはDEBUGか、QUERY_BUDGET_RAISEかQUERY_BUDGET_REPORTがある時だけ動く。
+# テスト(settings.test)では上限を超えたりN+1を見つけたりすると例外にし、開発中はログに出す。
+# 環境変数QUERY_BUDGET_REPORTにファイルを指定すると、リクエスト毎の結果をそこに書き出す
+QUERY_BUDGETS = {
+    'color_diary:diary-index': 4,
+    'color_diary:diary-index-fragment': 4,
+    'color_diary:diary-search': 5,
+    'color_diary:nearest-diary-index': 6,
+    'color_diary:color-index': 5,
+    'color_diary:diary-list': 3,
+    'color_diary:diary-detail': 3,
+    'color_diary:diary-nearest': 5,
+    'color_diary:color-list': 3,
+    'color_diary:daily-summary-list': 3,
+}
+QUERY_BUDGET_RAISE = False
+QUERY_BUDGET_REPORT = os.environ.get('QUERY_BUDGET_REPORT')
+
 # メールサーバーへの接続設定
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
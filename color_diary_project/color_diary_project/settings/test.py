@@ -0,0 +1,7 @@
+from .base import *
+
+
+# テスト用の設定。manage.py test --settings=color_diary_project.settings.test
+# クエリの予算を超えたりN+1を見つけたりしたら、テストを失敗させる
+QUERY_BUDGET_RAISE = True
+QUERY_BUDGET_REPORT = None
@@ -2,5 +2,7 @@
 
 python color_diary_project/manage.py makemigrations
 python color_diary_project/manage.py migrate
+# 期限切れのセッションと、使われなくなった色を一時間ごとに少しずつ消す
+(while true; do python color_diary_project/manage.py purge_sessions; python color_diary_project/manage.py sweep_colors; sleep 3600; done) &
 cd color_diary_project
 python -m gunicorn --bind 0.0.0.0:$PORT color_diary_project.wsgi
\ No newline at end of file
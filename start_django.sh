@@ -7,6 +7,8 @@ done
 
 sudo -E python color_diary_project/manage.py makemigrations
 sudo -E python color_diary_project/manage.py migrate
+# 期限切れのセッションと、使われなくなった色を一時間ごとに少しずつ消す
+(while true; do sudo -E python color_diary_project/manage.py purge_sessions; sudo -E python color_diary_project/manage.py sweep_colors; sleep 3600; done) &
 sudo -E python color_diary_project/manage.py collectstatic --no-input
 cd color_diary_project
 sudo -E python -m gunicorn --bind 0.0.0.0:8000 color_diary_project.wsgi
\ No newline at end of file